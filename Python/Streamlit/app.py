@@ -1,21 +1,37 @@
 import streamlit as st
-import pandas as pd
+import logging
+import time
+import dataclasses
+import config
 import auth
 import data_loader as dl
+import filters as flt
+import filter_cache
+import view_cache
+import warmup
 import utils as ut
 # Import all views
 from views import business, website, marketing, product
 
+logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+rerun_start = time.perf_counter()
+
 # 1. Page Config
 st.set_page_config(page_title="Digital Analytics", page_icon="📊", layout="wide")
 ut.load_css()
 
+# Fills the caches for the default filters once per server process (a
+# no-op when serve.py already started it with the server)
+if config.WARMUP_ENABLED:
+    warmup.start()
+
 # 2. Auth
 if not auth.check_password():
     st.stop()
 
 # 3. Load Data (Returns 5 DataFrames now)
-df_sess, df_orders, df_items, df_prods, df_pv = dl.load_data()
+frames = dl.load_data()
+df_sess, df_orders, df_items, df_prods, df_pv = frames
 
 # 4. Sidebar
 st.sidebar.title("Navigation")
@@ -26,31 +42,8 @@ st.sidebar.info(f"User: {st.session_state['current_user']}")
 
 
 #########################
- # 5. Global Date Filter
+ # 5. Page menu and filters
 st.sidebar.markdown("---")
-min_date = df_sess['created_at'].min().date()
-max_date = df_sess['created_at'].max().date()
-start_date, end_date = st.sidebar.date_input("Date Range", [min_date, max_date])
-
-# 6. Filter Data
-start_ts = pd.to_datetime(start_date)
-end_ts = pd.to_datetime(end_date) + pd.Timedelta(days=1)
-
-# Apply filters to sessions/orders/items/pageviews
-df_s_filt = df_sess[(df_sess['created_at'] >= start_ts) & (df_sess['created_at'] < end_ts)]
-df_o_filt = df_orders[(df_orders['created_at'] >= start_ts) & (df_orders['created_at'] < end_ts)]
-df_i_filt = df_items[(df_items['created_at'] >= start_ts) & (df_items['created_at'] < end_ts)]
-df_pv_filt = df_pv[df_pv['website_session_id'].isin(df_s_filt['website_session_id'])]
-
-
-
-
-
-
-
-
-
-
 
 # Updated Menu
 page = st.sidebar.radio("Go to", [
@@ -60,90 +53,96 @@ page = st.sidebar.radio("Go to", [
     "Product Dashboard"
 ])
 
+#######################################################################
 
+# --- Slicers ---
+min_date, max_date, utm_sources, product_ids = flt.slicer_options(df_sess, df_prods)
 
 
+# With the apply button (config.APPLY_BUTTON) the panel is a fragment:
+# editing a slicer reruns only the panel and "Apply filters" hands the
+# selection to the page. Otherwise every edit applies at once.
+apply_button = config.APPLY_BUTTON and ut.fragments_active()
 
 
+def filter_panel():
+    st.markdown("### Filters")
+    dates = st.date_input("Date Range", [min_date, max_date])
 
+    # UTM Source slicer
+    selected_utm = st.multiselect(
+        "UTM Source",
+        options=utm_sources,
+        default=utm_sources
+    )
 
+    # Product ID slicer
+    selected_product_ids = st.multiselect(
+        "Product ID",
+        options=product_ids,
+        default=product_ids
+    )
 
+    # The date range is incomplete while only its start has been picked
+    pending = None
+    if len(dates) == 2:
+        pending = flt.Filters.from_widgets(dates[0], dates[1], selected_utm, selected_product_ids)
+    if "filters" not in st.session_state or (pending is not None and not apply_button):
+        st.session_state["filters"] = pending
+    elif apply_button:
+        changed = pending is not None and pending != st.session_state["filters"]
+        if st.button("Apply filters", disabled=not changed, use_container_width=True):
+            st.session_state["filters"] = pending
+            st.rerun()
 
 
+with st.sidebar:
+    (ut.fragment(filter_panel) if apply_button else filter_panel)()
 
 
 
 
 
+# 6. Filter Data
+filters = st.session_state["filters"]
+if filters is None:
+    st.info("Pick the end of the date range.")
+    st.stop()
+data = filter_cache.filtered(frames, filters)
 
-#######################################################################
-
-# --- Additional Slicers ---
-st.sidebar.markdown("### Filters")
-
-# UTM Source slicer
-utm_sources = df_sess['utm_source'].fillna('Untracked').unique().tolist()
-selected_utm = st.sidebar.multiselect(
-    "UTM Source",
-    options=utm_sources,
-    default=utm_sources
-)
-
-# Product ID slicer
-product_ids = df_prods['product_id'].unique().tolist()
-selected_product_ids = st.sidebar.multiselect(
-    "Product ID",
-    options=product_ids,
-    default=product_ids
-)
-
-
-
-
-
-# --- UTM source filter ---
-df_s_filt = df_s_filt[
-    df_s_filt['utm_source'].isin(selected_utm)
-]
-
-# --- Filter orders based on filtered sessions ---
-df_o_filt = df_o_filt[
-    df_o_filt['website_session_id'].isin(df_s_filt['website_session_id'])
-]
-
-# --- Filter items based on remaining orders ---
-df_i_filt = df_i_filt[
-    df_i_filt['order_id'].isin(df_o_filt['order_id'])
-]
-
-# --- Add product info (safe merge) ---
-df_i_filt = df_i_filt.merge(
-    df_prods[['product_id']],
-    on='product_id',
-    how='left'
-)
-
-# --- Product name slicer ---
-df_i_filt = df_i_filt[
-    df_i_filt['product_id'].isin(selected_product_ids)
-]
-
-# --- Pageviews follow sessions ---
-df_pv_filt = df_pv[df_pv['website_session_id'].isin(df_s_filt['website_session_id'])]
+# Charts whose slicers did not change since the last rerun are served from
+# their last result (see charts.compute); results of an older dataset go
+chart_results = st.session_state.setdefault("chart_results", {})
+if chart_results.get("dataset_version") != dl.dataset_version():
+    chart_results.clear()
+    chart_results["dataset_version"] = dl.dataset_version()
+# Below that, chart results and figures are shared by every session (see view_cache.py)
+chart_stores = dict(results=chart_results.setdefault("charts", {}),
+                    view_cache=view_cache.shared(), figure_cache=view_cache.shared_figures(),
+                    dataset_version=dl.dataset_version())
+if config.BACKEND == "duckdb":
+    vars(data).update(chart_stores)
+else:
+    # A per-session copy of the shared (cached) filtered data, frames not copied
+    data = dataclasses.replace(data, **chart_stores)
 
 
 
 
 
 # 7. Routing Logic
+ut.start_page(page)
 if page == "Business Overview":
-    business.show(df_s_filt, df_o_filt, df_i_filt, df_prods, df_pv)
+    business.show(data)
 elif page == "Website Performance":
-    website.show(df_s_filt, df_o_filt, df_pv_filt)
+    website.show(data)
 elif page == "Marketing Performance":
-    marketing.show(df_s_filt, df_o_filt,df_pv)
+    marketing.show(data)
 elif page == "Product Dashboard":
-    product.show(df_i_filt, df_prods, df_pv,df_o_filt,df_s_filt)
+    product.show(data)
+view_cache.report()
+ut.report_page_bytes(page)
+logging.getLogger("app").debug("Full rerun took %.1fms", (time.perf_counter() - rerun_start) * 1000)
 
 
 
@@ -0,0 +1,458 @@
+"""Small benchmarks and reports for the data layer.
+
+Run from this folder, e.g. `python benchmarks.py schema`. `parity` exits
+non-zero when the DuckDB backend disagrees with the pandas one,
+`typed_parity` when the typed frames (schema.py) change any chart's numbers.
+"""
+import argparse
+import time
+from collections import Counter
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import plotly.tools
+import data_loader as dl
+import schema
+import channels
+import charts
+import cooccurrence
+import figures
+import funnel
+import partitions
+import paths
+import utils as ut
+import view_cache
+import filters as flt
+from views import business, website, marketing, product  # noqa: F401 (register the charts)
+
+
+def _timed(fn, *args, repeat=3):
+    """Best wall time of `repeat` runs, and the last result."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def schema_memory():
+    """Memory of every table read with inferred dtypes vs. schema.SCHEMAS."""
+    rows = []
+    for name, file_name in dl.SOURCE_FILES.items():
+        path = dl._build_path(file_name)
+        untyped = pd.read_csv(path)
+        untyped['created_at'] = pd.to_datetime(untyped['created_at'], errors='coerce')
+        typed = schema.apply_schema(name, pd.read_csv(path, dtype=schema.read_dtypes(name)))
+        before, after = schema.memory_mb(untyped), schema.memory_mb(typed)
+        rows.append({
+            'table': name,
+            'rows': len(typed),
+            'inferred_mb': round(before, 2),
+            'typed_mb': round(after, 2),
+            'saved_mb': round(before - after, 2),
+            'saved_pct': round((1 - after / before) * 100, 1) if before else 0.0,
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+# Schema flags (read as 0/1 ints before the schema)
+_FLAGS = {col for dtypes in schema.SCHEMAS.values() for col, dtype in dtypes.items() if dtype == 'bool'}
+
+
+def _untyped(df):
+    """`df` with the dtypes pandas infers from the CSVs: strings as object, ids/flags as int64.
+
+    pageview_url stays categorical, the path and session fact code works on its codes.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and col != 'pageview_url':
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_unsigned_integer_dtype(df[col]) or col in _FLAGS:
+            df[col] = df[col].astype('int64')
+    return df
+
+
+def typed_parity():
+    """Every chart id on the typed frames vs. the same frames with inferred dtypes."""
+    frames = dl.load_data()
+    untyped = tuple(_untyped(df) for df in frames)
+    failed = False
+    for label, filters in _filter_states(frames).items():
+        typed_data = flt.apply_filters(*frames, filters)
+        untyped_data = flt.apply_filters(*untyped, filters)
+        problems = charts.compare(untyped_data, typed_data, charts.chart_ids())
+        print(f"{label}: {len(charts.chart_ids())} charts, {len(problems)} mismatches")
+        for chart_id, problem in sorted(problems.items()):
+            print(f"  {chart_id}: {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+
+def _classify_loop(referers):
+    # The per-row loop load_data used before channels.classify_referers
+    utm_source_2 = []
+    for i in referers:
+        if i == "https://www.gsearch.com":
+            utm_source_2.append("gsearch")
+        elif i == "https://www.bsearch.com":
+            utm_source_2.append("bsearch")
+        elif i == "https://www.socialbook.com":
+            utm_source_2.append("socialbook")
+        else:
+            utm_source_2.append(np.nan)
+    return pd.Series(utm_source_2)
+
+
+def channel_classification(n=3_000_000):
+    """Old referer loop vs. channels.classify_referers on n synthetic sessions."""
+    rng = np.random.default_rng(0)
+    choices = np.array([
+        "https://www.gsearch.com", "https://www.bsearch.com",
+        "https://www.socialbook.com", None,
+    ], dtype=object)
+    referers = pd.Series(choices[rng.integers(0, len(choices), n)])
+    rules = channels.load_rules()
+
+    for label, col in [('object', referers), ('category', referers.astype('category'))]:
+        loop_s, expected = _timed(_classify_loop, col, repeat=1)
+        vec_s, result = _timed(channels.classify_referers, col, rules)
+        assert result.astype(object).equals(expected.astype(object)), "classification mismatch"
+        print(f"{n:,} sessions ({label}): loop {loop_s:.3f}s, vectorized {vec_s:.3f}s, "
+              f"{loop_s / vec_s:.0f}x faster")
+
+
+def _filter_states(frames):
+    """The default selection plus a narrower one (one month, some sources/products)."""
+    df_sess, _, _, df_prods, _ = frames
+    first, last, utm, products = flt.slicer_options(df_sess, df_prods)
+    mid = pd.Timestamp(first) + (pd.Timestamp(last) - pd.Timestamp(first)) / 2
+    return {
+        'default': flt.default_filters(df_sess, df_prods),
+        'narrow': flt.Filters.from_widgets(mid.date(), (mid + pd.Timedelta(days=30)).date(),
+                                           utm[:2], products[:2]),
+    }
+
+
+def indexed_filters():
+    """The sidebar filters with full-frame masks vs. the loader's row indexes."""
+    frames = dl.load_data()
+    index = dl.load_indexes()
+    df_sess = frames[0]
+    for label, filters in _filter_states(frames).items():
+        full_s, full = _timed(flt.apply_filters, *frames, filters)
+        indexed_s, indexed = _timed(lambda: flt.apply_filters(*frames, filters, index=index))
+        for name in ('sessions', 'orders', 'items', 'pageviews'):
+            assert getattr(full, name).reset_index(drop=True).equals(
+                getattr(indexed, name).reset_index(drop=True)), f"{name} differs"
+        rows = index['sessions'].rows(filters.start, filters.end)
+        print(f"{label}: {rows.stop - rows.start:,} of {len(df_sess):,} sessions in range, "
+              f"masks {full_s:.3f}s, indexed {indexed_s:.3f}s")
+
+
+def date_slice(n=10_000_000):
+    """Boolean mask vs. TimeIndex slice for one month of n synthetic sessions."""
+    rng = np.random.default_rng(0)
+    start = np.datetime64('2012-03-19', 'ns')
+    span = np.timedelta64(3 * 365, 'D').astype('timedelta64[ns]').astype('int64')
+    created_at = start + np.sort(rng.integers(0, span, n)).astype('timedelta64[ns]')
+    df = pd.DataFrame({
+        'website_session_id': np.arange(1, n + 1, dtype='uint32'),
+        'user_id': rng.integers(1, n // 3, n).astype('uint32'),
+        'created_at': created_at,
+    })
+    index = partitions.TimeIndex.of(df)
+    lo, hi = pd.Timestamp('2013-06-01'), pd.Timestamp('2013-07-01')
+
+    mask_s, masked = _timed(lambda: df[(df['created_at'] >= lo) & (df['created_at'] < hi)])
+    slice_s, sliced = _timed(index.select, df, lo, hi)
+    assert masked.equals(sliced), "slice differs from mask"
+    print(f"{n:,} sessions, {len(sliced):,} in range: mask {mask_s * 1000:.1f}ms, "
+          f"searchsorted slice {slice_s * 1000:.3f}ms, {mask_s / slice_s:,.0f}x faster")
+
+
+def partition_pruning():
+    """The sidebar filters scanning every pageview vs. only the months (PartitionIndex) in range."""
+    frames = dl.load_data()
+    df_pv = frames[4]
+    pruned = {'pageviews': dl.load_indexes()['pageviews']}
+    for label, filters in _filter_states(frames).items():
+        full_s, full = _timed(flt.apply_filters, *frames, filters)
+        pruned_s, part = _timed(lambda: flt.apply_filters(*frames, filters, index=pruned))
+        assert full.pageviews.reset_index(drop=True).equals(
+            part.pageviews.reset_index(drop=True)), "pageviews differ"
+        rows = pruned['pageviews'].rows(filters.start, filters.end)
+        print(f"{label}: {rows.stop - rows.start:,} of {len(df_pv):,} pageviews scanned, "
+              f"full scan {full_s:.3f}s, pruned {pruned_s:.3f}s")
+
+
+def cube_rollups():
+    """Charts answered from the daily cube vs. the same charts from raw rows."""
+    frames = dl.load_data()
+    index, daily = dl.load_indexes(), dl.load_cube()
+    cube_charts = charts.chart_ids("cube")
+    for label, filters in _filter_states(frames).items():
+        raw = flt.apply_filters(*frames, filters, index=index)
+        rolled = flt.apply_filters(*frames, filters, index=index, cube=daily)
+        raw_s, _ = _timed(lambda: [charts.compute(c, raw) for c in cube_charts])
+        cube_s, _ = _timed(lambda: [charts.compute(c, rolled) for c in cube_charts])
+        print(f"{label}: {len(cube_charts)} charts, raw rows {raw_s:.3f}s, cube {cube_s:.3f}s")
+        for chart_id in cube_charts:
+            expected = charts.IMPLEMENTATIONS[(chart_id, "pandas")](raw)
+            actual = charts.IMPLEMENTATIONS[(chart_id, "cube")](rolled)
+            keys = [c for c in expected.columns if not pd.api.types.is_numeric_dtype(expected[c])]
+            if keys:
+                expected = expected.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+                actual = actual.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+            worst = max(
+                (np.nanmax(np.abs(actual[c].to_numpy(float) / expected[c].to_numpy(float) - 1), initial=0)
+                 for c in expected.columns if c not in keys),
+                default=0.0)
+            print(f"  {chart_id:<32} max relative error {worst:.4%}")
+
+
+def _pair_counts_loop(df_oi):
+    # The per-order combinations loop product.cross_sell used before cooccurrence
+    pairs = Counter()
+    for products in df_oi.groupby('order_id')['product_id'].apply(list):
+        pairs.update(combinations(sorted(set(products)), 2))
+    return pairs
+
+
+def cross_sell(n=1_000_000, n_products=40):
+    """Combinations loop vs. cooccurrence on n synthetic orders, built at once and in two appends."""
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 5, n)
+    df_oi = pd.DataFrame({
+        'order_id': np.repeat(np.arange(1, n + 1), sizes).astype('uint32'),
+        'product_id': rng.integers(1, n_products, sizes.sum()).astype('uint16'),
+    })
+    loop_s, expected = _timed(_pair_counts_loop, df_oi, repeat=1)
+    vec_s, engine = _timed(cooccurrence.CoOccurrence.of, df_oi)
+    pairs = engine.pairs()
+    assert dict(zip(zip(pairs['product_a'], pairs['product_b']), pairs['count'])) == dict(expected), \
+        "pair counts differ"
+
+    half = df_oi['order_id'] <= n // 2
+    appended = cooccurrence.CoOccurrence.of(df_oi[half])
+    add_s, _ = _timed(lambda: cooccurrence.CoOccurrence.of(df_oi[half]).add(
+        df_oi.loc[~half, 'order_id'], df_oi.loc[~half, 'product_id']))
+    appended.add(df_oi.loc[~half, 'order_id'], df_oi.loc[~half, 'product_id'])
+    assert (appended.counts == engine.counts).all() and appended.orders == engine.orders, "append differs"
+    print(f"{n:,} orders, {len(df_oi):,} items, {len(pairs):,} pairs: loop {loop_s:.3f}s, "
+          f"vectorized {vec_s:.3f}s ({loop_s / vec_s:.0f}x faster), built in two appends {add_s:.3f}s")
+
+
+def _progress_loop(df_pv, stages):
+    # Per-row scan of the ordered funnel, the reference for funnel.progress
+    stage_of = {url: funnel._stage_of(str(url), stages) for url in df_pv['pageview_url'].cat.categories}
+    reached = {}
+    for session_id, url in zip(df_pv['website_session_id'], df_pv['pageview_url']):
+        k = reached.setdefault(session_id, 0)
+        if k < len(stages) and stage_of.get(url, -1) == k:
+            reached[session_id] = k + 1
+    return np.array(list(reached.values()))
+
+
+def funnel_stages():
+    """Old per-row url mapping vs. the funnel engine on the loaded pageviews."""
+    df_pv = dl.load_data()[4]
+    stages = funnel.load_stages()
+    apply_s, _ = _timed(lambda: df_pv['pageview_url'].astype(object).apply(
+        lambda url: funnel._stage_of(url, stages)), repeat=1)
+    codes_s, _ = _timed(funnel.stage_codes, df_pv['pageview_url'], stages)
+    loop_s, expected = _timed(_progress_loop, df_pv, stages, repeat=1)
+    engine_s, reached = _timed(funnel.progress, df_pv, stages)
+    assert (reached == expected).all(), "ordered funnel differs from the per-row scan"
+    print(f"{len(df_pv):,} pageviews: stage mapping apply {apply_s:.3f}s, lookup {codes_s:.3f}s; "
+          f"ordered funnel scan {loop_s:.3f}s, engine {engine_s:.3f}s")
+    print(funnel.sessions_reaching(reached, [stage['name'] for stage in stages]).to_string(index=False))
+
+
+def _exit_rate_transform(df_pv):
+    # The per-session lambda exit_rate used before paths.transitions
+    pv = df_pv.copy()
+    last_url = pv.groupby('website_session_id')['pageview_url'].transform(lambda x: x.iloc[-1])
+    pv['is_exit'] = pv['pageview_url'] == last_url
+    return pv[pv['is_exit']]['pageview_url'].value_counts()
+
+
+def page_paths(n=20_000_000, n_pages=16):
+    """Per-session transform vs. paths.transitions on n synthetic clustered pageviews."""
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 8, n // 4)
+    session_ids = np.repeat(np.arange(1, len(sizes) + 1, dtype='uint32'), sizes)[:n]
+    pages = pd.Index([f'/page-{i}' for i in range(n_pages)])
+    df_pv = pd.DataFrame({
+        'website_session_id': session_ids,
+        'pageview_url': pd.Categorical.from_codes(rng.integers(0, n_pages, len(session_ids)), categories=pages),
+    })
+    matrix_s, matrix = _timed(paths.transitions, df_pv)
+    flows = paths.page_flows(matrix)
+    assert flows['visits'].sum() == len(df_pv) and flows['exits'].sum() == flows['entries'].sum(), \
+        "every session needs one entry and one exit"
+    sample = df_pv[df_pv['website_session_id'] <= 250_000]
+    old_s, _ = _timed(_exit_rate_transform, sample, repeat=1)
+    new_s, _ = _timed(paths.transitions, sample)
+    print(f"{len(sample):,} pageviews: transform {old_s:.3f}s, transitions {new_s:.3f}s "
+          f"({old_s / new_s:.0f}x faster); {len(df_pv):,} pageviews: transitions {matrix_s:.3f}s")
+
+
+def view_cache_keys():
+    """Per chart: hashing the filtered frames (st.cache_data's key) vs. the
+    fingerprint key view_cache uses vs. computing the chart."""
+    frames = dl.load_data()
+    filters = _filter_states(frames)['default']
+    data = flt.apply_filters(*frames, filters, index=dl.load_indexes(), facts=dl.load_session_facts())
+    hash_s, _ = _timed(lambda: [pd.util.hash_pandas_object(getattr(data, name), index=False).sum()
+                                for name in ('sessions', 'orders', 'items', 'pageviews')])
+    key_s, _ = _timed(lambda: (dl.dataset_version(), filters.key()))
+    rows = []
+    for chart_id in charts.chart_ids():
+        compute_s, _ = _timed(charts.IMPLEMENTATIONS[(chart_id, 'pandas')], data, repeat=1)
+        rows.append({'chart': chart_id, 'compute_ms': round(compute_s * 1000, 2)})
+    report = pd.DataFrame(rows)
+    report['frame_hash_ms'] = round(hash_s * 1000, 2)
+    report['fingerprint_ms'] = round(key_s * 1000, 4)
+    print(report.to_string(index=False))
+    print(f"Hashing the frames costs {hash_s / report['compute_ms'].sum() * 1000:.0%} of computing "
+          f"every chart once; the fingerprint {key_s * 1e6:.1f}us")
+
+
+def _sent_json(fig):
+    # What st.plotly_chart does to a figure on every send
+    return pio.to_json(plotly.tools.return_figure_from_figure_or_data(fig, validate_figure=True), validate=False)
+
+
+def figure_cache():
+    """Per figure: building, styling and slimming it vs. serving it from
+    the figure cache (utils.figure), for the default filters, and
+    serializing it for st.plotly_chart as a plain figure vs. from the
+    dict the cached spec keeps (figures.SentFigure)."""
+    frames = dl.load_data()
+    data = flt.apply_filters(*frames, _filter_states(frames)['default'], index=dl.load_indexes(),
+                             facts=dl.load_session_facts())
+    data.view_cache = view_cache.ViewCache(len(charts.chart_ids()))
+    data.figure_cache = view_cache.ViewCache(len(ut.FIGURES))
+    data.dataset_version = dl.dataset_version()
+    # Chart results are cached first, so only the figure work is timed
+    for chart_id in charts.chart_ids():
+        charts.compute(chart_id, data)
+    rows = []
+    for figure_id, build in sorted(ut.FIGURES.items()):
+        build_s, spec = _timed(build, data, repeat=1)
+        cached_s, _ = _timed(build, data)
+        plain = go.Figure(spec.figure)
+        plain_s, plain_json = _timed(_sent_json, plain)
+        kept_s, kept_json = _timed(_sent_json, spec.figure)
+        assert plain_json == kept_json, f"{figure_id}: kept dict differs"
+        rows.append({'figure': figure_id, 'build_ms': round(build_s * 1000, 2),
+                     'cached_ms': round(cached_s * 1000, 3), 'kB': round(spec.nbytes / 1024, 1),
+                     'send_plain_ms': round(plain_s * 1000, 2), 'send_kept_ms': round(kept_s * 1000, 2)})
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    print(f"{len(rows)} figures: {report['build_ms'].sum():.0f}ms to build, "
+          f"{report['cached_ms'].sum():.1f}ms from the cache; serializing "
+          f"{report['send_plain_ms'].sum():.1f}ms as plain figures, {report['send_kept_ms'].sum():.1f}ms from kept dicts")
+
+
+def rerun_latency(repeat=5):
+    """Latency of a typical slicer change (dropping one product) in app.py.
+
+    Run once as is and once with DASHBOARD_APPLY_BUTTON=1 to compare: by
+    default every slicer edit reruns the whole script, with the button the
+    edit reruns only the filter panel and "Apply filters" reruns the page.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file("app.py", default_timeout=600)
+    app.session_state["password_correct"] = True
+    app.session_state["current_user"] = "benchmark"
+    app.run()
+    products = app.multiselect[1]  # UTM Source, then Product ID
+    options = list(products.value)
+    edit_s = apply_s = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        products.set_value(options[:-1] if i % 2 == 0 else options).run()
+        edit_s = min(edit_s, time.perf_counter() - start)
+        apply = [b for b in app.button if b.label == "Apply filters"]
+        if apply:
+            start = time.perf_counter()
+            apply[0].click().run()
+            apply_s = min(apply_s, time.perf_counter() - start)
+        products = app.multiselect[1]
+    mode = "apply button" if apply else "edits apply at once"
+    applied = f", apply {apply_s * 1000:.0f}ms" if apply else ""
+    print(f"{mode}: slicer edit {edit_s * 1000:.0f}ms{applied}")
+
+
+def figure_payload():
+    """Bytes sent for a dense time series before and after figures.slim.
+
+    Hourly sessions per UTM source over the whole range: far more points
+    than the charts' pixels.
+    """
+    df_sess = dl.load_data()[0]
+    hour = df_sess['created_at'].dt.floor('h').rename('hour')
+    source = df_sess['utm_source'].astype(object).fillna('Untracked').rename('utm_source')
+    hourly = df_sess.groupby([hour, source]).size().rename('sessions').reset_index()
+    fig = px.line(hourly, x='hour', y='sessions', color='utm_source')
+    slim_s, slimmed = _timed(figures.slim, fig)
+    for label, f in (('as built', fig), ('slimmed', slimmed)):
+        points = sum(len(t.y) for t in f.data)
+        print(f"{label:>9}: {points:>8,} points, {figures.payload_bytes(f) / 1024:>9.1f} kB, "
+              f"traces {sorted({t.type for t in f.data})}")
+    print(f"slim: {slim_s * 1000:.1f}ms")
+
+
+def backend_parity():
+    """Every chart id on the pandas and DuckDB backends must give the same numbers."""
+    import sql_backend
+
+    frames = dl.load_data()
+    failed = False
+    for label, filters in _filter_states(frames).items():
+        pandas_data = flt.apply_filters(*frames, filters)
+        sql_data = sql_backend.filtered(frames, filters)
+        pandas_s, _ = _timed(lambda: [charts.compute(c, pandas_data) for c in charts.chart_ids()], repeat=1)
+        sql_s, _ = _timed(lambda: [charts.compute(c, sql_data) for c in charts.chart_ids()], repeat=1)
+        problems = sql_backend.compare(pandas_data, sql_data)
+        sql_data.close()
+        print(f"{label}: {len(charts.chart_ids())} charts, pandas {pandas_s:.3f}s, duckdb {sql_s:.3f}s, "
+              f"{len(problems)} mismatches")
+        for chart_id, problem in sorted(problems.items()):
+            print(f"  {chart_id}: {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+
+BENCHMARKS = {
+    'schema': schema_memory,
+    'typed_parity': typed_parity,
+    'channels': channel_classification,
+    'filters': indexed_filters,
+    'date_slice': date_slice,
+    'partitions': partition_pruning,
+    'cube': cube_rollups,
+    'cross_sell': cross_sell,
+    'funnel': funnel_stages,
+    'paths': page_paths,
+    'view_cache': view_cache_keys,
+    'rerun': rerun_latency,
+    'figures': figure_payload,
+    'figure_cache': figure_cache,
+    'parity': backend_parity,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+    BENCHMARKS[args.name]()
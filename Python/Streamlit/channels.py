@@ -0,0 +1,54 @@
+import json
+import numpy as np
+import pandas as pd
+import config
+
+# Referer -> source rules live in a JSON file (config.CHANNEL_RULES_PATH):
+#
+#   {"exact":  {"https://www.gsearch.com": "gsearch", ...},
+#    "prefix": {"https://www.google.": "google", ...}}
+#
+# Exact matches win over prefixes, and the longest matching prefix wins.
+# Referers matching no rule get NaN (filled with "Untracked" by the loader).
+
+
+def load_rules(path=None):
+    with open(path or config.CHANNEL_RULES_PATH) as f:
+        rules = json.load(f)
+    return {
+        'exact': dict(rules.get('exact', {})),
+        'prefix': dict(rules.get('prefix', {})),
+    }
+
+
+def _classify_distinct(referers, rules):
+    """Source for each distinct referer (an object Index), NaN when unmatched."""
+    sources = pd.Series(referers.map(rules['exact']), dtype=object)
+    for prefix in sorted(rules['prefix'], key=len, reverse=True):
+        hit = sources.isna().to_numpy() & referers.str.startswith(prefix)
+        sources[hit] = rules['prefix'][prefix]
+    return sources.to_numpy()
+
+
+def classify_referers(referers, rules=None):
+    """Vectorized referer -> source mapping, returned as a categorical Series.
+
+    The rules are only evaluated on the distinct referers (a handful), the
+    result is then broadcast to every row with one integer take.
+    """
+    if rules is None:
+        rules = load_rules()
+    codes, uniques = pd.factorize(referers)
+    uniques = pd.Index(np.asarray(uniques, dtype=object))
+
+    sources = _classify_distinct(uniques, rules)
+    categories = pd.Index(sorted({s for s in sources if isinstance(s, str)}))
+    source_codes = categories.get_indexer(sources)
+
+    # factorize marks missing referers with -1, those stay unmatched too
+    row_codes = np.where(codes >= 0, source_codes[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(row_codes, categories=categories),
+        index=referers.index,
+        name='utm_source',
+    )
@@ -0,0 +1,181 @@
+"""Registry of the aggregations behind every chart and KPI strip.
+
+Each view registers one function per chart that turns the filtered data
+into the small frame the chart is drawn from:
+
+    @charts.aggregation("business.utm_share")
+    def utm_share(data): ...
+
+and gets it back with `charts.compute("business.utm_share", data)`. Other
+backends (see sql_backend.py) register the same chart ids for their own
+`data.backend`, so the views never need to know which one produced the
+numbers.
+
+Intermediates several charts start from (orders joined to their sessions,
+landing pages, ...) are registered by name, with the names of the
+intermediates they are built from in turn:
+
+    @charts.intermediate("orders_with_sessions")
+    def orders_with_sessions(data): ...
+
+    @charts.aggregation("marketing.revenue_by_campaign", inputs=("orders_with_sessions",))
+    def revenue_by_campaign(data, orders): ...
+
+Each one is computed at most once per filtered data set and kept on it
+(`data.intermediates`), so every chart reading it in a rerun, and every
+later rerun served the same filtered data from the filter cache, reuses
+it. Intermediates are shared: treat them as read-only.
+
+Charts also declare which sidebar slicers their numbers depend on
+(`depends=("date", "utm")`, names from filters.SLICERS; all of them when
+not declared). When the data carries a `results` store (app.py keeps one
+per browser session), a chart whose slicers did not change since its
+last computation is served from it, so e.g. changing only the products
+recomputes only the item level charts.
+
+Behind that, when the data carries a `view_cache` (see view_cache.py),
+every chart result is shared between sessions under a fingerprint key:
+(data.dataset_version, chart id, backend, the slicers it depends on).
+"""
+import functools
+import time
+import numpy as np
+import pandas as pd
+
+# (chart_id, backend) -> aggregation function
+IMPLEMENTATIONS = {}
+
+# name -> (function, names of its inputs); inputs are registered first, so
+# the intermediates always form a DAG
+INTERMEDIATES = {}
+
+# chart_id -> slicers its numbers depend on (not listed: all of them)
+DEPENDS = {}
+
+
+def _with_inputs(fn, inputs):
+    if not inputs:
+        return fn
+    missing = [name for name in inputs if name not in INTERMEDIATES]
+    if missing:
+        raise KeyError(f"Unknown intermediates {missing} (register them before their users)")
+
+    @functools.wraps(fn)
+    def run(data):
+        return fn(data, *(resolve(name, data) for name in inputs))
+    return run
+
+
+def intermediate(name, inputs=()):
+    def register(fn):
+        INTERMEDIATES[name] = (_with_inputs(fn, inputs), tuple(inputs))
+        return fn
+    return register
+
+
+def resolve(name, data):
+    """The intermediate `name` of `data`, computed on first use."""
+    memo = getattr(data, 'intermediates', None)
+    if memo is not None and name in memo:
+        return memo[name]
+    value = INTERMEDIATES[name][0](data)
+    if memo is not None:
+        memo[name] = value
+    return value
+
+
+def _cached(chart_id, backend, fn):
+    @functools.wraps(fn)
+    def run(data):
+        cache = getattr(data, 'view_cache', None)
+        if cache is None:
+            return fn(data)
+        start = time.perf_counter()
+        key = (data.dataset_version, chart_id, backend, data.filters.key(DEPENDS.get(chart_id)))
+        cache.add_key_time(time.perf_counter() - start)
+        # Shared between sessions: every caller gets its own copy
+        return cache.get_or_compute(key, lambda: fn(data)).copy()
+    return run
+
+
+def aggregation(chart_id, backend="pandas", inputs=(), depends=None):
+    def register(fn):
+        IMPLEMENTATIONS[(chart_id, backend)] = _cached(chart_id, backend, _with_inputs(fn, inputs))
+        if depends is not None:
+            DEPENDS[chart_id] = tuple(depends)
+        return fn
+    return register
+
+
+def compute(chart_id, data):
+    results = getattr(data, 'results', None)
+    if results is None:
+        return _compute(chart_id, data)
+    key = data.filters.key(DEPENDS.get(chart_id))
+    last = results.get(chart_id)
+    if last is None or last[0] != key:
+        last = results[chart_id] = (key, _compute(chart_id, data))
+    # The views add columns to what they get; the stored frame stays as computed
+    return last[1].copy()
+
+
+def _compute(chart_id, data):
+    # data.backends lists the implementations to try, best first (e.g. the
+    # daily cube, then the pandas aggregation every chart has)
+    for backend in getattr(data, 'backends', (data.backend,)):
+        fn = IMPLEMENTATIONS.get((chart_id, backend))
+        if fn is not None:
+            return fn(data)
+    raise KeyError(f"No aggregation registered for {chart_id!r}")
+
+
+def depends_on(chart_ids):
+    """The slicers any of `chart_ids` depends on (None: all of them)."""
+    declared = [DEPENDS.get(chart_id) for chart_id in chart_ids]
+    if any(slicers is None for slicers in declared):
+        return None
+    return tuple(dict.fromkeys(slicer for slicers in declared for slicer in slicers))
+
+
+def chart_ids(backend="pandas"):
+    return sorted(cid for cid, b in IMPLEMENTATIONS if b == backend)
+
+
+# --- Comparing results (backend parity, typed vs. untyped frames) ---
+
+def _normalized(df):
+    """Numbers as float, everything else as str, rows in a canonical order."""
+    out = pd.DataFrame({
+        col: (df[col].astype(float) if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_bool_dtype(df[col])
+              else df[col].astype(str))
+        for col in df.columns
+    })
+    keys = [c for c in out.columns if out[c].dtype != float] or list(out.columns)
+    return out.sort_values(keys).reset_index(drop=True)
+
+
+def difference(expected, actual):
+    """How two results of one chart differ (None: same numbers)."""
+    if set(actual.columns) != set(expected.columns):
+        return f"columns {sorted(actual.columns)} != {sorted(expected.columns)}"
+    expected, actual = _normalized(expected), _normalized(actual[list(expected.columns)])
+    if len(actual) != len(expected):
+        return f"{len(actual)} rows != {len(expected)}"
+    for col in expected.columns:
+        if expected[col].dtype == float:
+            same = np.allclose(expected[col], actual[col], rtol=1e-9, atol=1e-9, equal_nan=True)
+        else:
+            same = (expected[col] == actual[col]).all()
+        if not same:
+            return f"values differ in {col!r}"
+    return None
+
+
+def compare(expected_data, actual_data, chart_ids):
+    """Returns {chart_id: problem} for every chart whose numbers differ."""
+    problems = {}
+    for chart_id in chart_ids:
+        problem = difference(compute(chart_id, expected_data), compute(chart_id, actual_data))
+        if problem is not None:
+            problems[chart_id] = problem
+    return problems
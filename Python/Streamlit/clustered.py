@@ -0,0 +1,33 @@
+"""Per-session facts of a pageviews frame clustered by session.
+
+The loader stores the pageviews with each session's rows next to each
+other, ordered by created_at (see partitions.partition_frames), and every
+subset the filters take keeps that order. First page, last page and page
+depth are then read off the run boundaries: no sort and no groupby.
+"""
+import numpy as np
+import pandas as pd
+
+
+def first_rows(df_pv):
+    """Mask of the first (landing) pageview of every session."""
+    keys = df_pv['website_session_id'].to_numpy()
+    return np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+
+
+def last_rows(df_pv):
+    """Mask of the last (exit) pageview of every session."""
+    keys = df_pv['website_session_id'].to_numpy()
+    return np.r_[keys[1:] != keys[:-1], True] if len(keys) else np.zeros(0, dtype=bool)
+
+
+def session_runs(df_pv):
+    """Run number (0, 1, ...) of every row: which session of the frame it belongs to."""
+    return np.cumsum(first_rows(df_pv)) - 1
+
+
+def depth(df_pv):
+    """Pageviews per session, indexed by website_session_id."""
+    firsts = np.flatnonzero(first_rows(df_pv))
+    return pd.Series(np.diff(np.r_[firsts, len(df_pv)]),
+                     index=pd.Index(df_pv['website_session_id'].to_numpy()[firsts], name='website_session_id'))
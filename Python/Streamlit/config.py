@@ -0,0 +1,86 @@
+import os
+
+# Dashboard settings. Every value can be overridden with an environment
+# variable so deployments don't need code changes.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+# --- Snapshot cache (columnar copy of the cleaned frames) ---
+SNAPSHOT_ENABLED = _env_flag("DASHBOARD_SNAPSHOT", "1")
+SNAPSHOT_DIR = os.environ.get("DASHBOARD_SNAPSHOT_DIR", os.path.join(SCRIPT_DIR, ".snapshot"))
+
+# --- Channel classification (http_referer -> utm_source rules) ---
+CHANNEL_RULES_PATH = os.environ.get("DASHBOARD_CHANNEL_RULES", os.path.join(SCRIPT_DIR, "channel_rules.json"))
+
+# --- Conversion funnel (ordered stages, url -> stage rules) ---
+FUNNEL_STAGES_PATH = os.environ.get("DASHBOARD_FUNNEL_STAGES", os.path.join(SCRIPT_DIR, "funnel_stages.json"))
+
+# --- Ingestion ---
+# Threads used to read and type the six CSVs at the same time (1 = one after another)
+LOAD_WORKERS = int(os.environ.get("DASHBOARD_LOAD_WORKERS", min(6, os.cpu_count() or 1)))
+# pandas CSV engine: "c" (default) or "pyarrow" (multithreaded reader, needs pyarrow)
+CSV_ENGINE = os.environ.get("DASHBOARD_CSV_ENGINE", "c")
+
+# --- Logging (load timings etc.) ---
+LOG_LEVEL = os.environ.get("DASHBOARD_LOG_LEVEL", "INFO").upper()
+
+# --- Dataset sharing ---
+# "shared": one read-only copy of the frames for every session and rerun
+# "copy":   st.cache_data, every rerun gets its own deep copy
+DATASET_MODE = os.environ.get("DASHBOARD_DATASET_MODE", "shared").lower()
+
+# --- Incremental refresh ---
+# Parse only the rows appended to the event CSVs since the last snapshot
+INCREMENTAL_ENABLED = _env_flag("DASHBOARD_INCREMENTAL", "1")
+
+# --- Query backend ---
+# "pandas": filter and aggregate the frames in process (default)
+# "duckdb": run the filters and chart aggregations in embedded DuckDB (needs duckdb)
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "pandas").lower()
+
+# --- Daily cube ---
+# Distinct users (visitors, repeat visitors, sessions per user) estimated from
+# the cube's HyperLogLog sketch (~0.8% error, labelled "est." in the views)
+# instead of counted exactly over the filtered sessions
+CUBE_SKETCH_USERS = _env_flag("DASHBOARD_CUBE_SKETCH_USERS", "0")
+
+# --- Filter result cache ---
+# Memory budget (MB) for filtered table sets shared by all sessions; 0 turns it off
+FILTER_CACHE_MB = float(os.environ.get("DASHBOARD_FILTER_CACHE_MB", "512"))
+
+# --- Fragments ---
+# The parts with their own widgets (the lazy chart tabs, the sidebar with
+# the apply button) rerun on their own (st.fragment) instead of rerunning
+# the whole script
+FRAGMENTS_ENABLED = _env_flag("DASHBOARD_FRAGMENTS", "1")
+# Slicer edits wait for an "Apply filters" button (the sidebar becomes a
+# fragment too) instead of applying at once; needs fragments
+APPLY_BUTTON = _env_flag("DASHBOARD_APPLY_BUTTON", "0")
+
+# --- Lazy charts ---
+# Heavier chart groups sit behind tabs and are computed only when opened
+LAZY_CHARTS = _env_flag("DASHBOARD_LAZY_CHARTS", "1")
+
+# --- Chart result cache ---
+# Chart results shared by all sessions, keyed by dataset version + filters; 0 turns it off
+VIEW_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_VIEW_CACHE_ENTRIES", "2048"))
+
+# --- Figure payload ---
+# Points per figure sent to the browser; longer line traces are downsampled (0 turns it off)
+FIGURE_POINT_BUDGET = int(os.environ.get("DASHBOARD_FIGURE_POINTS", "4000"))
+# Scatter/line traces with at least this many points are drawn with WebGL (0 turns it off)
+WEBGL_MIN_POINTS = int(os.environ.get("DASHBOARD_WEBGL_POINTS", "1000"))
+
+# --- Figure cache ---
+# Finished (built, styled, slimmed) figures shared by all sessions, keyed like the chart results; 0 turns it off
+FIGURE_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_FIGURE_CACHE_ENTRIES", "512"))
+
+# --- Warm-up ---
+# Precompute every page for the default filters when the server process
+# starts (`python serve.py`; under `streamlit run app.py`, when the first
+# session runs the script; see warmup.py)
+WARMUP_ENABLED = _env_flag("DASHBOARD_WARMUP", "1")
@@ -0,0 +1,122 @@
+"""Product pair co-occurrence across orders (the cross-sell chart).
+
+With X the order x product incidence matrix (1 when the order has at
+least one item of the product), the pair counts are C = X^T X: C[a, b] is
+the number of orders with both a and b, and the diagonal C[a, a] is the
+number of orders with a. X is sparse (a handful of products per order),
+so C is accumulated from the (order, product) entries directly: every
+order's entries are paired with each other and counted with one bincount
+over the product id space, no Python loop over orders.
+
+From C and the number of orders n (orders with at least one item counted):
+
+    support(a, b)    = C[a, b] / n
+    confidence(a->b) = C[a, b] / C[a, a]
+    lift(a, b)       = C[a, b] * n / (C[a, a] * C[b, b])
+
+Counts only ever add up, so orders appended later are folded in with
+CoOccurrence.add without recounting the ones already seen.
+"""
+import numpy as np
+import pandas as pd
+
+# Orders folded in per bincount (bounds the memory of the pair arrays)
+CHUNK_ORDERS = 1 << 18
+
+
+def _incidence(order_ids, product_ids):
+    """Distinct (order, product) entries, sorted by order."""
+    orders = np.asarray(order_ids, dtype='int64')
+    products = np.asarray(product_ids, dtype='int64')
+    if not len(products):
+        return orders, products
+    bound = int(products.max()) + 1
+    keys = np.unique(orders * bound + products)
+    return keys // bound, keys % bound
+
+
+class CoOccurrence:
+    """Pair counts C over products 0 .. n_products - 1 (product_id is a small dense integer)."""
+
+    def __init__(self, n_products):
+        self.n_products = n_products
+        self.counts = np.zeros((n_products, n_products), dtype='int64')
+        self.orders = 0
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    @classmethod
+    def of(cls, df_oi, n_products=None):
+        """Counts of the orders of an items frame (order_id, product_id)."""
+        if n_products is None:
+            n_products = int(df_oi['product_id'].max()) + 1 if len(df_oi) else 0
+        engine = cls(n_products)
+        engine.add(df_oi['order_id'], df_oi['product_id'])
+        return engine
+
+    @classmethod
+    def from_json(cls, raw):
+        engine = cls(len(raw['counts']))
+        engine.counts = np.asarray(raw['counts'], dtype='int64').reshape(engine.counts.shape)
+        engine.orders = raw['orders']
+        return engine
+
+    def to_json(self):
+        return {'counts': self.counts.tolist(), 'orders': self.orders}
+
+    def add(self, order_ids, product_ids):
+        """Folds in the items of new orders (one row per item, any order).
+
+        Every order must come in one call: items of an order already
+        counted would count it twice.
+        """
+        orders, products = _incidence(order_ids, product_ids)
+        if len(products) and products.max() >= self.n_products:
+            self._grow(int(products.max()) + 1)
+        firsts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]]) if len(orders) else np.zeros(0, 'int64')
+        bounds = np.r_[firsts, len(orders)]
+        for lo in range(0, len(firsts), CHUNK_ORDERS):
+            hi = min(lo + CHUNK_ORDERS, len(firsts))
+            self._add_runs(products[bounds[lo]:bounds[hi]], np.diff(bounds[lo:hi + 1]))
+        self.orders += len(firsts)
+        return self
+
+    def _add_runs(self, products, sizes):
+        # Entry i of a run of k entries starting at s pairs with s .. s + k - 1,
+        # i.e. the k x k block of that order in X^T X
+        run_sizes = np.repeat(sizes, sizes)
+        run_starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        left = np.repeat(np.arange(len(products)), run_sizes)
+        offsets = np.arange(run_sizes.sum()) - np.repeat(np.cumsum(run_sizes) - run_sizes, run_sizes)
+        right = np.repeat(run_starts, run_sizes) + offsets
+        pair_keys = products[left] * self.n_products + products[right]
+        self.counts += np.bincount(pair_keys, minlength=self.n_products ** 2).reshape(self.counts.shape)
+
+    def _grow(self, n_products):
+        counts = np.zeros((n_products, n_products), dtype='int64')
+        counts[:self.n_products, :self.n_products] = self.counts
+        self.n_products, self.counts = n_products, counts
+
+    def pairs(self):
+        """One row per unordered pair bought together: a < b, count, support, lift."""
+        a, b = np.nonzero(np.triu(self.counts, k=1))
+        both = self.counts[a, b]
+        single = np.diag(self.counts)
+        return pd.DataFrame({
+            'product_a': a,
+            'product_b': b,
+            'count': both,
+            'support': both / self.orders,
+            'lift': both * self.orders / (single[a] * single[b]),
+        })
+
+    def rules(self):
+        """One row per direction a -> b of every pair: count, support, confidence, lift."""
+        pairs = self.pairs()
+        flipped = pairs.rename(columns={'product_a': 'product_b', 'product_b': 'product_a'})
+        out = pd.concat([pairs, flipped], ignore_index=True).rename(
+            columns={'product_a': 'antecedent', 'product_b': 'consequent'})
+        out['confidence'] = out['count'] / np.diag(self.counts)[out['antecedent'].to_numpy()]
+        return out[['antecedent', 'consequent', 'count', 'support', 'confidence', 'lift']]
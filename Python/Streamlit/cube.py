@@ -0,0 +1,304 @@
+"""Daily OLAP cube of the session and order measures, built at load time.
+
+One row per (date, order_date, utm_source, utm_campaign, device_type,
+is_repeat_session):
+
+- `date` is the session's day, `order_date` the order's day. Session
+  measures sit in rows with order_date == date; an order placed the day
+  after its session (a session past midnight) gets its own row. The
+  sidebar keeps an order only when both days are in range, so the roll-up
+  is exact for whole-day ranges.
+- measures: sessions, pageviews, bounces, orders, order_sessions, items,
+  revenue, margin, and the distinct users as a HyperLogLog sketch, which
+  merges across rows (union) and is estimated after the roll-up.
+- order_sessions counts a session once, in the row of its first order's
+  day. Every later order is on the same day or after it, so whenever any of
+  a session's orders is in range its first one is too.
+
+Distinct users are counted exactly over the filtered sessions unless
+config.CUBE_SKETCH_USERS asks for the sketch estimate (the views then
+label those numbers as estimates); marketing.repeat_users, nothing but
+distinct counts, is only rolled up from the cube in that case.
+
+The KPI cards and trend charts registered below (backend "cube") roll the
+cube up instead of grouping raw rows, so their cost follows the number of
+days in range. charts.compute falls back to the pandas aggregations when
+the filters are not whole days (filters.FilteredData.backends).
+"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import charts
+import config
+
+DIMENSIONS = ['utm_source', 'utm_campaign', 'device_type', 'is_repeat_session']
+KEYS = ['date', 'order_date'] + DIMENSIONS
+SESSION_MEASURES = ['sessions', 'pageviews', 'bounces']
+ORDER_MEASURES = ['orders', 'order_sessions', 'items', 'revenue', 'margin']
+
+# --- Distinct users sketch (HyperLogLog, 2^14 registers: ~0.8% error) ---
+
+HLL_PRECISION = 14
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+def _hash64(values):
+    # splitmix64 finalizer, wraps modulo 2^64
+    x = values.astype('uint64') + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hll_entries(user_ids):
+    """(register, rank) of every user id."""
+    h = _hash64(np.asarray(user_ids))
+    bits = 64 - HLL_PRECISION
+    register = (h >> np.uint64(bits)).astype('int64')
+    rest = (h & np.uint64((1 << bits) - 1)).astype('float64')  # < 2^53, exact
+    rank = bits + 1 - np.frexp(rest)[1]  # leading zeros + 1
+    return register, rank.astype('uint8')
+
+
+def _hll_estimate(register, rank):
+    registers = np.zeros(HLL_REGISTERS, dtype='uint8')
+    np.maximum.at(registers, register, rank)
+    m = HLL_REGISTERS
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers.astype('float64')))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # linear counting for small sets
+    return float(estimate)
+
+
+# --- Cube ---
+
+@dataclass(frozen=True, eq=False)
+class DailyCube:
+    cells: pd.DataFrame   # KEYS + measures, sorted by KEYS
+    sketch: pd.DataFrame  # cell, register, rank (max rank per cell/register)
+
+    @classmethod
+    def build(cls, df_s, df_o, facts):
+        """From the sessions, orders and their session_facts."""
+        sessions = df_s[['website_session_id', 'user_id', 'created_at'] + DIMENSIONS]
+        sessions = sessions[sessions['created_at'].notna()]
+        depth = facts.loc[sessions.index, 'pv_count'].to_numpy()
+        day = sessions['created_at'].dt.normalize()
+        session_rows = sessions[DIMENSIONS].assign(
+            date=day, order_date=day, sessions=1, pageviews=depth, bounces=(depth == 1).astype('int64'))
+
+        # Orders take the dimensions of their session
+        pos = pd.Index(sessions['website_session_id']).get_indexer(df_o['website_session_id'])
+        keep = (pos >= 0) & df_o['created_at'].notna().to_numpy()
+        orders, pos = df_o[keep], pos[keep]
+        order_day = orders['created_at'].dt.normalize().to_numpy()
+        # A session counts once, with its first order
+        by_day = np.argsort(order_day, kind='stable')
+        first_order = np.empty(len(orders), dtype=bool)
+        first_order[by_day] = ~pd.Series(orders['website_session_id'].to_numpy()[by_day]).duplicated().to_numpy()
+        order_rows = sessions[DIMENSIONS].iloc[pos].reset_index(drop=True).assign(
+            date=day.iloc[pos].to_numpy(),
+            order_date=order_day,
+            orders=1,
+            order_sessions=first_order.astype('int64'),
+            items=orders['items'].to_numpy(),
+            revenue=orders['revenue'].to_numpy(),
+            margin=orders['margin'].to_numpy(),
+        )
+
+        rows = pd.concat([session_rows.reset_index(drop=True), order_rows], ignore_index=True)
+        measures = SESSION_MEASURES + ORDER_MEASURES
+        rows[measures] = rows[measures].fillna(0)
+        grouped = rows.groupby(KEYS, observed=True, sort=True)
+        cell = grouped.ngroup().to_numpy()
+        cells = grouped[measures].sum().reset_index()
+        cells = cells.astype({m: 'int64' for m in measures if m not in ('revenue', 'margin')})
+
+        # One sketch entry per (cell, register), keeping the highest rank
+        register, rank = _hll_entries(sessions['user_id'].to_numpy())
+        key = cell[:len(sessions)].astype('int64') * HLL_REGISTERS + register
+        best = pd.Series(rank).groupby(key).max()
+        sketch = pd.DataFrame({
+            'cell': (best.index.to_numpy() // HLL_REGISTERS).astype('int64'),
+            'register': (best.index.to_numpy() % HLL_REGISTERS).astype('int64'),
+            'rank': best.to_numpy(),
+        })
+        return cls(cells, sketch)
+
+    @staticmethod
+    def covers(filters):
+        """The roll-up is exact for ranges of whole days (what the sidebar picks)."""
+        return filters.start == filters.start.normalize() and filters.end == filters.end.normalize()
+
+    def select(self, filters):
+        """The cells in the sidebar selection (with their cell number as `cell`)."""
+        dates = self.cells['date'].to_numpy()
+        lo = np.searchsorted(dates, filters.start.to_datetime64(), side='left')
+        hi = np.searchsorted(dates, filters.end.to_datetime64(), side='left')
+        cells = self.cells.iloc[lo:hi].assign(cell=np.arange(lo, hi))
+        keep = ((cells['order_date'] >= filters.start) & (cells['order_date'] < filters.end)
+                & cells['utm_source'].isin(filters.utm_sources))
+        return cells[keep]
+
+    def users(self, cell_ids):
+        """Estimated distinct users over the cells `cell_ids`."""
+        chosen = np.zeros(len(self.cells), dtype=bool)
+        chosen[np.asarray(cell_ids)] = True
+        entries = self.sketch[chosen[self.sketch['cell'].to_numpy()]]
+        return _hll_estimate(entries['register'].to_numpy(), entries['rank'].to_numpy())
+
+    def users_by(self, cells, by):
+        return cells.groupby(by, observed=True)['cell'].agg(self.users)
+
+
+# --- Roll-ups (charts.py, backend "cube") ---
+
+def _users(data, cells, sessions):
+    """Distinct users of the selected cells, exact over the matching filtered sessions
+    unless config.CUBE_SKETCH_USERS."""
+    if config.CUBE_SKETCH_USERS:
+        return data.cube.users(cells['cell'])
+    return sessions['user_id'].nunique()
+
+
+def _label(cells):
+    return cells['utm_source'].astype(object) + "\n" + cells['utm_campaign'].astype(object)
+
+
+@charts.aggregation("business.kpis", backend="cube")
+def business_kpis(data):
+    c = data.cube.select(data.filters)
+    return pd.DataFrame([{
+        'revenue': c['revenue'].sum(),
+        'margin': c['margin'].sum(),
+        'orders': c['orders'].sum(),
+        'sessions': c['sessions'].sum(),
+        'users': _users(data, c, data.sessions),
+    }])
+
+
+@charts.aggregation("business.utm_share", backend="cube")
+def business_utm_share(data):
+    c = data.cube.select(data.filters)
+    c = c[c['orders'] > 0]
+    return c.groupby(_label(c).rename('UTM')).agg(
+        Revenue=('revenue', 'sum'), Quantity=('items', 'sum')).reset_index()
+
+
+@charts.aggregation("business.sessions_by_channel", backend="cube")
+def business_sessions_by_channel(data):
+    c = data.cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    return c.groupby('utm_source', observed=True)['sessions'].sum().reset_index(name='website_session_id')
+
+
+@charts.aggregation("business.sessions_by_campaign", backend="cube")
+def business_sessions_by_campaign(data):
+    c = data.cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    return c.groupby('utm_campaign', observed=True)['sessions'].sum().reset_index(name='website_session_id')
+
+
+@charts.aggregation("business.revenue_trend", backend="cube")
+def business_revenue_trend(data):
+    c = data.cube.select(data.filters)
+    c = c[c['orders'] > 0]
+    year = c['order_date'].dt.year.rename('year')
+    month = c['order_date'].dt.month.rename('month')
+    return c.groupby([year, month])['revenue'].sum().reset_index()
+
+
+@charts.aggregation("website.kpis", backend="cube")
+def website_kpis(data):
+    c = data.cube.select(data.filters)
+    return pd.DataFrame([{
+        'sessions': c['sessions'].sum(),
+        'bounces': c['bounces'].sum(),
+        'order_sessions': c['order_sessions'].sum(),
+        'pageviews': c['pageviews'].sum(),
+        'revenue': c['revenue'].sum(),
+    }])
+
+
+@charts.aggregation("website.monthly_sessions", backend="cube")
+def website_monthly_sessions(data):
+    c = data.cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    year = c['date'].dt.year.rename('year')
+    month = c['date'].dt.month.rename('month')
+    return c.groupby([year, month])['sessions'].sum().reset_index(name='website_session_id')
+
+
+@charts.aggregation("website.device", backend="cube")
+def website_device(data):
+    c = data.cube.select(data.filters)
+    sessions = c[c['sessions'] > 0].groupby('device_type', observed=True)['sessions'].sum()
+    orders = c[c['orders'] > 0].groupby('device_type', observed=True)['orders'].sum()
+    return (sessions.rename('Sessions').reset_index().rename(columns={'device_type': 'Device'})
+            .merge(orders.rename('Conversions').reset_index().rename(columns={'device_type': 'Device'}),
+                   on='Device'))
+
+
+@charts.aggregation("website.bounce_trend", backend="cube")
+def website_bounce_trend(data):
+    c = data.cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    year_month = c['date'].dt.to_period('M').astype(str).rename('year_month')
+    return c.groupby(year_month)[['sessions', 'bounces']].sum().reset_index()
+
+
+@charts.aggregation("marketing.kpis", backend="cube")
+def marketing_kpis(data):
+    c = data.cube.select(data.filters)
+    gsearch = c['utm_source'] == 'gsearch'
+    repeat = c['is_repeat_session'].astype(bool)
+    df_s = data.sessions
+    return pd.DataFrame([{
+        'visitors': _users(data, c, df_s),
+        'sessions': c['sessions'].sum(),
+        'g_sessions': c.loc[gsearch, 'sessions'].sum(),
+        'g_orders': c.loc[gsearch, 'orders'].sum(),
+        'repeat_sessions': c.loc[repeat, 'sessions'].sum(),
+        'repeat_visitors': _users(data, c[repeat], df_s[df_s['is_repeat_session'] == 1]),
+    }])
+
+
+@charts.aggregation("marketing.monthly_source", backend="cube")
+def marketing_monthly_source(data):
+    c = data.cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    year_month = c['date'].dt.to_period('M').astype(str).rename('year_month')
+    return c.groupby([year_month, 'utm_source'], observed=True)['sessions'].sum().reset_index()
+
+
+@charts.aggregation("marketing.revenue_by_campaign", backend="cube")
+def marketing_revenue_by_campaign(data):
+    c = data.cube.select(data.filters)
+    c = c[c['orders'] > 0]
+    return c.groupby(_label(c).rename('source_campaign'))['revenue'].sum().reset_index()
+
+
+@charts.aggregation("marketing.conversion_by_source", backend="cube")
+def marketing_conversion_by_source(data):
+    c = data.cube.select(data.filters)
+    sessions = c[c['sessions'] > 0].groupby('utm_source', observed=True)['sessions'].sum()
+    orders = c[c['orders'] > 0].groupby('utm_source', observed=True)['orders'].sum()
+    conv_df = sessions.reset_index().merge(orders.reset_index(), on='utm_source', how='left')
+    conv_df['orders'] = conv_df['orders'].fillna(0)
+    return conv_df
+
+
+def marketing_repeat_users(data):
+    cube = data.cube
+    c = cube.select(data.filters)
+    c = c[c['sessions'] > 0]
+    total = cube.users_by(c, 'utm_source').rename('total_users')
+    repeat = cube.users_by(c[c['is_repeat_session'].astype(bool)], 'utm_source').rename('repeat_users')
+    user_df = total.reset_index().merge(repeat.reset_index(), on='utm_source', how='left')
+    user_df['repeat_users'] = user_df['repeat_users'].fillna(0)
+    return user_df
+
+
+if config.CUBE_SKETCH_USERS:
+    charts.aggregation("marketing.repeat_users", backend="cube")(marketing_repeat_users)
@@ -1,81 +1,359 @@
 import pandas as pd
 import streamlit as st
 import os
-import numpy as np
+import io
+import json
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+import schema
+import channels
+import partitions
+import join_index
+import cube
+import cooccurrence
+import session_facts
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional, without it we always parse the CSVs
+    feather = None
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames are shared between sessions in DATASET_MODE "shared": with copy on
+# write, frames derived from them never write back into the shared data.
+# pandas 3 always copies on write; pandas 2 needs the option
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+logger = logging.getLogger(__name__)
+
+# Source CSVs, keyed by the name used for the table everywhere else
+SOURCE_FILES = {
+    'sessions': 'website_sessions.csv',
+    'orders': 'orders.csv',
+    'items': 'order_items.csv',
+    'products': 'products.csv',
+    'refunds': 'order_item_refunds.csv',
+    'pageviews': 'website_pageviews.csv',
+}
+
+# Frames returned by load_data, in order
+FRAME_NAMES = ['sessions', 'orders', 'items', 'products', 'pageviews']
+# The snapshot also keeps the refunds, incremental refreshes need them
+SNAPSHOT_FRAMES = FRAME_NAMES + ['refunds']
+
+# Event tables that only ever grow by appended rows. Any other change
+# (products, channel rules, an edited or truncated file) is a full rebuild.
+APPEND_ONLY = ['sessions', 'pageviews', 'orders', 'items', 'refunds']
+
+# Per-order aggregates joined onto the orders frame
+ORDER_AGGREGATES = {'revenue': 'float64', 'margin': 'float64', 'items': 'int64'}
+
+# Bump whenever the cleaning steps change so old snapshots are rebuilt
+SNAPSHOT_VERSION = 10
+
+# Bytes hashed at the start of a file and just before its watermark to
+# tell an append (both unchanged) from an edit
+_DIGEST_BYTES = 4096
 
 def _build_path(file_name):
     return os.path.join(SCRIPT_DIR, file_name)
 
-def _try_read(paths):
+def _try_read(paths, dtype=None):
+    # Returns None when no path exists; runs on worker threads, so the
+    # caller reports the error (st.* calls need the script thread)
     for p in paths:
         try:
-            if p.endswith('.csv'): return pd.read_csv(p)
-            elif p.endswith('.xlsx'): return pd.read_excel(p)
+            if p.endswith('.csv'): return pd.read_csv(p, dtype=dtype, engine=config.CSV_ENGINE)
+            elif p.endswith('.xlsx'): return pd.read_excel(p, dtype=dtype)
         except FileNotFoundError: continue
-    st.error(f"File not found: {paths[0]}")
-    st.stop()
+    return None
 
-@st.cache_data
-def load_data():
-    # 1. Load
-    df_s = _try_read([_build_path('website_sessions.csv')])
-    df_o = _try_read([_build_path('orders.csv')])
-    df_oi = _try_read([_build_path('order_items.csv')])
-    df_p = _try_read([_build_path('products.csv')])
-    df_r = _try_read([_build_path('order_item_refunds.csv')])
-    df_pv = _try_read([_build_path('website_pageviews.csv')]) # Load Pageviews
-
-    # 2. Dates
-    for df in [df_s, df_o, df_oi, df_p, df_r, df_pv]:
-        if 'created_at' in df.columns:
-            df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
+# --- Snapshot cache ---
 
-    # 3. Cleaning
+def _stat_entry(path):
+    try:
+        stat = os.stat(path)
+        return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        return [os.path.basename(path), None, None]
 
-    utm_source_2=[]
+def _source_fingerprint():
+    """Cheap key for the current inputs: size and mtime of each CSV and of the channel rules."""
+    paths = [_build_path(f) for f in SOURCE_FILES.values()] + [config.CHANNEL_RULES_PATH]
+    raw = json.dumps([SNAPSHOT_VERSION, [_stat_entry(p) for p in paths]])
+    return hashlib.sha1(raw.encode()).hexdigest()
 
-    for i in df_s.http_referer:
-        if i=="https://www.gsearch.com":
-            utm_source_2.append("gsearch")
-        elif i=="https://www.bsearch.com":
-            utm_source_2.append("bsearch")
-        elif i=="https://www.socialbook.com":
-            utm_source_2.append("socialbook")
-        else:
-            utm_source_2.append(np.nan)
+def _static_inputs():
+    """Inputs that are not append-only; when they change we rebuild from scratch."""
+    return [SNAPSHOT_VERSION, _stat_entry(_build_path(SOURCE_FILES['products'])),
+            _stat_entry(config.CHANNEL_RULES_PATH)]
 
-    utm_source_2=pd.Series(utm_source_2)
-    df_s["utm_source"]=utm_source_2
+def _snapshot_path(name):
+    return os.path.join(config.SNAPSHOT_DIR, f"{name}.arrow")
 
-# print(website_sessions.isna().sum()/website_sessions.shape[0]*100)    #crossing the threshold of 5%
+def _manifest_path():
+    return os.path.join(config.SNAPSHOT_DIR, 'manifest.json')
 
-    df_s.fillna("Untracked",inplace=True)
+def _snapshot_enabled():
+    return feather is not None and config.SNAPSHOT_ENABLED
 
+def _read_manifest():
+    if not _snapshot_enabled():
+        return None
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
+def _read_frame(name):
+    # Uncompressed Arrow IPC files are memory mapped, not parsed. With
+    # split_blocks numeric columns stay zero-copy views of the (read-only) map.
+    table = feather.read_table(_snapshot_path(name), memory_map=True)
+    return table.to_pandas(split_blocks=True)
 
+def _read_snapshot_frames(names=SNAPSHOT_FRAMES):
+    try:
+        return {n: _read_frame(n) for n in names}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable snapshot in %s: %s", config.SNAPSHOT_DIR, e)
+        return None
 
+def _indexes(frames, pageview_partitions):
+    """Row indexes for filters.apply_filters: time indexes where the frame
+    is sorted by created_at, month partitions for the pageviews and the id
+    bounds for the session -> orders/items cascade, per-session row ranges
+    of the (session clustered) pageviews."""
+    index = {n: partitions.TimeIndex.of(frames[n]) for n in partitions.TIME_SORTED}
+    index['pageviews'] = pageview_partitions
+    index['ids'] = join_index.IdSpace.of(frames['sessions'], frames['orders'], frames['items'], frames['pageviews'])
+    if index['ids'].session_bound is not None:
+        index['pageview_rows'] = join_index.SessionRows.of(frames['pageviews'], index['ids'].session_bound)
+    return index
 
-    
-    # if 'utm_source' not in df_s.columns: df_s['utm_source'] = 'untracked'
-    # df_s['utm_source'] = df_s['utm_source'].fillna('untracked')
-    
+def _read_pairs(manifest):
+    raw = manifest.get('cooccurrence')
+    return None if raw is None else cooccurrence.CoOccurrence.from_json(raw)
+
+def _read_snapshot(key):
+    """Returns (frames, row indexes, product pair counts) if the snapshot was built from `key`, else None."""
+    manifest = _read_manifest()
+    if manifest is None or manifest.get('key') != key:
+        return None
+    frames = _read_snapshot_frames(FRAME_NAMES)
+    if not frames:
+        return None
+    pageview_partitions = partitions.PartitionIndex.from_json(manifest['pageview_partitions'])
+    return tuple(frames[n] for n in FRAME_NAMES), _indexes(frames, pageview_partitions), _read_pairs(manifest)
+
+def _replace_file(path, write):
+    # Write next to the target and rename over it: sessions still holding
+    # the old memory map keep reading the old (now unlinked) file
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def _write_snapshot(key, frames, watermarks, pageview_partitions, pairs):
+    if not _snapshot_enabled():
+        return
+    try:
+        os.makedirs(config.SNAPSHOT_DIR, exist_ok=True)
+        # Drop the manifest first so a half written snapshot is never trusted
+        if os.path.exists(_manifest_path()):
+            os.remove(_manifest_path())
+        for name in SNAPSHOT_FRAMES:
+            df = frames[name].reset_index(drop=True)
+            _replace_file(_snapshot_path(name),
+                          lambda p: feather.write_feather(df, p, compression='uncompressed'))
+        manifest = {
+            'key': key,
+            'version': SNAPSHOT_VERSION,
+            'frames': SNAPSHOT_FRAMES,
+            'static': _static_inputs(),
+            'watermarks': watermarks,
+            # Row range of every month in the pageviews file
+            'pageview_partitions': pageview_partitions.to_json(),
+            # Product pair counts of every item, kept up to date by _refresh_frames
+            'cooccurrence': pairs.to_json(),
+        }
+        def write_manifest(p):
+            with open(p, 'w') as f:
+                json.dump(manifest, f)
+        _replace_file(_manifest_path(), write_manifest)
+    except OSError as e:
+        logger.warning("Could not write snapshot to %s: %s", config.SNAPSHOT_DIR, e)
+
+# --- Watermarks (incremental refresh) ---
+
+def _digest(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+def _max_created_at(df, previous=None):
+    latest = df['created_at'].max() if len(df) else pd.NaT
+    if previous is not None and (pd.isna(latest) or pd.Timestamp(previous) > latest):
+        return previous
+    return None if pd.isna(latest) else str(latest)
+
+def _ends_with_newline(path, size):
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - 1))
+        return f.read(1) == b'\n'
+
+def _watermark(name, offset, columns, max_created_at):
+    """Where the next refresh of `name` starts reading, plus what it must still find there."""
+    path = _build_path(SOURCE_FILES[name])
+    return {
+        'offset': offset,
+        'head': _digest(path, 0, min(offset, _DIGEST_BYTES)),
+        'tail': _digest(path, max(0, offset - _DIGEST_BYTES), offset),
+        'max_created_at': max_created_at,
+        'columns': columns,
+    }
+
+def _plan_refresh(manifest):
+    """Current size of every append-only file, or None when a full rebuild is needed."""
+    if manifest.get('static') != _static_inputs():
+        logger.info("Full rebuild: products, channel rules or loader version changed")
+        return None
+    marks = manifest.get('watermarks') or {}
+    plan = {}
+    for name in APPEND_ONLY:
+        mark = marks.get(name)
+        path = _build_path(SOURCE_FILES[name])
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        if mark is None or size is None or size < mark['offset']:
+            logger.info("Full rebuild: %s is missing, truncated or has no watermark", name)
+            return None
+        offset = mark['offset']
+        if (_digest(path, 0, min(offset, _DIGEST_BYTES)) != mark['head']
+                or _digest(path, max(0, offset - _DIGEST_BYTES), offset) != mark['tail']):
+            logger.info("Full rebuild: %s was edited before its watermark", name)
+            return None
+        plan[name] = size
+    return plan
+
+def _read_tail(name, mark, size):
+    """Parses the rows appended after the watermark; returns (frame or None, new offset)."""
+    with open(_build_path(SOURCE_FILES[name]), 'rb') as f:
+        f.seek(mark['offset'])
+        data = f.read(size - mark['offset'])
+    # A writer may be half way through the last row, leave it for next time
+    data = data[:data.rfind(b'\n') + 1]
+    offset = mark['offset'] + len(data)
+    if not data.strip():
+        return None, offset
+    df = pd.read_csv(io.BytesIO(data), header=None, names=mark['columns'],
+                     dtype=schema.read_dtypes(name), engine=config.CSV_ENGINE)
+    return schema.apply_schema(name, df), offset
+
+# --- Loading ---
+
+def _read_table(name):
+    """Reads one source table and types it; returns (frame or None, seconds, watermark)."""
+    start = time.perf_counter()
+    path = _build_path(SOURCE_FILES[name])
+    size = os.path.getsize(path) if os.path.exists(path) else None
+    # 1. Load (typed at read time, see schema.SCHEMAS)
+    df = _try_read([path], dtype=schema.read_dtypes(name))
+    if df is None:
+        return None, time.perf_counter() - start, None
+    # Rows appended while we were reading would be read twice by the next
+    # refresh, and a row appended to a file without a final newline would be
+    # glued onto its last row, so only leave a watermark when the file held
+    # still and ends with a complete row
+    mark = None
+    if name in APPEND_ONLY and size == os.path.getsize(path) and _ends_with_newline(path, size):
+        mark = _watermark(name, size, list(df.columns), None)
+    # 2. Dates and flags
+    df = schema.apply_schema(name, df)
+    if mark is not None:
+        mark['max_created_at'] = _max_created_at(df)
+    return df, time.perf_counter() - start, mark
+
+def _read_tables():
+    """Reads all source tables on a thread pool of config.LOAD_WORKERS threads."""
+    workers = max(1, min(config.LOAD_WORKERS, len(SOURCE_FILES)))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='load') as pool:
+        futures = {name: pool.submit(_read_table, name) for name in SOURCE_FILES}
+        results = {name: future.result() for name, future in futures.items()}
+    wall = time.perf_counter() - start
+
+    for name, (df, seconds, _) in results.items():
+        if df is None:
+            st.error(f"File not found: {_build_path(SOURCE_FILES[name])}")
+            st.stop()
+        logger.info("Read %-10s %6.2fs %10d rows %8.1f MB", name, seconds, len(df), schema.memory_mb(df))
+    slowest = max(results, key=lambda n: results[n][1])
+    logger.info("Read %d tables in %.2fs with %d workers (critical path: %s, %.2fs)",
+                len(results), wall, workers, slowest, results[slowest][1])
+    tables = {name: df for name, (df, _, _) in results.items()}
+    watermarks = {name: mark for name, (_, _, mark) in results.items() if mark is not None}
+    return tables, watermarks
+
+def _clean_sessions(df_s):
+    # utm_source is rebuilt from http_referer (rules in channel_rules.json)
+    df_s["utm_source"] = channels.classify_referers(df_s['http_referer'])
+
+# print(website_sessions.isna().sum()/website_sessions.shape[0]*100)    #crossing the threshold of 5%
+
+    return schema.fill_categories(df_s, "Untracked")
+
+def _clean_items(df_oi, df_r):
     # Margins
     df_oi['price_usd'] = pd.to_numeric(df_oi['price_usd']).fillna(0)
     df_oi['cogs_usd'] = pd.to_numeric(df_oi['cogs_usd']).fillna(0)
     df_oi['margin'] = df_oi['price_usd'] - df_oi['cogs_usd']
-    
+
     refund_ids = df_r['order_item_id'].unique()
     df_oi['is_refunded'] = df_oi['order_item_id'].isin(refund_ids)
-    
+    return df_oi
+
+def _order_aggregates(df_oi):
+    return df_oi.groupby('order_id').agg(
+        revenue=('price_usd', 'sum'),
+        margin=('margin', 'sum'),
+        items=('order_item_id', 'count')
+    )
+
+def _join_orders(df_o, df_oi):
+    df_full = df_o.merge(_order_aggregates(df_oi).reset_index(), on='order_id', how='left').fillna(0)
+    return df_full.astype(ORDER_AGGREGATES)
+
+def _refresh_order_aggregates(df_o, df_oi, order_ids):
+    """Recomputes revenue/margin/items for `order_ids` only, keeping the row order."""
+    rows = df_o['order_id'].isin(order_ids).to_numpy()
+    agg = _order_aggregates(df_oi[df_oi['order_id'].isin(order_ids)])
+    ids = df_o['order_id'].to_numpy()[rows]
+    updates = {}
+    for col, dtype in ORDER_AGGREGATES.items():
+        values = df_o[col].fillna(0).to_numpy(dtype=dtype, copy=True)
+        values[rows] = agg[col].reindex(ids, fill_value=0).to_numpy(dtype=dtype)
+        updates[col] = values
+    return df_o.assign(**updates)
+
+def _build_frames():
+    """Parses the source CSVs; returns the cleaned frames (see SNAPSHOT_FRAMES) and their watermarks."""
+    tables, watermarks = _read_tables()
+    df_s, df_o, df_oi = tables['sessions'], tables['orders'], tables['items']
+    df_p, df_r, df_pv = tables['products'], tables['refunds'], tables['pageviews']
+
+    # 3. Cleaning
+    df_s = _clean_sessions(df_s)
+
+    # if 'utm_source' not in df_s.columns: df_s['utm_source'] = 'untracked'
+    # df_s['utm_source'] = df_s['utm_source'].fillna('untracked')
+
+    df_oi = _clean_items(df_oi, df_r)
+
     # Join Orders
     if 'order_id' in df_oi.columns:
-        order_agg = df_oi.groupby('order_id').agg(
-            revenue=('price_usd', 'sum'),
-            margin=('margin', 'sum'),
-            items=('order_item_id', 'count')
-        ).reset_index()
-        df_full = df_o.merge(order_agg, on='order_id', how='left').fillna(0)
+        df_full = _join_orders(df_o, df_oi)
     else:
         df_full = df_o.copy()
 
@@ -83,5 +361,149 @@ def load_data():
     if 'product_name' not in df_p.columns:
         df_p['product_name'] = 'Product ' + df_p['product_id'].astype(str)
 
-    return df_s, df_full, df_oi, df_p, df_pv
+    frames = {'sessions': df_s, 'orders': df_full, 'items': df_oi,
+              'products': df_p, 'pageviews': df_pv, 'refunds': df_r}
+    return frames, watermarks
+
+def _refresh_pairs(pairs, df_oi, new_items):
+    """Folds the items of new orders into the pair counts; None (recount)
+    when some of them belong to orders already counted."""
+    if pairs is None or new_items['order_id'].isin(df_oi['order_id']).any():
+        return None
+    return pairs.add(new_items['order_id'], new_items['product_id'])
+
+def _refresh_frames(manifest):
+    """Appends the new rows of every append-only file to the snapshot frames.
+
+    Returns (frames, watermarks, product pair counts or None), or
+    (None, None, None) when the files changed in a way that needs a full
+    rebuild.
+    """
+    plan = _plan_refresh(manifest)
+    frames = _read_snapshot_frames() if plan is not None else None
+    if frames is None:
+        return None, None, None
+
+    marks = manifest['watermarks']
+    tails = {}
+    for name, size in plan.items():
+        tail, offset = _read_tail(name, marks[name], size)
+        latest = marks[name]['max_created_at']
+        if tail is not None and len(tail):
+            tails[name] = tail
+            logger.info("Appending %d rows to %s (created_at %s to %s)",
+                        len(tail), name, tail['created_at'].min(), tail['created_at'].max())
+            if latest is not None and tail['created_at'].min() < pd.Timestamp(latest):
+                logger.warning("%s: appended rows start before the %s watermark", name, latest)
+            latest = _max_created_at(tail, latest)
+        marks[name] = _watermark(name, offset, marks[name]['columns'], latest)
+
+    if 'refunds' in tails:
+        frames['refunds'] = schema.concat([frames['refunds'], tails['refunds']])
+    if 'sessions' in tails:
+        frames['sessions'] = schema.concat([frames['sessions'], _clean_sessions(tails['sessions'])])
+    if 'pageviews' in tails:
+        frames['pageviews'] = schema.concat([frames['pageviews'], tails['pageviews']])
+    pairs = _read_pairs(manifest)
+    if 'items' in tails:
+        pairs = _refresh_pairs(pairs, frames['items'], tails['items'])
+        frames['items'] = schema.concat([frames['items'], _clean_items(tails['items'], frames['refunds'])])
+    if 'refunds' in tails:
+        # New refunds can point at items we already had
+        frames['items'] = frames['items'].assign(
+            is_refunded=frames['items']['order_item_id'].isin(frames['refunds']['order_item_id']))
+
+    # New orders get their aggregates here, and so do older orders with new items
+    if 'orders' in tails:
+        frames['orders'] = schema.concat([frames['orders'], tails['orders']])
+    touched = [tails[n]['order_id'] for n in ('orders', 'items') if n in tails]
+    if touched:
+        frames['orders'] = _refresh_order_aggregates(
+            frames['orders'], frames['items'], pd.concat(touched).unique())
+    return frames, marks, pairs
+
+def _load_frames(key):
+    """Returns (frames in FRAME_NAMES order, {table: row index}, product
+    pair counts), see load_indexes and load_cooccurrence."""
+    manifest = _read_manifest()
+    if manifest is not None and manifest.get('key') == key:
+        loaded = _read_snapshot(key)
+        if loaded is not None:
+            logger.info("Loaded snapshot %s", key)
+            return loaded
+
+    frames = watermarks = pairs = None
+    if manifest is not None and config.INCREMENTAL_ENABLED:
+        frames, watermarks, pairs = _refresh_frames(manifest)
+    if frames is None:
+        frames, watermarks = _build_frames()
+    if pairs is None:
+        pairs = cooccurrence.CoOccurrence.of(frames['items'])
+    # Sessions/orders/items are stored by created_at, pageviews by the
+    # year-month of their session (appended rows too)
+    frames, pageview_partitions = partitions.partition_frames(partitions.sort_by_time(frames))
+    _write_snapshot(key, frames, watermarks, pageview_partitions, pairs)
+    # Serve the memory mapped copy when there is one, so the frames every
+    # session shares are backed by read-only pages instead of private heap
+    return _read_snapshot(key) or (tuple(frames[n] for n in FRAME_NAMES), _indexes(frames, pageview_partitions),
+                                   pairs)
+
+def _load(key):
+    """Returns (frames, row indexes, cube.DailyCube, session facts, product pair counts)."""
+    frames, index, pairs = _load_frames(key)
+    df_s, df_o, _, _, df_pv = frames
+    start = time.perf_counter()
+    facts = session_facts.build(df_s, df_o, df_pv)
+    logger.info("Built session facts in %.2fs", time.perf_counter() - start)
+    start = time.perf_counter()
+    daily = cube.DailyCube.build(df_s, df_o, facts)
+    logger.info("Built daily cube in %.2fs: %d cells, %d sketch entries",
+                time.perf_counter() - start, len(daily.cells), len(daily.sketch))
+    return frames, index, daily, facts, pairs
+
+@st.cache_data(show_spinner="Loading data...", max_entries=1)
+def _load_copied(key):
+    return _load(key)
+
+@st.cache_resource(show_spinner="Loading data...", max_entries=1)
+def _load_shared(key):
+    return _load(key)
+
+def _dataset():
+    # The key changes with any source file, which also invalidates the st
+    # cache; appended rows are then parsed on their own (see _refresh_frames)
+    key = _source_fingerprint()
+    if config.DATASET_MODE == "copy":
+        return _load_copied(key)
+    return _load_shared(key)
+
+def dataset_version():
+    """Changes whenever load_data() would return different frames."""
+    return _source_fingerprint()
+
+def load_data():
+    """Returns (sessions, orders, items, products, pageviews).
+
+    In the default "shared" mode (config.DATASET_MODE) every session and
+    rerun gets the same frame objects: treat them as read-only and derive
+    new frames instead of adding columns to them.
+    """
+    return _dataset()[0]
+
+def load_indexes():
+    """Row indexes of the load_data() frames for filters.apply_filters:
+    {table: partitions.TimeIndex or partitions.PartitionIndex,
+     'ids': join_index.IdSpace, 'pageview_rows': join_index.SessionRows}."""
+    return _dataset()[1]
+
+def load_cube():
+    """cube.DailyCube of the load_data() frames, for filters.apply_filters."""
+    return _dataset()[2]
+
+def load_session_facts():
+    """One row per session of load_data() (same index), see session_facts.py."""
+    return _dataset()[3]
 
+def load_cooccurrence():
+    """cooccurrence.CoOccurrence of every item of load_data(); read-only."""
+    return _dataset()[4]
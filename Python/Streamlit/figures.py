@@ -0,0 +1,153 @@
+"""Payload budget for the Plotly figures sent to the browser.
+
+Every figure goes to the browser as JSON, with every point of every
+trace. slim() trims a figure before it is sent (utils.plotly_chart):
+
+- line traces longer than their share of config.FIGURE_POINT_BUDGET are
+  downsampled with LTTB (largest triangle three buckets), which keeps
+  the peaks and dips a plain every-nth-point sample would drop
+- scatter traces still longer than config.WEBGL_MIN_POINTS are drawn
+  with WebGL (scattergl) instead of one SVG element per point
+- the template keeps only the trace defaults of the trace types the
+  figure has (Plotly Express attaches defaults for every trace type)
+
+payload_bytes() is the size of the JSON sent; utils.plotly_chart adds
+it up per page (`python benchmarks.py figures` compares before/after).
+spec() does both once for the figures utils.figure caches, and keeps
+the figure's dict: st.plotly_chart serializes a figure with to_dict()
+(most of the cost) and then encodes that dict to JSON on every send, and
+a SentFigure hands out the dict built for the size measurement instead.
+"""
+from dataclasses import dataclass
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+import config
+
+# Per-point trace attributes that are cut down along with x and y
+_POINT_ATTRS = ('customdata', 'text', 'hovertext', 'ids')
+
+
+def lttb(x, y, n_out):
+    """Indices of the `n_out` points of (x, y) that LTTB keeps, in order.
+
+    x must be increasing; the first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        # The next bucket's average is the third corner of the triangle
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = keep[i + 1] = start + int(area.argmax())
+    return keep
+
+
+def _positions(x):
+    """x as increasing numbers for lttb(), or None when it is not."""
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    elif x.dtype.kind not in 'iuf':
+        # Category labels ("2012-3", ...) are drawn in the order given
+        return np.arange(len(x))
+    if len(x) > 1 and not (np.diff(x) > 0).all():
+        return None
+    return x
+
+
+def _downsample(trace, n_out):
+    """`trace` (a dict) cut down to `n_out` points when it is a longer line."""
+    if 'lines' not in (trace.get('mode') or 'lines') or trace.get('x') is None or trace.get('y') is None:
+        return trace
+    y = np.asarray(trace['y'])
+    if len(y) <= n_out or y.dtype.kind not in 'iuf':
+        return trace
+    x = _positions(trace['x'])
+    if x is None:
+        return trace
+    keep = lttb(x, y, n_out)
+    trace = dict(trace, x=np.asarray(trace['x'])[keep], y=y[keep])
+    for attr in _POINT_ATTRS:
+        values = trace.get(attr)
+        if values is not None and not isinstance(values, str) and len(values) == len(y):
+            trace[attr] = np.asarray(values)[keep]
+    return trace
+
+
+def _points(trace):
+    values = trace.get('y') if trace.get('y') is not None else trace.get('x')
+    return 0 if values is None or isinstance(values, str) else len(values)
+
+
+def slim(fig, point_budget=None, webgl_min_points=None, figure_class=go.Figure):
+    """A copy of `fig` within the point budget (see the module docstring),
+    as a `figure_class`."""
+    point_budget = config.FIGURE_POINT_BUDGET if point_budget is None else point_budget
+    webgl_min_points = config.WEBGL_MIN_POINTS if webgl_min_points is None else webgl_min_points
+    traces = [trace.to_plotly_json() for trace in fig.data]
+    scatters = [t for t in traces if t.get('type') == 'scatter']
+    per_trace = point_budget // len(scatters) if point_budget > 0 and scatters else 0
+
+    slimmed = []
+    for trace in traces:
+        if trace.get('type') == 'scatter':
+            if per_trace:
+                trace = _downsample(trace, max(per_trace, 3))
+            if webgl_min_points > 0 and _points(trace) >= webgl_min_points:
+                trace = dict(trace, type='scattergl')
+        slimmed.append(trace)
+
+    layout = fig.layout.to_plotly_json()
+    template = layout.get('template')
+    if template:
+        used = {trace.get('type', 'scatter') for trace in slimmed}
+        template = dict(template, data={name: defaults for name, defaults in template.get('data', {}).items()
+                                        if name in used})
+        layout = dict(layout, template=template)
+    return figure_class(data=slimmed, layout=layout, skip_invalid=True)
+
+
+def payload_bytes(fig):
+    """Size of the figure JSON, roughly what st.plotly_chart sends."""
+    return len(fig.to_json().encode())
+
+
+class SentFigure(go.Figure):
+    """A finished figure whose dict is built once, by freeze(), and then
+    handed out by every to_dict() call (st.plotly_chart calls it on every
+    send). Read-only once frozen: the dict does not follow later updates."""
+
+    def freeze(self):
+        self._frozen = super().to_dict()
+        return self._frozen
+
+    def to_dict(self):
+        frozen = getattr(self, '_frozen', None)
+        return frozen if frozen is not None else super().to_dict()
+
+
+@dataclass(frozen=True)
+class Spec:
+    """A finished figure, ready to send: slimmed, with its payload size.
+
+    Specs are shared between sessions (utils.figure): do not modify the
+    figure.
+    """
+    figure: go.Figure
+    nbytes: int
+
+
+def spec(fig):
+    fig = slim(fig, figure_class=SentFigure)
+    # Measured the way st.plotly_chart encodes it, from the dict it will send
+    return Spec(fig, len(pio.to_json(fig.freeze(), validate=False).encode()))
@@ -0,0 +1,99 @@
+"""Process-wide cache of filtered table sets (filters.FilteredData).
+
+Entries are keyed by (dataset version, filters.Filters), so every session
+that picks the same sidebar values reuses one entry, and a page switch
+(which does not change the filters) never refilters. Entries are evicted
+least recently used first once their combined size passes
+config.FILTER_CACHE_MB. The intermediates charts.resolve adds to an entry
+later (FilteredData.intermediates) count towards its size from then on.
+"""
+import logging
+import pandas as pd
+import streamlit as st
+import config
+import data_loader as dl
+import filters as flt
+import lru
+
+logger = logging.getLogger(__name__)
+
+# Frames of a FilteredData that belong to the entry (products and
+# all_pageviews are the shared, unfiltered frames)
+_OWN_FRAMES = ['sessions', 'orders', 'items', 'pageviews', 'session_facts']
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return int(getattr(value, 'nbytes', 0))
+
+
+def entry_bytes(data):
+    return (sum(_nbytes(getattr(data, name)) for name in _OWN_FRAMES)
+            + sum(_nbytes(v) for v in list(data.intermediates.values())))
+
+
+class _Intermediates(dict):
+    """FilteredData.intermediates of a cached entry: every intermediate
+    stored re-accounts the entry's size (and may evict older entries)."""
+
+    def __init__(self, cache, key, items=()):
+        super().__init__(items)
+        self._cache, self._key = cache, key
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        self._cache.resize(self._key)
+
+
+class FilterCache(lru.LRUCache):
+    """lru.LRUCache of FilteredData, sized by entry_bytes against a byte budget."""
+
+    def __init__(self, budget_bytes):
+        super().__init__(budget_bytes, entry_bytes)
+
+    def get_or_compute(self, key, compute):
+        def tracked():
+            value = compute()
+            value.intermediates = _Intermediates(self, key, value.intermediates)
+            return value
+        return super().get_or_compute(key, tracked)
+
+
+@st.cache_resource
+def _cache():
+    return FilterCache(int(config.FILTER_CACHE_MB * 1024 ** 2))
+
+
+def get_or_compute(key, compute):
+    """compute() through the process-wide cache (bypassed when the budget is 0)."""
+    if config.FILTER_CACHE_MB <= 0:
+        return compute()
+    cache = _cache()
+    value = cache.get_or_compute(key, compute)
+    logger.debug("Filter cache: %s", cache.stats())
+    return value
+
+
+def stats():
+    """Hit/miss/eviction counters and size of the process-wide cache."""
+    return _cache().stats()
+
+
+def filtered(frames, filters):
+    """The filtered data the views get for `filters` (app.py, warmup.py).
+
+    On the pandas backend: same data + same filters (any session, any
+    page) -> the same cached tables.
+    """
+    if config.BACKEND == "duckdb":
+        import sql_backend
+        return sql_backend.filtered(frames, filters)
+    return get_or_compute(
+        (dl.dataset_version(), filters),
+        lambda: flt.apply_filters(*frames, filters, index=dl.load_indexes(), cube=dl.load_cube(),
+                                  facts=dl.load_session_facts(), cooccurrence=dl.load_cooccurrence()))
@@ -0,0 +1,170 @@
+from dataclasses import dataclass, field
+import pandas as pd
+import config
+import join_index
+import session_facts
+
+
+# The sidebar slicers, by the names charts.aggregation(depends=...) uses
+SLICERS = {
+    'date': ('start', 'end'),
+    'utm': ('utm_sources',),
+    'product': ('product_ids',),
+}
+
+
+@dataclass(frozen=True)
+class Filters:
+    """The sidebar selection, normalized so equal selections compare equal."""
+    start: pd.Timestamp
+    end: pd.Timestamp  # exclusive
+    utm_sources: tuple
+    product_ids: tuple
+
+    @classmethod
+    def from_widgets(cls, start_date, end_date, utm_sources, product_ids):
+        return cls(
+            start=pd.to_datetime(start_date),
+            end=pd.to_datetime(end_date) + pd.Timedelta(days=1),
+            utm_sources=tuple(sorted(str(u) for u in utm_sources)),
+            product_ids=tuple(sorted(int(p) for p in product_ids)),
+        )
+
+    def key(self, slicers=None):
+        """The values of `slicers` (default: all): charts that only depend
+        on those slicers give the same numbers for equal keys."""
+        return tuple(getattr(self, name) for slicer in (slicers or SLICERS) for name in SLICERS[slicer])
+
+
+def slicer_options(df_sess, df_prods):
+    """What the sidebar offers: (first date, last date, UTM sources, product ids)."""
+    return (
+        df_sess['created_at'].min().date(),
+        df_sess['created_at'].max().date(),
+        df_sess['utm_source'].fillna('Untracked').unique().tolist(),
+        df_prods['product_id'].unique().tolist(),
+    )
+
+
+def default_filters(df_sess, df_prods):
+    """The sidebar's initial selection: every date, UTM source and product."""
+    return Filters.from_widgets(*slicer_options(df_sess, df_prods))
+
+
+@dataclass
+class FilteredData:
+    """What the views get: the frames after the sidebar filters.
+
+    `pageviews` follow the filtered sessions, `all_pageviews` is the
+    unfiltered table (some charts are built on every pageview).
+    """
+    filters: Filters
+    sessions: pd.DataFrame
+    orders: pd.DataFrame
+    items: pd.DataFrame
+    products: pd.DataFrame
+    pageviews: pd.DataFrame
+    all_pageviews: pd.DataFrame
+    cube: object = None  # cube.DailyCube of the unfiltered data, if loaded
+    session_facts: pd.DataFrame = None  # session_facts.build rows of `sessions`
+    cooccurrence: object = None  # load-level cooccurrence.CoOccurrence, when `items` are all items
+    # charts.resolve memo: named intermediates of this filter state
+    intermediates: dict = field(default_factory=dict, repr=False, compare=False)
+    # charts.compute store of this session's last result per chart (see app.py)
+    results: dict = field(default=None, repr=False, compare=False)
+    # Process-wide chart result and figure caches, and the key of the data behind them (view_cache.py)
+    view_cache: object = field(default=None, repr=False, compare=False)
+    figure_cache: object = field(default=None, repr=False, compare=False)
+    dataset_version: str = None
+
+    backend = "pandas"
+
+    @property
+    def backends(self):
+        if self.cube is not None and self.cube.covers(self.filters):
+            return ("cube", "pandas")
+        return ("pandas",)
+
+    @property
+    def estimated_users(self):
+        """Distinct user counts are sketch estimates (see cube.py)."""
+        return config.CUBE_SKETCH_USERS and "cube" in self.backends
+
+
+# Without the loader's id bounds every membership test is a plain isin
+_NO_ID_SPACE = join_index.IdSpace(session_bound=None, order_bound=None)
+
+
+def _date_range(df, start_ts, end_ts, index=None):
+    if index is not None:
+        df = index.select(df, start_ts, end_ts)
+        if index.exact:
+            return df
+    return df[(df['created_at'] >= start_ts) & (df['created_at'] < end_ts)]
+
+
+def apply_filters(df_sess, df_orders, df_items, df_prods, df_pv, filters, index=None, cube=None, facts=None,
+                  cooccurrence=None):
+    """The sidebar filters. With `index` (data_loader.load_indexes()) the
+    date range is a slice of the time sorted frames instead of a mask, only
+    each session's pageviews are gathered from their row range, and the
+    cascade to orders/items gathers id bitmaps instead of hashing (isin)."""
+    start_ts, end_ts = filters.start, filters.end
+    index = index or {}
+    ids = index.get('ids', _NO_ID_SPACE)
+
+    # Apply the date range to sessions/orders/items
+    df_s_filt = _date_range(df_sess, start_ts, end_ts, index.get('sessions'))
+    df_o_filt = _date_range(df_orders, start_ts, end_ts, index.get('orders'))
+    df_i_filt = _date_range(df_items, start_ts, end_ts, index.get('items'))
+
+    # --- UTM source filter ---
+    df_s_filt = df_s_filt[
+        df_s_filt['utm_source'].isin(filters.utm_sources)
+    ]
+
+    # --- Filter orders based on filtered sessions ---
+    df_o_filt = df_o_filt[
+        ids.sessions_in(df_o_filt['website_session_id'], df_s_filt['website_session_id'])
+    ]
+
+    # --- Filter items based on remaining orders ---
+    df_i_filt = df_i_filt[
+        ids.orders_in(df_i_filt['order_id'], df_o_filt['order_id'])
+    ]
+
+    # --- Add product info (safe merge) ---
+    df_i_filt = df_i_filt.merge(
+        df_prods[['product_id']],
+        on='product_id',
+        how='left'
+    )
+
+    # --- Product slicer ---
+    df_i_filt = df_i_filt[
+        df_i_filt['product_id'].isin(filters.product_ids)
+    ]
+
+    # --- Pageviews follow sessions ---
+    if 'pageview_rows' in index:
+        # Each session's pageviews are one row range, gather them directly
+        df_pv_filt = index['pageview_rows'].select(df_pv, df_s_filt['website_session_id'])
+    else:
+        # Only the months that overlap the range can hold their pageviews
+        df_pv_scan = df_pv
+        if 'pageviews' in index:
+            df_pv_scan = index['pageviews'].select(df_pv, start_ts, end_ts)
+        df_pv_filt = df_pv_scan[ids.sessions_in(df_pv_scan['website_session_id'], df_s_filt['website_session_id'])]
+
+    # --- Session facts follow sessions (built here when none were loaded) ---
+    if facts is not None:
+        facts_filt = facts.loc[df_s_filt.index]
+    else:
+        facts_filt = session_facts.build(df_s_filt, df_orders, df_pv_filt)
+
+    # The pair counts of every item only answer selections that keep every item
+    if len(df_i_filt) != len(df_items):
+        cooccurrence = None
+
+    return FilteredData(filters, df_s_filt, df_o_filt, df_i_filt, df_prods, df_pv_filt, df_pv,
+                        cube, facts_filt, cooccurrence)
@@ -0,0 +1,91 @@
+import json
+import numpy as np
+import pandas as pd
+import clustered
+import config
+
+# Funnel stages live in a JSON file (config.FUNNEL_STAGES_PATH), in order:
+#
+#   {"stages": [{"name": "/homepages", "exact": ["/home"], "prefix": ["/lander"]},
+#               {"name": "/products", "exact": ["/products"]}, ...]}
+#
+# A url belongs to the first stage with the url in "exact" or a prefix of
+# it in "prefix"; urls matching no stage are not part of the funnel.
+#
+# A session reaches stage k when it views a stage k page after reaching
+# stage k - 1 (stage 1: any stage 1 page), so the counts never grow from
+# one stage to the next.
+
+
+def load_stages(path=None):
+    with open(path or config.FUNNEL_STAGES_PATH) as f:
+        stages = json.load(f)['stages']
+    return [{
+        'name': stage['name'],
+        'exact': list(stage.get('exact', [])),
+        'prefix': list(stage.get('prefix', [])),
+    } for stage in stages]
+
+
+def stage_dtype(stages):
+    return pd.CategoricalDtype([stage['name'] for stage in stages], ordered=True)
+
+
+def _stage_of(url, stages):
+    for k, stage in enumerate(stages):
+        if url in stage['exact'] or any(url.startswith(p) for p in stage['prefix']):
+            return k
+    return -1
+
+
+def stage_codes(urls, stages):
+    """Stage (0, 1, ... or -1 outside the funnel) of every row of a url Series.
+
+    The rules are only evaluated on the distinct urls (the categories of a
+    categorical column), the result is then broadcast to every row with
+    one integer take.
+    """
+    if isinstance(urls.dtype, pd.CategoricalDtype):
+        codes, uniques = urls.cat.codes.to_numpy(), urls.cat.categories
+    else:
+        codes, uniques = pd.factorize(urls)
+    # Code -1 (missing url) picks the trailing -1
+    lookup = np.array([_stage_of(str(url), stages) for url in uniques] + [-1], dtype='int16')
+    return lookup[codes]
+
+
+def progress(df_pv, stages):
+    """Stages reached in order (0 .. len(stages)) by every session run of
+    a session clustered pageviews frame (see clustered.session_runs)."""
+    stage = stage_codes(df_pv['pageview_url'], stages)
+    runs = clustered.session_runs(df_pv)
+    n_runs = runs[-1] + 1 if len(runs) else 0
+    reached = np.zeros(n_runs, dtype='int16')
+    # Row of the page that reached the last stage so far (-1: none yet)
+    at_row = np.full(n_runs, -1, dtype='int64')
+
+    # One stable sort groups the rows by stage, in row order within a stage
+    by_stage = np.argsort(stage, kind='stable')
+    bounds = np.searchsorted(stage[by_stage], np.arange(len(stages) + 1))
+    for k in range(len(stages)):
+        rows = by_stage[bounds[k]:bounds[k + 1]]
+        run = runs[rows]
+        hit = (reached[run] == k) & (rows > at_row[run])
+        rows, run = rows[hit], run[hit]
+        # First qualifying page of every session
+        run, first = np.unique(run, return_index=True)
+        at_row[run] = rows[first]
+        reached[run] = k + 1
+    return reached
+
+
+def sessions_reaching(reached, names):
+    """Sessions reaching every stage (`names`, in order) from the stages
+    each session reached (see progress)."""
+    per_depth = np.bincount(np.asarray(reached, dtype='int64'), minlength=len(names) + 1)
+    # Sessions reaching stage k = sessions that stopped at stage k or later
+    at_least = np.cumsum(per_depth[::-1])[::-1][1:]
+    return pd.DataFrame({
+        'funnel_stage': pd.Categorical(list(names), categories=list(names), ordered=True),
+        'sessions': at_least,
+    })
@@ -0,0 +1,55 @@
+"""Named intermediates shared by the views' charts (see charts.intermediate).
+
+Each is computed at most once per filtered data set; the charts that
+declare one as an input get the same frame, so none of them may change it.
+"""
+import charts
+import paths
+
+
+@charts.intermediate("orders_with_sessions")
+def orders_with_sessions(data):
+    # Session attributes of every order (left join: every order is kept)
+    return data.orders.merge(
+        data.sessions[['website_session_id', 'utm_source', 'utm_campaign', 'is_repeat_session', 'device_type']],
+        on='website_session_id',
+        how='left'
+    )
+
+
+@charts.intermediate("items_with_products")
+def items_with_products(data):
+    # --- CRITICAL FIX: Handle Duplicate Column Names ---
+    # Both df_oi and df_p have a 'created_at' column.
+    # We use suffixes=('', '_product') to keep the sales date as 'created_at'
+    # and rename the product launch date to 'created_at_product'.
+    df_m = data.items.merge(
+        data.products,
+        on='product_id',
+        how='left',
+        suffixes=('', '_product')
+    )
+
+    # Fallback for product name
+    if 'product_name' not in df_m.columns:
+        df_m['product_name'] = 'Prod ' + df_m['product_id'].astype(str)
+    return df_m
+
+
+@charts.intermediate("session_months")
+def session_months(data):
+    # Year-month ("2013-06") of every session, aligned with data.sessions
+    return data.sessions['created_at'].dt.to_period('M').astype(str).rename('year_month')
+
+
+@charts.intermediate("landing_pages")
+def landing_pages(data):
+    # Landing page = first pageview per session (sessions with pageviews)
+    facts = data.session_facts
+    return facts.loc[facts['pv_count'] > 0, ['website_session_id', 'landing_page', 'is_bounce']]
+
+
+@charts.intermediate("page_transitions")
+def page_transitions(data):
+    # Page -> next page counts of the filtered sessions, see paths.py
+    return paths.transitions(data.pageviews)
@@ -0,0 +1,89 @@
+"""Cascading a subset of sessions to the orders, items and pageviews.
+
+Session and order ids are small dense integers, so "which rows belong to
+these sessions" does not need a hash lookup (isin): mark the selected ids
+in a boolean bitmap over the id space and gather it at every row's key.
+The pageviews are stored clustered by session, so their rows are found
+directly from per-session offsets instead (SessionRows).
+"""
+from dataclasses import dataclass
+import numpy as np
+
+# Bitmaps are only used while the id space is at most this many times the
+# row count (past that the ids are not dense and isin is the better tool)
+MAX_SPARSITY = 64
+
+
+def _bound(rows, *keys):
+    """1 + the largest id in `keys`, or None when the ids are too sparse for a bitmap."""
+    largest = max((int(k.max()) for k in keys if len(k)), default=0)
+    if largest + 1 > max(1 << 20, MAX_SPARSITY * rows):
+        return None
+    return largest + 1
+
+
+@dataclass(frozen=True)
+class IdSpace:
+    """Upper bounds of the session and order ids (None: use isin)."""
+    session_bound: int
+    order_bound: int
+
+    @classmethod
+    def of(cls, df_s, df_o, df_oi, df_pv):
+        return cls(
+            session_bound=_bound(len(df_s), df_s['website_session_id'], df_o['website_session_id'],
+                                 df_pv['website_session_id']),
+            order_bound=_bound(len(df_o), df_o['order_id'], df_oi['order_id']),
+        )
+
+    def sessions_in(self, keys, session_ids):
+        """Mask of the rows whose website_session_id (`keys`) is in `session_ids`."""
+        return _member(keys, session_ids, self.session_bound)
+
+    def orders_in(self, keys, order_ids):
+        """Mask of the rows whose order_id (`keys`) is in `order_ids`."""
+        return _member(keys, order_ids, self.order_bound)
+
+
+def _member(keys, ids, bound):
+    if bound is None:
+        return keys.isin(ids).to_numpy()
+    bitmap = np.zeros(bound, dtype=bool)
+    bitmap[ids.to_numpy()] = True
+    return bitmap[keys.to_numpy()]
+
+
+@dataclass(frozen=True, eq=False)
+class SessionRows:
+    """Rows start[s]:start[s] + count[s] of the pageviews belong to session s.
+
+    Needs a frame whose rows are clustered by website_session_id (every
+    session's rows next to each other), as the loader stores the pageviews.
+    """
+    start: np.ndarray
+    count: np.ndarray
+
+    @classmethod
+    def of(cls, df, session_bound):
+        keys = df['website_session_id'].to_numpy()
+        firsts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype='int64')
+        start = np.zeros(session_bound, dtype='int64')
+        count = np.zeros(session_bound, dtype='int64')
+        start[keys[firsts]] = firsts
+        count[keys[firsts]] = np.diff(np.r_[firsts, len(keys)])
+        return cls(start, count)
+
+    def rows(self, session_ids):
+        """Positions of the rows of `session_ids`, in frame order."""
+        ids = np.asarray(session_ids)
+        ids = ids[self.count[ids] > 0]
+        starts, counts = self.start[ids], self.count[ids]
+        order = np.argsort(starts, kind='stable')
+        starts, counts = starts[order], counts[order]
+        # The ranges start:start + count back to back, without a Python loop
+        run_offsets = np.cumsum(counts) - counts
+        return np.repeat(starts - run_offsets, counts) + np.arange(counts.sum())
+
+    def select(self, df, session_ids):
+        """The rows of `session_ids` (a gather, no hashing)."""
+        return df.take(self.rows(session_ids))
@@ -0,0 +1,87 @@
+"""Least recently used cache with a size budget, shared between session threads.
+
+The process-wide caches (filter_cache, view_cache and its figure cache)
+are all this class: entries are evicted oldest use first once their
+sizes add up to more than the budget. `size` measures one value; by
+default every entry counts 1, so the budget is a number of entries.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _one(value):
+    return 1
+
+
+class LRUCache:
+    """Size-aware LRU cache; safe to share between session threads."""
+
+    def __init__(self, budget, size=_one):
+        self.budget = budget
+        self.size = size
+        self._entries = OrderedDict()  # key -> (value, size), oldest first
+        self._lock = threading.Lock()
+        self.total = 0
+        self.hits = self.misses = self.evictions = 0
+        self.compute_s = 0.0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        # Computed outside the lock; two sessions asking for the same new
+        # key at once both compute it and the second insert wins
+        start = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.compute_s += elapsed
+        self._insert(key, value, self.size(value))
+        return value
+
+    def resize(self, key):
+        """Measures `key`'s entry again after it grew (it keeps its place)."""
+        with self._lock:
+            if key not in self._entries:
+                return
+            value = self._entries[key][0]
+        self._insert(key, value, self.size(value), touch=False)
+
+    def _insert(self, key, value, size, touch=True):
+        with self._lock:
+            if key in self._entries:
+                self.total -= self._entries[key][1]
+                if touch:
+                    self._entries.move_to_end(key)
+            elif not touch:
+                return  # evicted meanwhile
+            if size > self.budget:
+                logger.debug("Entry of size %d is over the cache budget, not cached", size)
+                if self._entries.pop(key, None) is not None:
+                    self.evictions += 1
+                return
+            self._entries[key] = (value, size)
+            self.total += size
+            while self.total > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total -= evicted
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size': self.total,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'compute_s': round(self.compute_s, 6),
+            }
@@ -0,0 +1,132 @@
+"""Row order of the loaded frames and the indexes the date filter uses.
+
+Sessions, orders and items are stored sorted by `created_at` (NaT last).
+A TimeIndex over that column turns a date range into two binary searches
+and a positional slice, with no boolean mask over the whole frame.
+
+Pageviews are kept ordered by year-month partition (a stable sort) and a
+PartitionIndex records where each month starts. A date range then maps to
+one contiguous row range of the months that overlap it. The partitions
+are row ranges of the one pageviews Arrow file of the snapshot, not
+separate files. Sessions need no PartitionIndex: sorted by created_at
+they are already in month order and their TimeIndex slices exactly.
+
+Pageviews are partitioned by the month of their *session*, not their own
+timestamp, so the pageviews of any set of sessions always sit in the same
+months as those sessions (a session running past midnight at the end of a
+month does not leak into the next partition). Inside a month they are
+clustered by session and ordered by `created_at` (see join_index.SessionRows
+and clustered.py).
+"""
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# Tables stored sorted by created_at
+TIME_SORTED = ['sessions', 'orders', 'items']
+
+# Rows without a usable date (or pageviews without a known session); sorts
+# last, like NaT in the time sorted frames
+NO_PARTITION = np.iinfo('int64').max
+
+
+def month_key(ts):
+    """Partition key of one timestamp: months since year 0."""
+    ts = pd.Timestamp(ts)
+    return ts.year * 12 + ts.month - 1
+
+
+def month_keys(created_at):
+    """Partition key of every row of a datetime Series (NO_PARTITION for NaT)."""
+    months = (created_at.dt.year * 12 + created_at.dt.month - 1).to_numpy(dtype='float64')
+    keys = np.full(len(months), NO_PARTITION, dtype='int64')
+    dated = ~np.isnan(months)
+    keys[dated] = months[dated]
+    return keys
+
+
+@dataclass(frozen=True, eq=False)
+class TimeIndex:
+    """`created_at` of a frame sorted by it (NaT last, as numpy sorts it)."""
+    created_at: np.ndarray
+
+    # select() returns exactly the rows in range, no mask needed afterwards
+    exact = True
+
+    @classmethod
+    def of(cls, df):
+        return cls(df['created_at'].to_numpy(dtype='datetime64[ns]'))
+
+    def rows(self, start, end):
+        """Row range (a slice) of the rows with start <= created_at < end."""
+        lo = np.searchsorted(self.created_at, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        hi = np.searchsorted(self.created_at, np.datetime64(pd.Timestamp(end), 'ns'), side='left')
+        return slice(int(lo), int(max(lo, hi)))
+
+    def select(self, df, start, end):
+        """The rows of `df` in [start, end) (a view, not a copy)."""
+        return df.iloc[self.rows(start, end)]
+
+
+@dataclass(frozen=True)
+class PartitionIndex:
+    """Rows offsets[i]:offsets[i + 1] of the frame belong to month keys[i]."""
+    keys: np.ndarray
+    offsets: np.ndarray
+
+    # select() returns whole months, the caller still masks the exact range
+    exact = False
+
+    @classmethod
+    def from_sorted_keys(cls, keys):
+        uniq, starts = np.unique(keys, return_index=True)
+        return cls(uniq.astype('int64'), np.append(starts, len(keys)).astype('int64'))
+
+    @classmethod
+    def from_json(cls, raw):
+        return cls(np.asarray(raw['keys'], dtype='int64'), np.asarray(raw['offsets'], dtype='int64'))
+
+    def to_json(self):
+        return {'keys': self.keys.tolist(), 'offsets': self.offsets.tolist()}
+
+    def rows(self, start, end):
+        """Row range (a slice) of the months overlapping [start, end)."""
+        first = np.searchsorted(self.keys, month_key(start), side='left')
+        last = np.searchsorted(self.keys, month_key(pd.Timestamp(end) - pd.Timedelta(1)), side='right')
+        if last <= first:
+            return slice(0, 0)
+        return slice(int(self.offsets[first]), int(self.offsets[last]))
+
+    def select(self, df, start, end):
+        """The rows of `df` in months overlapping [start, end) (a view, not a copy)."""
+        return df.iloc[self.rows(start, end)]
+
+
+def sort_by_time(frames):
+    """Stable sorts the TIME_SORTED frames by created_at (a no-op when they already are)."""
+    frames = dict(frames)
+    for name in TIME_SORTED:
+        df = frames[name]
+        if not df['created_at'].is_monotonic_increasing:
+            frames[name] = df.sort_values('created_at', kind='stable', na_position='last').reset_index(drop=True)
+    return frames
+
+
+def partition_frames(frames):
+    """Puts the pageviews in partition order; returns (frames, PartitionIndex
+    of the pageviews). The sessions must already be sorted by created_at."""
+    frames = dict(frames)
+    df_s, df_pv = frames['sessions'], frames['pageviews']
+    session_keys = month_keys(df_s['created_at'])
+
+    # A pageview goes to its session's month, then rows are ordered by
+    # (session, created_at) inside the month, NaT last like sort_values
+    pos = pd.Index(df_s['website_session_id']).get_indexer(df_pv['website_session_id'])
+    pageview_keys = np.where(pos >= 0, session_keys[pos], NO_PARTITION)
+    created = df_pv['created_at'].to_numpy(dtype='datetime64[ns]').view('int64')
+    created = np.where(created == np.iinfo('int64').min, np.iinfo('int64').max, created)
+    order = np.lexsort((created, df_pv['website_session_id'].to_numpy(), pageview_keys))
+    if not np.array_equal(order, np.arange(len(order))):
+        df_pv, pageview_keys = df_pv.take(order).reset_index(drop=True), pageview_keys[order]
+    frames['pageviews'] = df_pv
+    return frames, PartitionIndex.from_sorted_keys(pageview_keys)
@@ -0,0 +1,59 @@
+"""Page to page paths of a session clustered pageviews frame.
+
+Every pageview is one step of its session's path: from the previous page
+(or from the entry, for the session's first pageview) to its own page,
+and the session's last pageview also steps on to the exit. With the rows
+clustered by session (see clustered.py), "previous page" is the row
+above unless the row starts a session, so all steps are one shifted code
+array and one bincount over (from, to) pairs, with no groupby.
+
+The result is the transition matrix: rows are ENTRY then the pages,
+columns are the pages then EXIT. Its ENTRY row holds the entries per
+page, its EXIT column the exits, and each page's column adds up to its
+pageviews. Pageviews without a url are left out, and so are the steps
+from them.
+"""
+import numpy as np
+import pandas as pd
+import clustered
+
+ENTRY = '(entry)'
+EXIT = '(exit)'
+
+
+def transitions(df_pv):
+    """Transition counts (ENTRY + pages) x (pages + EXIT), see module doc."""
+    urls = df_pv['pageview_url']
+    pages = [str(page) for page in urls.cat.categories]
+    n = len(pages)
+    codes = urls.cat.codes.to_numpy().astype('int64')
+    first = clustered.first_rows(df_pv)
+    last = clustered.last_rows(df_pv)
+
+    # From: 0 = entry, 1 + code = a page; to: code = a page, n = exit
+    prev = np.r_[-1, codes[:-1]]
+    steps = (codes >= 0) & (first | (prev >= 0))
+    from_ = np.where(first, 0, prev + 1)[steps]
+    exits = last & (codes >= 0)
+    keys = np.r_[from_ * (n + 1) + codes[steps], (codes[exits] + 1) * (n + 1) + n]
+    counts = np.bincount(keys, minlength=(n + 1) ** 2).reshape(n + 1, n + 1)
+    return pd.DataFrame(counts, index=pd.Index([ENTRY] + pages, name='from_page'),
+                        columns=pd.Index(pages + [EXIT], name='to_page'))
+
+
+def page_flows(matrix):
+    """Pageviews, entries and exits per page (pages with pageviews only)."""
+    pages = matrix.columns[:-1]
+    flows = pd.DataFrame({
+        'page': pages,
+        'visits': matrix[pages].sum().to_numpy(),
+        'entries': matrix.loc[ENTRY, pages].to_numpy(),
+        'exits': matrix.loc[pages, EXIT].to_numpy(),
+    })
+    return flows[flows['visits'] > 0].reset_index(drop=True)
+
+
+def transition_pairs(matrix):
+    """The non-zero cells of the matrix as rows: from_page, to_page, count."""
+    pairs = matrix.stack().rename('count').reset_index()
+    return pairs[pairs['count'] > 0].reset_index(drop=True)
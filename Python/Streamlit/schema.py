@@ -0,0 +1,110 @@
+import pandas as pd
+
+# Declared dtypes for every source table, keyed like data_loader.SOURCE_FILES.
+# - ids are unsigned 32 bit (the largest id is well under 4 billion)
+# - low cardinality strings are categories
+# - 0/1 flags are bools
+# - money stays float64 so sums match the untyped frames exactly
+# `created_at` is not listed here, it is parsed with DATE_FORMAT.
+SCHEMAS = {
+    'sessions': {
+        'website_session_id': 'uint32',
+        'user_id': 'uint32',
+        'is_repeat_session': 'bool',
+        'utm_source': 'category',
+        'utm_campaign': 'category',
+        'utm_content': 'category',
+        'device_type': 'category',
+        'http_referer': 'category',
+    },
+    'pageviews': {
+        'website_pageview_id': 'uint32',
+        'website_session_id': 'uint32',
+        'pageview_url': 'category',
+    },
+    'orders': {
+        'order_id': 'uint32',
+        'website_session_id': 'uint32',
+        'user_id': 'uint32',
+        'primary_product_id': 'uint16',
+        'items_purchased': 'uint8',
+        'price_usd': 'float64',
+        'cogs_usd': 'float64',
+    },
+    'items': {
+        'order_item_id': 'uint32',
+        'order_id': 'uint32',
+        'product_id': 'uint16',
+        'is_primary_item': 'bool',
+        'price_usd': 'float64',
+        'cogs_usd': 'float64',
+    },
+    'refunds': {
+        'order_item_refund_id': 'uint32',
+        'order_item_id': 'uint32',
+        'order_id': 'uint32',
+        'refund_amount_usd': 'float64',
+    },
+    'products': {
+        'product_id': 'uint16',
+    },
+}
+
+DATE_COLUMN = 'created_at'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_dtypes(table):
+    """dtype mapping to hand to pd.read_csv for `table`.
+
+    The CSV parser refuses to read 0/1 straight into bool, so flags are read
+    as uint8 and converted by apply_schema.
+    """
+    return {
+        col: ('uint8' if dtype == 'bool' else dtype)
+        for col, dtype in SCHEMAS[table].items()
+    }
+
+
+def apply_schema(table, df):
+    """Finishes typing a freshly read frame: bool flags and `created_at`."""
+    for col, dtype in SCHEMAS[table].items():
+        if dtype == 'bool' and col in df.columns:
+            df[col] = df[col].astype(bool)
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], format=DATE_FORMAT, errors='coerce')
+    return df
+
+
+def fill_categories(df, value):
+    """fillna(value) for a frame that may hold categoricals without `value`.
+
+    Only columns with missing values get `value` as a category: plotly
+    express draws a group for every category, used or not.
+    """
+    for col in df.select_dtypes('category').columns:
+        if df[col].isna().any() and value not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories(value)
+    return df.fillna(value)
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def concat(frames):
+    """pd.concat for frames of one table that keeps categorical columns categorical.
+
+    Plain pd.concat falls back to object when the categories differ, so the
+    categories are unioned first (existing codes keep their order).
+    """
+    frames = list(frames)
+    for col in frames[0].select_dtypes('category').columns:
+        categories = frames[0][col].cat.categories
+        for df in frames[1:]:
+            if col in df.columns:
+                new = pd.Index(df[col].dropna().astype(object).unique()).difference(categories)
+                categories = categories.append(new)
+        dtype = pd.CategoricalDtype(categories)
+        frames = [df.astype({col: dtype}) if col in df.columns else df for df in frames]
+    return pd.concat(frames, ignore_index=True)
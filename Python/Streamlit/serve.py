@@ -0,0 +1,26 @@
+"""Starts the dashboard server with the warm-up running from the start.
+
+    python serve.py [streamlit run options, e.g. --server.port 8501]
+
+`streamlit run app.py` only imports app.py when the first browser session
+connects, so a warm-up started from there races that first visitor. This
+starts warmup.start() as the server process comes up and then runs
+`streamlit run app.py` in the same process: the caches the warm-up fills
+(st.cache_resource, view_cache) are the ones the sessions read. app.py's
+own warmup.start() call then finds the thread already running.
+"""
+import logging
+import os
+import sys
+from streamlit.web import cli
+import config
+import warmup
+
+APP = os.path.join(config.SCRIPT_DIR, "app.py")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if config.WARMUP_ENABLED:
+        warmup.start()
+    sys.argv = ["streamlit", "run", APP] + sys.argv[1:]
+    sys.exit(cli.main())
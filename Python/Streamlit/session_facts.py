@@ -0,0 +1,57 @@
+"""One row of facts per session, built once at load time.
+
+Computed in one pass over the session clustered pageviews (see
+clustered.py) plus one groupby over the orders:
+
+    pv_count, landing_page, exit_page, is_bounce, funnel_stage (last
+    stage reached in order, see funnel.py), duration_s, converted,
+    order_id (first order), revenue
+
+The frame has the index of the sessions frame it was built from, so the
+facts of any subset of sessions are `facts.loc[subset.index]`.
+"""
+import numpy as np
+import pandas as pd
+import clustered
+import funnel
+
+
+def build(df_s, df_o, df_pv, stages=None):
+    if stages is None:
+        stages = funnel.load_stages()
+    sessions = df_s['website_session_id'].to_numpy()
+
+    # --- From the pageviews, one run of rows per session ---
+    urls = df_pv['pageview_url']
+    codes = urls.cat.codes.to_numpy()
+    firsts = np.flatnonzero(clustered.first_rows(df_pv))
+    lasts = np.flatnonzero(clustered.last_rows(df_pv))
+    created = df_pv['created_at'].to_numpy()
+    reached = funnel.progress(df_pv, stages)
+
+    pos = pd.Index(df_pv['website_session_id'].to_numpy()[firsts]).get_indexer(sessions)
+    seen = pos >= 0
+    pick = np.where(seen, pos, 0)
+
+    def per_session(values, missing):
+        return np.where(seen, values[pick] if len(values) else missing, missing)
+
+    pv_count = per_session(lasts - firsts + 1, 0)
+    facts = pd.DataFrame({
+        'website_session_id': sessions,
+        'pv_count': pv_count.astype('int64'),
+        'landing_page': pd.Categorical.from_codes(per_session(codes[firsts], -1), dtype=urls.dtype),
+        'exit_page': pd.Categorical.from_codes(per_session(codes[lasts], -1), dtype=urls.dtype),
+        'is_bounce': pv_count == 1,
+        'funnel_stage': pd.Categorical.from_codes(per_session(reached.astype('int64') - 1, -1),
+                                                  dtype=funnel.stage_dtype(stages)),
+        'duration_s': per_session((created[lasts] - created[firsts]) / np.timedelta64(1, 's'), np.nan),
+    }, index=df_s.index)
+
+    # --- From the orders ---
+    orders = df_o.groupby('website_session_id').agg(order_id=('order_id', 'min'), revenue=('revenue', 'sum'))
+    orders = orders.reindex(sessions)
+    facts['converted'] = orders['order_id'].notna().to_numpy()
+    facts['order_id'] = orders['order_id'].astype('UInt32').array
+    facts['revenue'] = orders['revenue'].fillna(0).to_numpy()
+    return facts
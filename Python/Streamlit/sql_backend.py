@@ -0,0 +1,514 @@
+"""Optional DuckDB backend (DASHBOARD_BACKEND=duckdb).
+
+The loaded frames are registered with an embedded DuckDB database (zero
+copy, DuckDB scans the pandas arrays in place). The sidebar filters become
+temp views (f_sessions, f_orders, f_items, f_pageviews) and every chart id
+from charts.py gets a SQL implementation below, so the filtering and the
+aggregations run inside DuckDB and only the small results come back.
+"""
+import logging
+import weakref
+import streamlit as st
+import charts
+import data_loader as dl
+import funnel
+
+try:
+    import duckdb
+except ImportError:  # duckdb is optional, only needed for this backend
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# The sidebar filters, same semantics as filters.apply_filters
+_FILTER_VIEWS = [
+    """CREATE TEMP VIEW f_sessions AS
+       SELECT s.* FROM sessions s, filter_range r
+       WHERE s.created_at >= r.start_ts AND s.created_at < r.end_ts
+         AND CAST(s.utm_source AS VARCHAR) IN (SELECT utm_source FROM filter_utm)""",
+    """CREATE TEMP VIEW f_orders AS
+       SELECT o.* FROM orders o, filter_range r
+       WHERE o.created_at >= r.start_ts AND o.created_at < r.end_ts
+         AND o.website_session_id IN (SELECT website_session_id FROM f_sessions)""",
+    """CREATE TEMP VIEW f_items AS
+       SELECT i.* FROM items i, filter_range r
+       WHERE i.created_at >= r.start_ts AND i.created_at < r.end_ts
+         AND i.order_id IN (SELECT order_id FROM f_orders)
+         AND CAST(i.product_id AS INTEGER) IN (SELECT product_id FROM filter_products)""",
+    """CREATE TEMP VIEW f_pageviews AS
+       SELECT * FROM pageviews
+       WHERE website_session_id IN (SELECT website_session_id FROM f_sessions)""",
+]
+
+
+@st.cache_resource
+def _database():
+    return duckdb.connect()
+
+
+class SqlData:
+    """Stands in for filters.FilteredData when the views run on DuckDB."""
+
+    backend = "sql"
+    results = view_cache = figure_cache = dataset_version = None  # see charts.compute
+    estimated_users = False
+
+    def __init__(self, frames, filters):
+        self.filters = filters
+        # One cursor per rerun: its registrations and temp views are private,
+        # and go with it when it is closed. That happens once nothing uses
+        # this data any more; fragments rerun later with it, so not at the
+        # end of the script run
+        self.cursor = _database().cursor()
+        self._finalizer = weakref.finalize(self, self.cursor.close)
+        for name, df in zip(dl.FRAME_NAMES, frames):
+            self.cursor.register(name, df)
+        self.cursor.execute(
+            "CREATE TEMP TABLE filter_range AS SELECT CAST($start AS TIMESTAMP) AS start_ts, CAST($end AS TIMESTAMP) AS end_ts",
+            {'start': filters.start.to_pydatetime(), 'end': filters.end.to_pydatetime()})
+        self.cursor.execute(
+            "CREATE TEMP TABLE filter_utm AS SELECT UNNEST(CAST($utm AS VARCHAR[])) AS utm_source",
+            {'utm': list(filters.utm_sources)})
+        self.cursor.execute(
+            "CREATE TEMP TABLE filter_products AS SELECT UNNEST(CAST($products AS INTEGER[])) AS product_id",
+            {'products': list(filters.product_ids)})
+        for view in _FILTER_VIEWS:
+            self.cursor.execute(view)
+
+    def query(self, sql):
+        return self.cursor.execute(sql).df()
+
+    def close(self):
+        """Closes the cursor now instead of when this data is garbage collected."""
+        self._finalizer()
+
+
+def filtered(frames, filters):
+    if duckdb is None:
+        raise RuntimeError("DASHBOARD_BACKEND=duckdb needs the duckdb package (pip install duckdb)")
+    return SqlData(frames, filters)
+
+
+def _sql(chart_id, sql):
+    """Registers `sql` as the DuckDB implementation of `chart_id`."""
+    charts.aggregation(chart_id, backend="sql")(lambda data: data.query(sql))
+
+
+# --- Business ---
+
+_sql("business.kpis", """
+SELECT
+    (SELECT coalesce(sum(revenue), 0) FROM f_orders) AS revenue,
+    (SELECT coalesce(sum(margin), 0) FROM f_orders) AS margin,
+    (SELECT count(order_id) FROM f_orders) AS orders,
+    (SELECT count(website_session_id) FROM f_sessions) AS sessions,
+    (SELECT count(DISTINCT user_id) FROM f_sessions) AS users
+""")
+
+_sql("business.utm_share", """
+SELECT coalesce(CAST(s.utm_source AS VARCHAR), 'Untracked') || chr(10)
+       || coalesce(CAST(s.utm_campaign AS VARCHAR), 'Untracked') AS "UTM",
+       sum(o.revenue) AS "Revenue",
+       sum(o.items) AS "Quantity"
+FROM f_orders o LEFT JOIN f_sessions s USING (website_session_id)
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("business.sessions_by_channel", """
+SELECT CAST(utm_source AS VARCHAR) AS utm_source, count(website_session_id) AS website_session_id
+FROM f_sessions WHERE utm_source IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("business.sessions_by_campaign", """
+SELECT CAST(utm_campaign AS VARCHAR) AS utm_campaign, count(website_session_id) AS website_session_id
+FROM f_sessions WHERE utm_campaign IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("business.revenue_trend", """
+SELECT year(created_at) AS year, month(created_at) AS month, sum(revenue) AS revenue
+FROM f_orders WHERE created_at IS NOT NULL
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+_sql("business.billing_conversion", """
+WITH billing AS (
+    SELECT DISTINCT website_session_id, CAST(pageview_url AS VARCHAR) AS billing_page
+    FROM pageviews
+    WHERE CAST(pageview_url AS VARCHAR) IN ('/billing', '/billing-2')
+)
+SELECT billing_page,
+       count(DISTINCT website_session_id) AS sessions,
+       count(DISTINCT website_session_id) FILTER (
+           WHERE website_session_id IN (SELECT website_session_id FROM f_orders)) AS conversions
+FROM billing
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("business.units_share", """
+SELECT p.product_name, count(i.order_item_id) AS units_sold
+FROM f_items i LEFT JOIN products p USING (product_id)
+WHERE p.product_name IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+# --- Website ---
+
+# Landing page = first pageview of the session (ties broken by pageview id)
+_LANDING_PAGES = """
+landing AS (
+    SELECT website_session_id,
+           first(CAST(pageview_url AS VARCHAR) ORDER BY created_at, website_pageview_id) AS landing_page
+    FROM f_pageviews
+    GROUP BY 1
+)"""
+
+_sql("website.kpis", """
+SELECT
+    (SELECT count(website_session_id) FROM f_sessions) AS sessions,
+    (SELECT count(*) FROM (
+        SELECT website_session_id FROM f_pageviews GROUP BY 1 HAVING count(*) = 1)) AS bounces,
+    (SELECT count(DISTINCT website_session_id) FROM f_orders) AS order_sessions,
+    (SELECT count(*) FROM f_pageviews) AS pageviews,
+    (SELECT coalesce(sum(o.revenue), 0)
+     FROM f_sessions s JOIN f_orders o USING (website_session_id)) AS revenue
+""")
+
+_sql("website.monthly_sessions", """
+SELECT year(created_at) AS year, month(created_at) AS month, count(website_session_id) AS website_session_id
+FROM f_sessions WHERE created_at IS NOT NULL
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+_sql("website.device", """
+WITH per_device AS (
+    SELECT CAST(device_type AS VARCHAR) AS "Device", count(website_session_id) AS "Sessions"
+    FROM f_sessions WHERE device_type IS NOT NULL
+    GROUP BY 1
+), converted AS (
+    SELECT CAST(s.device_type AS VARCHAR) AS "Device", count(s.website_session_id) AS "Conversions"
+    FROM f_sessions s JOIN f_orders o USING (website_session_id)
+    WHERE s.device_type IS NOT NULL
+    GROUP BY 1
+)
+SELECT * FROM per_device JOIN converted USING ("Device") ORDER BY 1
+""")
+
+def _funnel_sql(stages):
+    """Ordered session funnel, same semantics as funnel.progress."""
+    def quoted(text):
+        return "'" + text.replace("'", "''") + "'"
+
+    cases = []
+    for k, stage in enumerate(stages, start=1):
+        tests = [f"url IN ({', '.join(quoted(u) for u in stage['exact'])})"] if stage['exact'] else []
+        tests += [f"starts_with(url, {quoted(p)})" for p in stage['prefix']]
+        if tests:
+            cases.append(f"WHEN {' OR '.join(tests)} THEN {k}")
+    reach = ["reach_1 AS (SELECT website_session_id, min(seq) AS seq FROM staged WHERE stage = 1 GROUP BY 1)"]
+    for k in range(2, len(stages) + 1):
+        reach.append(f"""reach_{k} AS (
+    SELECT s.website_session_id, min(s.seq) AS seq
+    FROM staged s JOIN reach_{k - 1} r ON r.website_session_id = s.website_session_id AND s.seq > r.seq
+    WHERE s.stage = {k} GROUP BY 1
+)""")
+    counts = "\nUNION ALL ".join(
+        f"SELECT {k} AS step, {quoted(stage['name'])} AS funnel_stage, count(*) AS sessions FROM reach_{k}"
+        for k, stage in enumerate(stages, start=1))
+    return f"""
+WITH staged AS (
+    SELECT website_session_id,
+           row_number() OVER (ORDER BY website_session_id, created_at, website_pageview_id) AS seq,
+           CASE {' '.join(cases) or 'WHEN false THEN 0'} END AS stage
+    FROM (SELECT *, CAST(pageview_url AS VARCHAR) AS url FROM f_pageviews)
+), {', '.join(reach)}
+SELECT funnel_stage, sessions FROM ({counts}) ORDER BY step
+"""
+
+
+@charts.aggregation("website.funnel", backend="sql")
+def _funnel(data):
+    return data.query(_funnel_sql(funnel.load_stages()))
+
+_sql("website.landing_pages", f"""
+WITH {_LANDING_PAGES}, per_page AS (
+    SELECT landing_page, count(website_session_id) AS "Sessions" FROM landing GROUP BY 1
+), converted AS (
+    SELECT l.landing_page, count(l.website_session_id) AS "Conversions"
+    FROM landing l JOIN f_orders o USING (website_session_id)
+    GROUP BY 1
+)
+SELECT landing_page AS "Landing Page", "Sessions", "Conversions"
+FROM per_page JOIN converted USING (landing_page)
+ORDER BY 1
+""")
+
+_sql("website.landing_bounce", f"""
+WITH {_LANDING_PAGES}, depth AS (
+    SELECT website_session_id, count(*) AS pv_count FROM f_pageviews GROUP BY 1
+)
+SELECT l.landing_page,
+       count(l.website_session_id) AS "Sessions",
+       count(*) FILTER (WHERE d.pv_count = 1) AS "Bounces"
+FROM landing l LEFT JOIN depth d USING (website_session_id)
+WHERE l.landing_page IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("website.top_pages", """
+SELECT CAST(pageview_url AS VARCHAR) AS page, count(*) AS visits
+FROM f_pageviews WHERE pageview_url IS NOT NULL
+GROUP BY 1 ORDER BY 2 DESC
+""")
+
+_ORDERED_PAGEVIEWS = """
+ordered AS (
+    SELECT CAST(pageview_url AS VARCHAR) AS page,
+           row_number() OVER w AS step_no,
+           lag(CAST(pageview_url AS VARCHAR)) OVER w AS prev_page,
+           row_number() OVER (PARTITION BY website_session_id
+                              ORDER BY created_at DESC, website_pageview_id DESC) AS from_end
+    FROM f_pageviews
+    WINDOW w AS (PARTITION BY website_session_id ORDER BY created_at, website_pageview_id)
+)"""
+
+_sql("website.exit_rate", f"""
+WITH {_ORDERED_PAGEVIEWS}
+SELECT page, count(*) AS total_visits, count(*) FILTER (WHERE from_end = 1) AS exit_count
+FROM ordered
+WHERE page IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("website.page_transitions", f"""
+WITH {_ORDERED_PAGEVIEWS}, steps AS (
+    SELECT CASE WHEN step_no = 1 THEN '(entry)' ELSE prev_page END AS from_page, page AS to_page
+    FROM ordered WHERE page IS NOT NULL AND (step_no = 1 OR prev_page IS NOT NULL)
+    UNION ALL
+    SELECT page, '(exit)' FROM ordered WHERE from_end = 1 AND page IS NOT NULL
+)
+SELECT from_page, to_page, count(*) AS "count"
+FROM steps
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+_sql("website.bounce_trend", """
+WITH bounced AS (
+    SELECT website_session_id FROM f_pageviews GROUP BY 1 HAVING count(*) = 1
+)
+SELECT strftime(created_at, '%Y-%m') AS year_month,
+       count(*) AS sessions,
+       count(*) FILTER (WHERE website_session_id IN (SELECT website_session_id FROM bounced)) AS bounces
+FROM f_sessions
+GROUP BY 1 ORDER BY 1
+""")
+
+# --- Marketing ---
+
+_sql("marketing.kpis", """
+SELECT
+    (SELECT count(DISTINCT user_id) FROM f_sessions) AS visitors,
+    (SELECT count(DISTINCT website_session_id) FROM f_sessions) AS sessions,
+    (SELECT count(*) FROM f_sessions WHERE CAST(utm_source AS VARCHAR) = 'gsearch') AS g_sessions,
+    (SELECT count(*) FROM f_orders o LEFT JOIN f_sessions s USING (website_session_id)
+     WHERE CAST(s.utm_source AS VARCHAR) = 'gsearch') AS g_orders,
+    (SELECT count(*) FROM f_sessions WHERE CAST(is_repeat_session AS INTEGER) = 1) AS repeat_sessions,
+    (SELECT count(DISTINCT user_id) FROM f_sessions WHERE CAST(is_repeat_session AS INTEGER) = 1) AS repeat_visitors
+""")
+
+_sql("marketing.monthly_source", """
+SELECT strftime(created_at, '%Y-%m') AS year_month,
+       CAST(utm_source AS VARCHAR) AS utm_source,
+       count(DISTINCT website_session_id) AS sessions
+FROM f_sessions WHERE utm_source IS NOT NULL
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+_sql("marketing.revenue_by_campaign", """
+SELECT CAST(s.utm_source AS VARCHAR) || chr(10) || CAST(s.utm_campaign AS VARCHAR) AS source_campaign,
+       sum(o.revenue) AS revenue
+FROM f_orders o LEFT JOIN f_sessions s USING (website_session_id)
+WHERE s.utm_source IS NOT NULL AND s.utm_campaign IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("marketing.repeat_by_campaign", """
+WITH labelled AS (
+    SELECT coalesce(CAST(utm_source AS VARCHAR), 'Untracked') || chr(10)
+           || coalesce(CAST(utm_campaign AS VARCHAR), 'Untracked') AS source_campaign,
+           website_session_id, is_repeat_session
+    FROM f_sessions
+)
+SELECT source_campaign,
+       count(DISTINCT website_session_id) AS total_sessions,
+       count(DISTINCT website_session_id) FILTER (WHERE CAST(is_repeat_session AS INTEGER) = 1) AS repeat_sessions
+FROM labelled
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("marketing.page_depth", """
+WITH depth AS (
+    SELECT website_session_id, count(*) AS page_depth FROM pageviews GROUP BY 1
+)
+SELECT CAST(s.utm_source AS VARCHAR) AS utm_source,
+       sum(d.page_depth) AS pageviews,
+       count(d.page_depth) AS sessions
+FROM depth d JOIN f_sessions s USING (website_session_id)
+WHERE s.utm_source IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("marketing.session_frequency", """
+WITH per_user AS (
+    SELECT user_id, count(DISTINCT website_session_id) AS session_count
+    FROM f_sessions WHERE user_id IS NOT NULL
+    GROUP BY 1
+)
+SELECT session_count, count(user_id) AS num_users
+FROM per_user
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("marketing.conversion_by_source", """
+WITH per_source AS (
+    SELECT CAST(utm_source AS VARCHAR) AS utm_source, count(DISTINCT website_session_id) AS sessions
+    FROM f_sessions WHERE utm_source IS NOT NULL
+    GROUP BY 1
+), per_source_orders AS (
+    SELECT CAST(s.utm_source AS VARCHAR) AS utm_source, count(DISTINCT o.order_id) AS orders
+    FROM f_sessions s JOIN f_orders o USING (website_session_id)
+    WHERE s.utm_source IS NOT NULL
+    GROUP BY 1
+)
+SELECT utm_source, sessions, coalesce(orders, 0) AS orders
+FROM per_source LEFT JOIN per_source_orders USING (utm_source)
+ORDER BY 1
+""")
+
+_sql("marketing.repeat_users", """
+SELECT CAST(utm_source AS VARCHAR) AS utm_source,
+       count(DISTINCT user_id) AS total_users,
+       count(DISTINCT user_id) FILTER (WHERE CAST(is_repeat_session AS INTEGER) = 1) AS repeat_users
+FROM f_sessions WHERE utm_source IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+# --- Product ---
+
+_sql("product.kpis", """
+SELECT count(order_item_id) AS units,
+       coalesce(sum(price_usd), 0) AS revenue,
+       coalesce(sum(CAST(is_refunded AS INTEGER)), 0) AS refunds
+FROM f_items
+""")
+
+_sql("product.revenue_by_product", """
+SELECT p.product_name, sum(i.price_usd) AS price_usd
+FROM f_items i LEFT JOIN products p USING (product_id)
+WHERE p.product_name IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("product.refunds_by_product", """
+SELECT p.product_name,
+       count(i.order_item_id) AS "Sold",
+       sum(CAST(i.is_refunded AS INTEGER)) AS "Refunded"
+FROM f_items i LEFT JOIN products p USING (product_id)
+WHERE p.product_name IS NOT NULL
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("product.monthly_sales", """
+SELECT strftime(i.created_at, '%Y-%m') AS month, p.product_name, sum(i.price_usd) AS price_usd
+FROM f_items i LEFT JOIN products p USING (product_id)
+WHERE p.product_name IS NOT NULL
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+_sql("product.items_per_order", """
+WITH per_order AS (
+    SELECT order_id, count(order_item_id) AS n FROM f_items GROUP BY 1
+)
+SELECT n AS "Items in Cart", count(*) AS "Order Count"
+FROM per_order
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("product.page_cvr", """
+WITH product_pages AS (
+    SELECT CAST(pageview_url AS VARCHAR) AS pageview_url, website_session_id
+    FROM pageviews
+    WHERE CAST(pageview_url AS VARCHAR) IN ('/the-original-mr-fuzzy', '/the-forever-love-bear',
+                                            '/the-birthday-sugar-panda', '/the-hudson-river-mini-bear')
+)
+SELECT pageview_url,
+       count(DISTINCT website_session_id) AS sessions,
+       count(*) FILTER (WHERE website_session_id IN (SELECT website_session_id FROM f_orders)) AS orders
+FROM product_pages
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("product.cross_sell", """
+WITH order_products AS (
+    SELECT DISTINCT o.order_id, p.product_name
+    FROM f_orders o
+    JOIN f_items i ON i.order_id = o.order_id
+    JOIN products p ON p.product_id = i.product_id
+    WHERE o.items_purchased > 1
+)
+SELECT a.product_name || '+' || b.product_name AS product_pair, count(*) AS "count"
+FROM order_products a
+JOIN order_products b ON a.order_id = b.order_id AND a.product_name < b.product_name
+GROUP BY 1 ORDER BY 1
+""")
+
+_sql("product.cross_sell_rules", """
+WITH order_products AS (
+    SELECT DISTINCT order_id, product_id FROM f_items
+),
+totals AS (
+    SELECT CAST(count(DISTINCT order_id) AS DOUBLE) AS orders FROM order_products
+),
+singles AS (
+    SELECT product_id, count(*) AS orders FROM order_products GROUP BY 1
+),
+pairs AS (
+    SELECT a.product_id AS antecedent, b.product_id AS consequent, count(*) AS "count"
+    FROM order_products a
+    JOIN order_products b ON a.order_id = b.order_id AND a.product_id <> b.product_id
+    GROUP BY 1, 2
+)
+SELECT pa.product_name AS antecedent, pb.product_name AS consequent, p."count",
+       p."count" / t.orders AS support,
+       CAST(p."count" AS DOUBLE) / sa.orders AS confidence,
+       p."count" * t.orders / (sa.orders * sb.orders) AS lift
+FROM pairs p
+CROSS JOIN totals t
+JOIN singles sa ON sa.product_id = p.antecedent
+JOIN singles sb ON sb.product_id = p.consequent
+LEFT JOIN products pa ON pa.product_id = p.antecedent
+LEFT JOIN products pb ON pb.product_id = p.consequent
+ORDER BY 1, 2
+""")
+
+_sql("product.device_units", """
+SELECT p.product_name, CAST(s.device_type AS VARCHAR) AS device_type, count(i.order_item_id) AS units_sold
+FROM f_orders o
+LEFT JOIN f_sessions s ON s.website_session_id = o.website_session_id
+JOIN f_items i ON i.order_id = o.order_id
+LEFT JOIN products p ON p.product_id = i.product_id
+WHERE p.product_name IS NOT NULL AND s.device_type IS NOT NULL
+GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+
+# --- Parity check ---
+
+def compare(pandas_data, sql_data, chart_ids=None):
+    """Returns {chart_id: problem} for every chart whose numbers differ."""
+    chart_ids = chart_ids or charts.chart_ids("pandas")
+    problems = {chart_id: "no SQL implementation" for chart_id in chart_ids
+                if (chart_id, "sql") not in charts.IMPLEMENTATIONS}
+    problems.update(charts.compare(pandas_data, sql_data, [c for c in chart_ids if c not in problems]))
+    return problems
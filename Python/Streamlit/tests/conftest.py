@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+# The dashboard modules are flat files next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import data_loader as dl  # noqa: E402
+import synthetic  # noqa: E402
+
+
+@pytest.fixture
+def source_dir(tmp_path, monkeypatch):
+    """A folder the loader reads its CSVs from, with its own snapshot folder."""
+    monkeypatch.setattr(dl, "SCRIPT_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "SNAPSHOT_DIR", str(tmp_path / ".snapshot"))
+    return tmp_path
+
+
+@pytest.fixture
+def dataset(source_dir):
+    """The synthetic CSVs written to source_dir; returns the string-typed tables."""
+    return synthetic.write_csvs(source_dir)
+
+
+@pytest.fixture
+def frames(dataset):
+    """load_data() of the synthetic dataset."""
+    return dl.load_data()
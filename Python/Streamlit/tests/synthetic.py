@@ -0,0 +1,141 @@
+"""A small made-up dataset with the columns and value domains of the six
+source CSVs, for the tests (the real CSVs are large and not in git)."""
+import datetime
+import numpy as np
+import pandas as pd
+
+START = pd.Timestamp("2012-03-19")
+END = pd.Timestamp("2015-03-19")
+
+PRODUCTS = {
+    1: ("The Original Mr. Fuzzy", "/the-original-mr-fuzzy", 49.99, 19.49),
+    2: ("The Forever Love Bear", "/the-forever-love-bear", 59.99, 22.49),
+    3: ("The Birthday Sugar Panda", "/the-birthday-sugar-panda", 45.99, 14.49),
+    4: ("The Hudson River Mini bear", "/the-hudson-river-mini-bear", 29.99, 9.49),
+}
+
+# (utm_source, utm_campaign, http_referer); organic and direct traffic
+# has no utm values
+CHANNELS = [
+    ("gsearch", "nonbrand", "https://www.gsearch.com", 0.55),
+    ("gsearch", "brand", "https://www.gsearch.com", 0.08),
+    ("bsearch", "nonbrand", "https://www.bsearch.com", 0.12),
+    ("bsearch", "brand", "https://www.bsearch.com", 0.02),
+    ("socialbook", "pilot", "https://www.socialbook.com", 0.03),
+    (None, None, "https://www.gsearch.com", 0.10),
+    (None, None, None, 0.10),
+]
+
+FUNNEL = ["/products", None, "/cart", "/shipping", "/billing", "/thank-you-for-your-order"]
+
+
+def _stamp(ts):
+    return pd.Series(ts).dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def frames(n_sessions=3000, seed=0):
+    """The six source tables as string-typed frames, like read from CSV."""
+    rng = np.random.default_rng(seed)
+    span = (END - START).total_seconds()
+    created = START + pd.to_timedelta(np.sort(rng.uniform(0, span, n_sessions)), unit="s")
+    created = created.floor("s")
+    n_users = max(1, int(n_sessions * 0.85))
+    users = rng.integers(1, n_users + 1, n_sessions)
+    repeat = pd.Series(users).duplicated().to_numpy().astype(int)
+    weights = np.array([c[3] for c in CHANNELS])
+    channel = rng.choice(len(CHANNELS), n_sessions, p=weights / weights.sum())
+    sessions = pd.DataFrame({
+        "website_session_id": np.arange(1, n_sessions + 1),
+        "created_at": _stamp(created),
+        "user_id": users,
+        "is_repeat_session": repeat,
+        "utm_source": [CHANNELS[c][0] for c in channel],
+        "utm_campaign": [CHANNELS[c][1] for c in channel],
+        "utm_content": [None if CHANNELS[c][0] is None else f"{CHANNELS[c][0][0]}_ad_1" for c in channel],
+        "device_type": rng.choice(["desktop", "mobile"], n_sessions, p=[0.7, 0.3]),
+        "http_referer": [CHANNELS[c][2] for c in channel],
+    })
+
+    pageviews, orders, items, refunds = [], [], [], []
+    for sid, ts in zip(sessions["website_session_id"], created):
+        landing = "/home" if rng.random() < 0.4 else f"/lander-{rng.integers(1, 4)}"
+        urls = [landing]
+        product = int(rng.choice(list(PRODUCTS), p=[0.6, 0.2, 0.12, 0.08]))
+        for step in FUNNEL:
+            if rng.random() > 0.62:
+                break
+            if step is None:
+                step = PRODUCTS[product][1]
+            elif step == "/billing" and rng.random() < 0.5:
+                step = "/billing-2"
+            urls.append(step)
+        # Every tenth session is left open for hours between pages, so some
+        # run past midnight and their orders fall on a later day
+        gap = pd.Timedelta(hours=4) if sid % 10 == 0 else pd.Timedelta(seconds=30)
+        for i, url in enumerate(urls):
+            pageviews.append((sid, ts + gap * i, url))
+        if urls[-1] == "/thank-you-for-your-order":
+            order_id = len(orders) + 1
+            order_ts = ts + gap * len(urls)
+            basket = [product] + ([int(rng.choice([p for p in PRODUCTS if p != product]))]
+                                  if rng.random() < 0.25 else [])
+            for j, pid in enumerate(basket):
+                item_id = len(items) + 1
+                items.append((item_id, order_ts, order_id, pid, int(j == 0), PRODUCTS[pid][2], PRODUCTS[pid][3]))
+                if rng.random() < 0.05:
+                    refunds.append((len(refunds) + 1, order_ts + pd.Timedelta(days=7), item_id,
+                                    order_id, PRODUCTS[pid][2]))
+            orders.append((order_id, order_ts, sid, int(users[sid - 1]), product, len(basket),
+                           sum(PRODUCTS[p][2] for p in basket), sum(PRODUCTS[p][3] for p in basket)))
+
+    pageviews = pd.DataFrame(pageviews, columns=["website_session_id", "created_at", "pageview_url"])
+    pageviews = pageviews.sort_values("created_at", kind="stable").reset_index(drop=True)
+    pageviews.insert(0, "website_pageview_id", np.arange(1, len(pageviews) + 1))
+    pageviews["created_at"] = _stamp(pageviews["created_at"])
+    pageviews = pageviews[["website_pageview_id", "created_at", "website_session_id", "pageview_url"]]
+
+    orders = pd.DataFrame(orders, columns=["order_id", "created_at", "website_session_id", "user_id",
+                                           "primary_product_id", "items_purchased", "price_usd", "cogs_usd"])
+    orders["created_at"] = _stamp(orders["created_at"])
+    items = pd.DataFrame(items, columns=["order_item_id", "created_at", "order_id", "product_id",
+                                         "is_primary_item", "price_usd", "cogs_usd"])
+    items["created_at"] = _stamp(items["created_at"])
+    refunds = pd.DataFrame(refunds, columns=["order_item_refund_id", "created_at", "order_item_id",
+                                             "order_id", "refund_amount_usd"])
+    refunds["created_at"] = _stamp(refunds["created_at"])
+    products = pd.DataFrame({
+        "product_id": list(PRODUCTS),
+        "created_at": _stamp(pd.Series([START] * len(PRODUCTS))),
+        "product_name": [p[0] for p in PRODUCTS.values()],
+    })
+    return {"sessions": sessions, "orders": orders, "items": items,
+            "products": products, "refunds": refunds, "pageviews": pageviews}
+
+
+def write_csvs(directory, n_sessions=3000, seed=0):
+    """Writes the source CSVs (data_loader.SOURCE_FILES names) to `directory`."""
+    import data_loader as dl
+
+    tables = frames(n_sessions, seed)
+    for name, file_name in dl.SOURCE_FILES.items():
+        tables[name].to_csv(f"{directory}/{file_name}", index=False)
+    return tables
+
+
+def filter_states(frames):
+    """Sidebar selections the tests run on: everything, narrower ones, one
+    day, a month boundary and a range before the data (nothing selected)."""
+    import filters as flt
+
+    df_sess, _, _, df_prods, _ = frames
+    first, last, utm, products = flt.slicer_options(df_sess, df_prods)
+    month = datetime.date(2013, 6, 1), datetime.date(2013, 6, 30)
+    return {
+        'default': flt.default_filters(df_sess, df_prods),
+        'one month, some sources and products': flt.Filters.from_widgets(*month, utm[:2], products[:2]),
+        'one day': flt.Filters.from_widgets(month[0], month[0], utm, products),
+        'month boundary': flt.Filters.from_widgets(datetime.date(2013, 5, 31), datetime.date(2013, 6, 1),
+                                                   utm, products),
+        'before the data': flt.Filters.from_widgets(first - datetime.timedelta(days=30),
+                                                    first - datetime.timedelta(days=1), utm, products),
+    }
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+import pandas as pd
+import channels
+
+RULES = {
+    'exact': {"https://www.gsearch.com": "gsearch", "https://www.bsearch.com": "bsearch"},
+    'prefix': {"https://www.google.": "google", "https://www.google.co.uk": "google_uk",
+               "https://www.gsearch": "gsearch_other"},
+}
+
+
+def test_exact_and_prefix_matches():
+    referers = pd.Series([
+        "https://www.gsearch.com",      # exact wins over the gsearch prefix
+        "https://www.gsearch.net",      # prefix
+        "https://www.google.com",
+        "https://www.google.co.uk/q",   # longest prefix wins
+        "https://www.bsearch.com",
+        "https://www.unknown.com",
+        None,
+    ])
+    sources = channels.classify_referers(referers, RULES)
+    assert sources.dtype == 'category'
+    assert sources.astype(object).where(sources.notna(), None).tolist() == [
+        "gsearch", "gsearch_other", "google", "google_uk", "bsearch", None, None]
+
+
+def test_matches_the_old_loop():
+    rng = np.random.default_rng(0)
+    choices = np.array(["https://www.gsearch.com", "https://www.bsearch.com",
+                        "https://www.socialbook.com", None], dtype=object)
+    referers = pd.Series(choices[rng.integers(0, len(choices), 10_000)])
+    rules = channels.load_rules()
+    expected = referers.map(rules['exact'])
+    actual = channels.classify_referers(referers, rules).astype(object)
+    assert actual.isna().equals(expected.isna())
+    assert (actual[actual.notna()] == expected[expected.notna()]).all()
+
+
+def test_index_is_kept():
+    referers = pd.Series(["https://www.bsearch.com", None], index=[10, 20])
+    assert channels.classify_referers(referers, RULES).index.tolist() == [10, 20]
+
+
+def test_rules_file(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"exact": {"https://a.example": "a"}}))
+    rules = channels.load_rules(path)
+    assert rules == {'exact': {"https://a.example": "a"}, 'prefix': {}}
+    assert channels.classify_referers(pd.Series(["https://a.example"]), rules).tolist() == ["a"]
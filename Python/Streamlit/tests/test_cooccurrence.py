@@ -0,0 +1,103 @@
+from collections import Counter
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import cooccurrence
+import data_loader as dl
+import filters as flt
+import synthetic
+from test_incremental import _append, _write_head
+
+
+def _pair_counts_loop(df_oi):
+    pairs = Counter()
+    for products in df_oi.groupby('order_id')['product_id'].apply(list):
+        pairs.update(combinations(sorted(set(products)), 2))
+    return pairs
+
+
+def _items(n=5000, n_products=12, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 5, n)
+    df_oi = pd.DataFrame({
+        'order_id': np.repeat(np.arange(1, n + 1), sizes),
+        'product_id': rng.integers(1, n_products, sizes.sum()),
+    })
+    # Items arrive in any order
+    return df_oi.sample(frac=1, random_state=seed)
+
+
+def _assert_same_counts(actual, expected):
+    assert actual.n_products == expected.n_products
+    assert np.array_equal(actual.counts, expected.counts)
+    assert actual.orders == expected.orders
+
+
+def test_pairs_match_the_combinations_loop():
+    df_oi = _items()
+    pairs = cooccurrence.CoOccurrence.of(df_oi).pairs()
+    assert dict(zip(zip(pairs['product_a'], pairs['product_b']), pairs['count'])) == dict(_pair_counts_loop(df_oi))
+
+
+def test_add_matches_a_rebuild():
+    df_oi = _items()
+    engine = cooccurrence.CoOccurrence(0)
+    for orders in np.array_split(np.arange(1, 5001), 3):
+        new = df_oi[df_oi['order_id'].isin(orders)]
+        engine.add(new['order_id'], new['product_id'])
+    _assert_same_counts(engine, cooccurrence.CoOccurrence.of(df_oi))
+
+
+def test_measures():
+    # Orders: {1, 2}, {1, 2}, {1, 3}, {2}
+    df_oi = pd.DataFrame({'order_id': [1, 1, 2, 2, 2, 3, 3, 4], 'product_id': [1, 2, 1, 2, 2, 1, 3, 2]})
+    engine = cooccurrence.CoOccurrence.of(df_oi)
+    pairs = engine.pairs().set_index(['product_a', 'product_b'])
+    assert pairs.loc[(1, 2), 'count'] == 2
+    assert pairs.loc[(1, 2), 'support'] == 2 / 4
+    assert pairs.loc[(1, 2), 'lift'] == 2 * 4 / (3 * 3)
+    rules = engine.rules().set_index(['antecedent', 'consequent'])
+    assert rules.loc[(1, 3), 'confidence'] == 1 / 3
+    assert rules.loc[(3, 1), 'confidence'] == 1
+    _assert_same_counts(cooccurrence.CoOccurrence.from_json(engine.to_json()), engine)
+
+
+def test_load_level_counts_serve_selections_of_every_item(frames):
+    states = synthetic.filter_states(frames)
+    pairs = dl.load_cooccurrence()
+    everything = flt.apply_filters(*frames, states['default'], cooccurrence=pairs)
+    assert everything.cooccurrence is pairs
+    _assert_same_counts(pairs, cooccurrence.CoOccurrence.of(everything.items))
+    narrow = flt.apply_filters(*frames, states['one month, some sources and products'], cooccurrence=pairs)
+    assert narrow.cooccurrence is None
+
+
+def _loaded_pairs():
+    frames, _, pairs = dl._load_frames(dl._source_fingerprint())
+    return frames[dl.FRAME_NAMES.index('items')], pairs
+
+
+def test_refresh_adds_the_new_orders(source_dir, monkeypatch):
+    tails = _write_head(source_dir, synthetic.frames())
+    _loaded_pairs()
+    _append(source_dir, tails)
+
+    def recount(*args, **kwargs):
+        raise AssertionError("pair counts recounted instead of added to")
+    monkeypatch.setattr(cooccurrence.CoOccurrence, "of", recount)
+    items, pairs = _loaded_pairs()
+    monkeypatch.undo()
+    _assert_same_counts(pairs, cooccurrence.CoOccurrence.of(items))
+
+
+def test_items_of_counted_orders_force_a_recount(source_dir):
+    tables = synthetic.frames()
+    # The second item of every order arrives after the refresh
+    later = tables['items']['is_primary_item'] == 0
+    early_items = tables['items'][~later]
+    tails = _write_head(source_dir, dict(tables, items=early_items))
+    _loaded_pairs()
+    _append(source_dir, dict(tails, items=pd.concat([tails['items'], tables['items'][later]])))
+    items, pairs = _loaded_pairs()
+    assert len(items) == len(tables['items'])
+    _assert_same_counts(pairs, cooccurrence.CoOccurrence.of(items))
@@ -0,0 +1,25 @@
+import pytest
+import charts
+import data_loader as dl
+import filters as flt
+import synthetic
+from views import business, website, marketing, product  # noqa: F401 (register the charts)
+
+
+def test_sessions_and_orders_on_different_days(frames):
+    # The cube keeps a session's date and its order's date apart; the
+    # synthetic data must have orders placed the day after their session
+    df_sess, df_orders = frames[0], frames[1]
+    session_day = df_orders['website_session_id'].map(df_sess.set_index('website_session_id')['created_at'])
+    assert (df_orders['created_at'].dt.normalize() != session_day.dt.normalize()).any()
+
+
+@pytest.mark.parametrize("state", ['default', 'one month, some sources and products', 'one day',
+                                   'month boundary', 'before the data'])
+def test_cube_matches_raw_rows(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    raw = flt.apply_filters(*frames, filters)
+    rolled = flt.apply_filters(*frames, filters, cube=dl.load_cube())
+    assert rolled.backends[0] == "cube"
+    assert not rolled.estimated_users
+    assert charts.compare(raw, rolled, charts.chart_ids("cube")) == {}
@@ -0,0 +1,29 @@
+import dataclasses
+import pandas as pd
+import plotly.express as px
+import data_loader as dl
+import filters as flt
+import synthetic
+import utils as ut
+import view_cache
+from views import business, website, marketing, product  # noqa: F401 (register the figures)
+
+
+def test_dashboard_template_carries_the_margin():
+    fig = px.bar(pd.DataFrame({'a': ['x', 'y'], 'b': [1, 2]}), x='a', y='b', template="dashboard")
+    # Plotly Express leaves the figure's own margin unset, the template's applies
+    assert fig.layout.margin.to_plotly_json() == {}
+    assert fig.layout.template.layout.margin.to_plotly_json() == dict(l=20, r=20, t=40, b=20)
+
+
+def test_figures_are_keyed_on_the_resolved_backends(frames):
+    filters = synthetic.filter_states(frames)['default']
+    cache = view_cache.ViewCache(10)
+    stores = dict(figure_cache=cache, dataset_version='v')
+    raw = dataclasses.replace(flt.apply_filters(*frames, filters), **stores)
+    rolled = dataclasses.replace(flt.apply_filters(*frames, filters, cube=dl.load_cube()), **stores)
+    assert raw.backends != rolled.backends
+    build = ut.FIGURES["business.sessions_by_channel"]
+    assert build(raw) is not build(rolled)
+    assert build(rolled) is build(rolled)
+    assert cache.stats()['misses'] == 2
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import figures
+
+
+def test_lttb_keeps_the_ends_and_the_spike():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 25
+    keep = figures.lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert 437 in keep
+
+
+def test_lttb_leaves_short_series_alone():
+    assert figures.lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+    assert figures.lttb(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
+
+
+def test_long_lines_are_downsampled_with_their_hover_data():
+    dates = pd.date_range('2012-01-01', periods=5000, freq='h')
+    fig = go.Figure(go.Scatter(x=dates, y=np.random.default_rng(0).normal(size=5000), mode='lines',
+                               customdata=np.arange(5000)))
+    trace = figures.slim(fig, point_budget=500, webgl_min_points=0).data[0]
+    assert trace.type == 'scatter'
+    assert len(trace.x) == len(trace.y) == len(trace.customdata) == 500
+    # Every kept point is still the same (x, y, customdata) triple
+    assert np.array_equal(np.asarray(trace.x, dtype='datetime64[ns]'), dates.to_numpy()[trace.customdata])
+
+
+def test_markers_and_unordered_lines_keep_every_point():
+    markers = go.Scatter(x=np.arange(3000), y=np.arange(3000), mode='markers')
+    unordered = go.Scatter(x=np.r_[np.arange(1500), np.arange(1500)], y=np.arange(3000), mode='lines')
+    slimmed = figures.slim(go.Figure([markers, unordered]), point_budget=500, webgl_min_points=0)
+    assert [len(t.y) for t in slimmed.data] == [3000, 3000]
+
+
+def test_long_scatters_use_webgl():
+    fig = go.Figure([go.Scatter(y=np.arange(2000), mode='markers'), go.Scatter(y=np.arange(10)),
+                     go.Bar(y=np.arange(2000))])
+    slimmed = figures.slim(fig, point_budget=0, webgl_min_points=1000)
+    assert [t.type for t in slimmed.data] == ['scattergl', 'scatter', 'bar']
+
+
+def test_template_keeps_only_the_trace_types_used():
+    fig = px.bar(pd.DataFrame({'a': ['x', 'y'], 'b': [1, 2]}), x='a', y='b', template='plotly')
+    slimmed = figures.slim(fig)
+    assert set(slimmed.layout.template.data.to_plotly_json()) == {'bar'}
+    assert figures.payload_bytes(slimmed) < figures.payload_bytes(fig)
+
+
+def test_spec_sends_the_kept_dict():
+    spec = figures.spec(go.Figure(go.Scatter(y=np.arange(10))))
+    assert isinstance(spec.figure, figures.SentFigure)
+    assert spec.figure.to_dict() is spec.figure.to_dict()
+    assert spec.nbytes > 0
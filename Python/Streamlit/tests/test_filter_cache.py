@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import charts
+import filter_cache
+import filters as flt
+import intermediates  # noqa: F401 (registers the shared intermediates)
+import synthetic
+
+EMPTY = pd.DataFrame()
+
+
+def _data(rows):
+    """A FilteredData whose own frames hold `rows` bytes of sessions."""
+    return flt.FilteredData(None, pd.DataFrame({'x': np.zeros(rows, dtype='int8')}), EMPTY, EMPTY, EMPTY,
+                            EMPTY, EMPTY, session_facts=EMPTY)
+
+
+def _cache(entries, rows=1000):
+    return filter_cache.FilterCache(entries * filter_cache.entry_bytes(_data(rows)))
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache(2)
+    a = cache.get_or_compute('a', lambda: _data(1000))
+    cache.get_or_compute('b', lambda: _data(1000))
+    assert cache.get_or_compute('a', lambda: _data(1000)) is a
+    cache.get_or_compute('c', lambda: _data(1000))
+    assert cache.get_or_compute('a', _data) is a
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 3, 1)
+    assert stats['size'] <= stats['budget']
+    # 'b' went, so it is computed again
+    cache.get_or_compute('b', lambda: _data(1000))
+    assert cache.stats()['misses'] == 4
+
+
+def test_byte_budget():
+    cache = _cache(3)
+    for key in 'abc':
+        cache.get_or_compute(key, lambda: _data(1000))
+    assert cache.stats()['evictions'] == 0
+    # Two entries' worth of bytes push out the two oldest
+    cache.get_or_compute('big', lambda: _data(2000))
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions']) == (2, 2)
+    # Over the whole budget: returned, not cached
+    huge = cache.get_or_compute('huge', lambda: _data(10_000))
+    assert len(huge.sessions) == 10_000
+    assert cache.stats()['entries'] == 2
+
+
+def test_intermediates_count_towards_the_budget():
+    cache = _cache(2)
+    first = cache.get_or_compute('a', lambda: _data(1000))
+    second = cache.get_or_compute('b', lambda: _data(1000))
+    before = cache.stats()['size']
+    second.intermediates['extra'] = pd.Series(np.zeros(500, dtype='int8'))
+    stats = cache.stats()
+    assert stats['size'] <= stats['budget']
+    # 'a' made room for the grown 'b'
+    assert (stats['entries'], stats['evictions']) == (1, 1)
+    assert stats['size'] > before - filter_cache.entry_bytes(first)
+    # An entry that outgrows the budget by itself is dropped
+    second.intermediates['huge'] = pd.Series(np.zeros(10_000, dtype='int8'))
+    assert cache.stats()['entries'] == 0
+    assert 'huge' in second.intermediates
+
+
+def test_resolve_accounts_the_intermediate(frames):
+    filters = synthetic.filter_states(frames)['default']
+    cache = filter_cache.FilterCache(1 << 30)
+    data = cache.get_or_compute('default', lambda: flt.apply_filters(*frames, filters))
+    before = cache.stats()['size']
+    months = charts.resolve('session_months', data)
+    assert cache.stats()['size'] == before + months.memory_usage(deep=True)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data_loader as dl
+import filters as flt
+import join_index
+import partitions
+import synthetic
+
+STATES = ['default', 'one month, some sources and products', 'one day', 'month boundary', 'before the data']
+
+
+def _assert_same_tables(actual, expected, names):
+    for name in names:
+        pd.testing.assert_frame_equal(
+            getattr(actual, name).reset_index(drop=True), getattr(expected, name).reset_index(drop=True),
+            obj=name)
+
+
+def test_partition_rows_cover_the_overlapping_months():
+    keys = np.array([partitions.month_key(m) for m in ['2013-05-01'] * 3 + ['2013-06-01'] * 2 + ['2013-08-01']]
+                    + [partitions.NO_PARTITION])
+    index = partitions.PartitionIndex.from_sorted_keys(keys)
+    assert index.rows('2013-05-31', '2013-06-02') == slice(0, 5)
+    assert index.rows('2013-06-01', '2013-07-01') == slice(3, 5)
+    assert index.rows('2013-07-01', '2013-08-01') == slice(0, 0)
+    assert index.rows('2013-08-01', '2030-01-01') == slice(5, 6)
+    assert partitions.PartitionIndex.from_json(index.to_json()).to_json() == index.to_json()
+
+
+def test_pageviews_sit_in_their_session_month(frames):
+    df_sess, df_pv = frames[0], frames[4]
+    index = dl.load_indexes()['pageviews']
+    session_month = df_sess.set_index('website_session_id')['created_at'].dt.to_period('M')
+    for key, lo, hi in zip(index.keys, index.offsets[:-1], index.offsets[1:]):
+        months = df_pv['website_session_id'].iloc[lo:hi].map(session_month)
+        if key == partitions.NO_PARTITION:
+            assert months.isna().all()
+        else:
+            assert (months == pd.Period(pd.Timestamp(year=key // 12, month=key % 12 + 1, day=1), 'M')).all()
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_partition_pruning_matches_a_full_scan(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    full = flt.apply_filters(*frames, filters)
+    pruned = flt.apply_filters(*frames, filters, index={'pageviews': dl.load_indexes()['pageviews']})
+    _assert_same_tables(pruned, full, ['sessions', 'pageviews'])
+
+
+def test_time_index_slice_matches_the_mask():
+    created_at = pd.to_datetime(['2013-05-31 23:59', '2013-06-01 00:00', '2013-06-01 00:00', '2013-06-15 12:00',
+                                 '2013-07-01 00:00', None, None])
+    df = pd.DataFrame({'created_at': created_at, 'row': range(len(created_at))})
+    index = partitions.TimeIndex.of(df)
+    for start, end in [('2013-06-01', '2013-07-01'), ('2013-06-01', '2013-06-01'),
+                       ('2000-01-01', '2030-01-01'), ('2014-01-01', '2015-01-01')]:
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        expected = df[(df['created_at'] >= start) & (df['created_at'] < end)]
+        assert index.select(df, start, end).equals(expected)
+
+
+def test_sort_by_time_puts_nat_last(frames):
+    shuffled = {n: df.sample(frac=1, random_state=0) for n, df in zip(dl.FRAME_NAMES, frames)}
+    ordered = partitions.sort_by_time(shuffled)
+    for name in partitions.TIME_SORTED:
+        created_at = ordered[name]['created_at']
+        dated = created_at.dropna()
+        assert dated.is_monotonic_increasing
+        assert created_at.iloc[len(dated):].isna().all()
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_time_indexes_match_masks(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    index = {n: dl.load_indexes()[n] for n in partitions.TIME_SORTED}
+    _assert_same_tables(flt.apply_filters(*frames, filters, index=index),
+                        flt.apply_filters(*frames, filters), ['sessions', 'orders', 'items'])
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_id_bitmaps_match_isin(sparse):
+    rng = np.random.default_rng(0)
+    ids = pd.Series(rng.choice(10**9 if sparse else 5000, 2000, replace=False).astype('int64'))
+    keys = pd.Series(rng.choice(ids, 10_000))
+    space = join_index.IdSpace.of(pd.DataFrame({'website_session_id': ids}),
+                                  pd.DataFrame({'website_session_id': keys, 'order_id': keys}),
+                                  pd.DataFrame({'order_id': keys}), pd.DataFrame({'website_session_id': keys}))
+    assert (space.session_bound is None) == sparse
+    selected = ids.iloc[::3]
+    expected = keys.isin(selected).to_numpy()
+    assert np.array_equal(space.sessions_in(keys, selected), expected)
+    assert np.array_equal(space.orders_in(keys, selected), expected)
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_id_cascade_matches_isin(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    index = {'ids': dl.load_indexes()['ids']}
+    assert index['ids'].session_bound is not None
+    _assert_same_tables(flt.apply_filters(*frames, filters, index=index),
+                        flt.apply_filters(*frames, filters), ['orders', 'items', 'pageviews'])
+
+
+def test_session_rows_match_isin(frames):
+    df_pv = frames[4]
+    space = dl.load_indexes()['ids']
+    rows = join_index.SessionRows.of(df_pv, space.session_bound)
+    sessions = frames[0]['website_session_id']
+    for selected in [sessions.iloc[::7], sessions.iloc[::-3], sessions.iloc[:0]]:
+        gathered = rows.select(df_pv, selected)
+        assert np.all(np.diff(rows.rows(selected)) > 0)
+        assert gathered.equals(df_pv[df_pv['website_session_id'].isin(selected)])
+
+
+@pytest.mark.parametrize("state", STATES)
+def test_indexed_filters_match_masks(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    masked = flt.apply_filters(*frames, filters)
+    indexed = flt.apply_filters(*frames, filters, index=dl.load_indexes(), facts=dl.load_session_facts())
+    _assert_same_tables(indexed, masked, ['sessions', 'orders', 'items', 'pageviews', 'session_facts'])
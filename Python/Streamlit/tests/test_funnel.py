@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import funnel
+
+STAGES = [
+    {'name': 'home', 'exact': ['/home'], 'prefix': ['/lander']},
+    {'name': 'products', 'exact': ['/products'], 'prefix': []},
+    {'name': 'cart', 'exact': ['/cart'], 'prefix': []},
+]
+
+
+def _pageviews(sessions):
+    """A session clustered pageviews frame from {session id: [urls]}."""
+    rows = [(sid, url) for sid, urls in sessions.items() for url in urls]
+    df = pd.DataFrame(rows, columns=['website_session_id', 'pageview_url'])
+    df['pageview_url'] = df['pageview_url'].astype('category')
+    return df
+
+
+def _progress_loop(df_pv, stages):
+    # Per-row scan of the ordered funnel, the reference for funnel.progress
+    reached = {}
+    for session_id, url in zip(df_pv['website_session_id'], df_pv['pageview_url']):
+        k = reached.setdefault(session_id, 0)
+        if k < len(stages) and funnel._stage_of(str(url), stages) == k:
+            reached[session_id] = k + 1
+    return np.array(list(reached.values()))
+
+
+def test_stages_are_reached_in_order():
+    df_pv = _pageviews({
+        1: ['/home', '/products', '/cart'],
+        2: ['/products', '/cart', '/lander-2'],   # stage 2 and 3 before stage 1 don't count
+        3: ['/lander-1', '/cart', '/products'],   # the cart came before the products
+        4: ['/lander-1', '/cart', '/products', '/cart'],
+        5: ['/about'],
+    })
+    assert funnel.progress(df_pv, STAGES).tolist() == [3, 1, 2, 3, 0]
+
+
+def test_sessions_reaching_never_grow():
+    out = funnel.sessions_reaching(np.array([3, 1, 2, 3, 0]), [s['name'] for s in STAGES])
+    assert out['sessions'].tolist() == [4, 3, 2]
+    assert out['funnel_stage'].cat.ordered
+
+
+def test_first_matching_stage_wins():
+    stages = STAGES + [{'name': 'landers', 'exact': [], 'prefix': ['/lander']}]
+    urls = pd.Series(['/lander-3', '/cart', None, '/nowhere'])
+    assert funnel.stage_codes(urls, stages).tolist() == [0, 2, -1, -1]
+    assert funnel.stage_codes(urls.astype('category'), stages).tolist() == [0, 2, -1, -1]
+
+
+def test_progress_matches_the_row_loop(frames):
+    df_pv = frames[4]
+    stages = funnel.load_stages()
+    assert np.array_equal(funnel.progress(df_pv, stages), _progress_loop(df_pv, stages))
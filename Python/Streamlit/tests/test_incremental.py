@@ -0,0 +1,105 @@
+import shutil
+import pandas as pd
+import pytest
+import config
+import data_loader as dl
+import synthetic
+
+CUTOFF = pd.Timestamp("2014-06-01")
+
+
+def _load():
+    frames, _, _ = dl._load_frames(dl._source_fingerprint())
+    return dict(zip(dl.FRAME_NAMES, frames))
+
+
+def _full_rebuild(source_dir, monkeypatch):
+    shutil.rmtree(source_dir / ".snapshot")
+    monkeypatch.setattr(config, "INCREMENTAL_ENABLED", False)
+    return _load()
+
+
+def _no_full_rebuild():
+    raise AssertionError("full rebuild instead of an incremental refresh")
+
+
+def _write_head(source_dir, tables):
+    """Writes the rows created before CUTOFF; returns the rest of every append-only table."""
+    tails = {}
+    for name, file_name in dl.SOURCE_FILES.items():
+        df = tables[name]
+        if name in dl.APPEND_ONLY:
+            early = pd.to_datetime(df["created_at"]) < CUTOFF
+            df, tails[name] = df[early], df[~early]
+        df.to_csv(source_dir / file_name, index=False)
+    return tails
+
+
+def _append(source_dir, tails):
+    for name, df in tails.items():
+        df.to_csv(source_dir / dl.SOURCE_FILES[name], mode="a", header=False, index=False)
+
+
+def _assert_same_frames(actual, expected):
+    for name in dl.FRAME_NAMES:
+        pd.testing.assert_frame_equal(
+            actual[name].reset_index(drop=True), expected[name].reset_index(drop=True),
+            check_categorical=False, obj=name)
+
+
+def test_appended_rows_match_a_full_rebuild(source_dir, monkeypatch):
+    tails = _write_head(source_dir, synthetic.frames())
+    before = _load()
+
+    _append(source_dir, tails)
+    build = dl._build_frames
+    monkeypatch.setattr(dl, "_build_frames", _no_full_rebuild)
+    refreshed = _load()
+    assert len(refreshed["sessions"]) > len(before["sessions"])
+
+    monkeypatch.setattr(dl, "_build_frames", build)
+    _assert_same_frames(refreshed, _full_rebuild(source_dir, monkeypatch))
+
+
+def test_refresh_without_new_rows_keeps_the_frames(dataset, source_dir, monkeypatch):
+    before = _load()
+    (source_dir / dl.SOURCE_FILES["orders"]).touch()
+    monkeypatch.setattr(dl, "_build_frames", _no_full_rebuild)
+    _assert_same_frames(_load(), before)
+
+
+@pytest.mark.parametrize("change", ["edit", "truncate"])
+def test_changed_rows_force_a_full_rebuild(dataset, source_dir, monkeypatch, change):
+    _load()
+    path = source_dir / dl.SOURCE_FILES["orders"]
+    orders = dataset["orders"]
+    if change == "edit":
+        orders = orders.assign(price_usd=orders["price_usd"] + 1)
+    else:
+        orders = orders.iloc[:len(orders) // 2]
+    orders.to_csv(path, index=False)
+
+    rebuilt = []
+    build = dl._build_frames
+    monkeypatch.setattr(dl, "_build_frames", lambda: rebuilt.append(True) or build())
+    frames = _load()
+    assert rebuilt
+    assert len(frames["orders"]) == len(orders)
+
+
+def test_no_watermark_without_a_final_newline(source_dir, monkeypatch):
+    tails = _write_head(source_dir, synthetic.frames())
+    path = source_dir / dl.SOURCE_FILES["orders"]
+    path.write_bytes(path.read_bytes().rstrip(b"\n"))
+    _load()
+
+    # Whatever follows the last row must be read with it, from the start
+    with open(path, "a") as f:
+        f.write("\n")
+    _append(source_dir, tails)
+    rebuilt = []
+    build = dl._build_frames
+    monkeypatch.setattr(dl, "_build_frames", lambda: rebuilt.append(True) or build())
+    frames = _load()
+    assert rebuilt
+    assert len(frames["orders"]) == len(synthetic.frames()["orders"])
@@ -0,0 +1,37 @@
+import lru
+import view_cache
+
+
+def test_entry_count_budget():
+    cache = view_cache.ViewCache(2)
+    for key in 'abc':
+        cache.get_or_compute(key, lambda: key.upper())
+    assert cache.get_or_compute('c', lambda: None) == 'C'
+    assert cache.get_or_compute('a', lambda: 'again') == 'again'
+    cache.add_key_time(0.5)
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['evictions']) == (2, 1, 4, 2)
+    assert stats['key_s'] == 0.5
+
+
+def test_size_function():
+    cache = lru.LRUCache(10, size=len)
+    cache.get_or_compute('a', lambda: [0] * 4)
+    cache.get_or_compute('b', lambda: [0] * 4)
+    cache.get_or_compute('c', lambda: [0] * 4)
+    assert cache.stats()['size'] == 8
+    assert cache.get_or_compute('a', lambda: 'recomputed') == 'recomputed'
+
+
+def test_resize_keeps_the_place():
+    cache = lru.LRUCache(10, size=len)
+    grown = cache.get_or_compute('a', lambda: [0] * 2)
+    cache.get_or_compute('b', lambda: [0] * 2)
+    grown.extend([0] * 5)
+    cache.resize('a')
+    assert cache.stats()['size'] == 9
+    # 'a' is still the oldest use, so it goes first
+    cache.get_or_compute('c', lambda: [0] * 2)
+    assert cache.stats()['size'] == 4
+    cache.resize('a')
+    assert cache.stats()['entries'] == 2
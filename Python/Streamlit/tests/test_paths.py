@@ -0,0 +1,54 @@
+import pandas as pd
+import paths
+from test_funnel import _pageviews
+
+
+def _shift_reference(df_pv):
+    """Steps from the groupby/shift formulation: (from, to) counts."""
+    df = df_pv.assign(url=df_pv['pageview_url'].astype(object))
+    df['prev'] = df.groupby('website_session_id', sort=False)['url'].shift().fillna(paths.ENTRY)
+    df['next'] = df.groupby('website_session_id', sort=False)['url'].shift(-1)
+    is_first = ~df['website_session_id'].duplicated()
+    is_last = ~df['website_session_id'].duplicated(keep='last')
+    steps = df[df['url'].notna() & (is_first | df['prev'].ne(paths.ENTRY))]
+    counts = steps.groupby(['prev', 'url']).size()
+    exits = df[is_last & df['url'].notna()].groupby('url').size()
+    exits.index = pd.MultiIndex.from_arrays([exits.index, [paths.EXIT] * len(exits)])
+    return pd.concat([counts, exits]).to_dict()
+
+
+def test_transitions_of_a_few_sessions():
+    df_pv = _pageviews({
+        1: ['/home', '/products', '/cart'],
+        2: ['/home'],
+        3: ['/lander-1', '/products', '/products'],
+    })
+    matrix = paths.transitions(df_pv)
+    assert matrix.loc[paths.ENTRY, '/home'] == 2
+    assert matrix.loc[paths.ENTRY, '/lander-1'] == 1
+    assert matrix.loc['/home', '/products'] == 1
+    assert matrix.loc['/products', '/products'] == 1
+    assert matrix.loc['/home', paths.EXIT] == 1
+    assert matrix.loc['/cart', paths.EXIT] == 1
+    assert matrix.to_numpy().sum() == len(df_pv) + 3
+
+    flows = paths.page_flows(matrix).set_index('page')
+    assert flows.loc['/products'].tolist() == [3, 0, 1]
+    assert flows.loc['/home'].tolist() == [2, 2, 1]
+
+
+def test_missing_urls_are_left_out():
+    df_pv = _pageviews({1: ['/home', None, '/cart'], 2: ['/home', '/cart']})
+    pairs = paths.transition_pairs(paths.transitions(df_pv))
+    steps = dict(zip(zip(pairs['from_page'], pairs['to_page']), pairs['count']))
+    # The step into the missing page and the one out of it are both dropped
+    assert steps == {(paths.ENTRY, '/home'): 2, ('/home', '/cart'): 1, ('/cart', paths.EXIT): 2}
+
+
+def test_matches_the_shift_formulation(frames):
+    df_pv = frames[4]
+    pairs = paths.transition_pairs(paths.transitions(df_pv))
+    assert dict(zip(zip(pairs['from_page'], pairs['to_page']), pairs['count'])) == _shift_reference(df_pv)
+    flows = paths.page_flows(paths.transitions(df_pv)).set_index('page')
+    visits = df_pv['pageview_url'].astype(object).value_counts()
+    assert flows['visits'].to_dict() == visits.to_dict()
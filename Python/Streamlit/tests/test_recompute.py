@@ -0,0 +1,44 @@
+import dataclasses
+import pytest
+import charts
+import filters as flt
+from views import business, website, marketing, product  # noqa: F401 (register the charts)
+
+
+def _with_results(frames, filters, results):
+    return dataclasses.replace(flt.apply_filters(*frames, filters), results=results)
+
+
+@pytest.fixture
+def recomputed(monkeypatch):
+    """The chart ids charts.compute computes (instead of reusing) from now on."""
+    seen = []
+    compute = charts._compute
+    monkeypatch.setattr(charts, "_compute", lambda chart_id, data: seen.append(chart_id) or compute(chart_id, data))
+    return seen
+
+
+@pytest.mark.parametrize("slicer", ['date', 'utm', 'product'])
+def test_only_charts_of_the_changed_slicer_recompute(frames, recomputed, slicer):
+    df_sess, _, _, df_prods, _ = frames
+    first, last, utm, products = flt.slicer_options(df_sess, df_prods)
+    before = flt.Filters.from_widgets(first, last, utm, products)
+    after = dataclasses.replace(before, **{
+        'date': {'start': before.start + (before.end - before.start) / 2},
+        'utm': {'utm_sources': before.utm_sources[:2]},
+        'product': {'product_ids': before.product_ids[:2]},
+    }[slicer])
+    results = {}
+    data = _with_results(frames, before, results)
+    for chart_id in charts.chart_ids():
+        charts.compute(chart_id, data)
+    assert sorted(recomputed) == charts.chart_ids()
+
+    recomputed.clear()
+    data = _with_results(frames, after, results)
+    expected = [c for c in charts.chart_ids() if charts.DEPENDS.get(c) is None or slicer in charts.DEPENDS[c]]
+    for chart_id in charts.chart_ids():
+        charts.compute(chart_id, data)
+    assert expected and sorted(recomputed) == expected
+    # The reused results are still right for the new selection
+    assert charts.compare(flt.apply_filters(*frames, after), data, charts.chart_ids()) == {}
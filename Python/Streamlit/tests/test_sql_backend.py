@@ -0,0 +1,30 @@
+import gc
+import pytest
+import data_loader as dl
+import filters as flt
+import synthetic
+from views import business, website, marketing, product  # noqa: F401 (register the charts)
+
+duckdb = pytest.importorskip("duckdb")
+import sql_backend  # noqa: E402
+
+
+@pytest.mark.parametrize("state", ['default', 'one month, some sources and products', 'one day',
+                                   'before the data'])
+def test_every_chart_matches_pandas(frames, state):
+    filters = synthetic.filter_states(frames)[state]
+    sql_data = sql_backend.filtered(frames, filters)
+    assert sql_backend.compare(flt.apply_filters(*frames, filters), sql_data) == {}
+    sql_data.close()
+
+
+def test_cursor_closed_with_its_data(frames):
+    filters = synthetic.filter_states(frames)['default']
+    sql_data = sql_backend.filtered(frames, filters)
+    cursor = sql_data.cursor
+    cursor.execute("SELECT count(*) FROM f_sessions").fetchall()
+    del sql_data
+    gc.collect()
+    with pytest.raises(duckdb.Error):
+        cursor.execute("SELECT 1")
+
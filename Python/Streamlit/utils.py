@@ -1,5 +1,123 @@
+import functools
+import logging
+import time
 import streamlit as st
 import plotly.graph_objects as go
+import plotly.io as pio
+import config
+import charts
+import figures
+
+logger = logging.getLogger(__name__)
+
+
+def fragments_active():
+    """True when utils.fragment makes real fragments (see config.FRAGMENTS_ENABLED)."""
+    return config.FRAGMENTS_ENABLED and (hasattr(st, "fragment") or hasattr(st, "experimental_fragment"))
+
+
+def fragment(fn):
+    """Runs `fn` as a Streamlit fragment: a widget inside it reruns only
+    `fn`, not the whole script. Every run is timed (debug log). Without
+    fragment support (older Streamlit, DASHBOARD_FRAGMENTS=0) `fn` runs
+    as part of the full rerun, as before."""
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            logger.debug("%s.%s ran in %.1fms", fn.__module__, fn.__name__, (time.perf_counter() - start) * 1000)
+
+    if not fragments_active():
+        return timed
+    return (getattr(st, "fragment", None) or st.experimental_fragment)(timed)
+
+
+def lazy_tabs(key, sections, data):
+    """Chart groups (`sections`: {tab label: group function}) behind tabs.
+
+    Only the open tab's group runs, so the others are neither computed
+    nor sent; no tab is open at first. Reopening a tab under the same
+    filters reads its numbers from the chart result caches (see
+    charts.compute). With config.LAZY_CHARTS off every group runs.
+    """
+    if not config.LAZY_CHARTS:
+        for show_group in sections.values():
+            show_group(data)
+        return
+    _lazy_tabs(key, sections, data)
+
+
+@fragment
+def _lazy_tabs(key, sections, data):
+    # Switching tabs reruns only this fragment
+    labels = list(sections)
+    if hasattr(st, "segmented_control"):
+        opened = st.segmented_control("More charts", labels, key=key)
+    else:
+        opened = st.radio("More charts", ["Hide"] + labels, horizontal=True, key=key)
+    if opened in sections:
+        sections[opened](data)
+
+
+# figure id -> its cached builder (see figure())
+FIGURES = {}
+
+
+def figure(figure_id, reads=None):
+    """Registers a function building the figure `figure_id` from the
+    filtered data; calling it returns a figures.Spec.
+
+    The finished figure is shared by every session under (dataset
+    version, figure id, backends the charts resolve to, the slicers the
+    charts it reads depend on), so a rerun under the same filters sends it without rebuilding,
+    restyling or slimming it. `reads` lists the chart ids the function
+    computes (default: the figure id). Builders must not call st.*.
+    """
+    chart_ids = tuple(reads or (figure_id,))
+
+    def register(build):
+        @functools.wraps(build)
+        def cached(data):
+            cache = getattr(data, 'figure_cache', None)
+            if cache is None:
+                return figures.spec(build(data))
+            # The backends the charts resolve to (the daily cube or not)
+            key = (data.dataset_version, figure_id, getattr(data, 'backends', (data.backend,)),
+                   data.filters.key(charts.depends_on(chart_ids)))
+            return cache.get_or_compute(key, lambda: figures.spec(build(data)))
+        FIGURES[figure_id] = cached
+        return cached
+    return register
+
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart of a figures.Spec (see figure()), or of a plain
+    figure after figures.slim (point budget, WebGL, trimmed template).
+    With debug logging on, its payload is counted for the page (see
+    report_page_bytes)."""
+    if not isinstance(fig, figures.Spec):
+        fig = figures.Spec(figures.slim(fig), None)
+    if logger.isEnabledFor(logging.DEBUG):
+        sent = st.session_state.setdefault("figure_bytes", {})
+        title = fig.figure.layout.title.text or f"figure {len(sent) + 1}"
+        sent[title] = fig.nbytes if fig.nbytes is not None else figures.payload_bytes(fig.figure)
+    st.plotly_chart(fig.figure, **kwargs)
+
+
+def start_page(page):
+    """Starts the figure byte counts over when another page is opened."""
+    if st.session_state.get("figure_bytes_page") != page:
+        st.session_state["figure_bytes_page"] = page
+        st.session_state["figure_bytes"] = {}
+
+
+def report_page_bytes(page):
+    """Logs the figure bytes sent for `page` since it was opened (debug level)."""
+    sent = st.session_state.get("figure_bytes", {})
+    logger.debug("%s: %d figures, %.1f kB", page, len(sent), sum(sent.values()) / 1024)
+
 
 def load_css():
     # Theme Color: Pinkish Red (#FF2B4A)
@@ -80,15 +198,22 @@ def kpi_card(col, title, value, prefix="", suffix=""):
     </div>
     """, unsafe_allow_html=True)
 
-def style_chart(fig):
-    fig.update_layout(
-        # Updated chart backgrounds to match the new Light theme
-        paper_bgcolor='#FFFFFF', # White background for charts
-        plot_bgcolor='#FFFFFF',
-        font_color='#333333', # Dark text
-        title_font_color='#FF2B4A', # Pinkish Red Chart Titles
-        xaxis=dict(showgrid=False, color='#666666'),
-        yaxis=dict(showgrid=True, gridcolor='#F0F0F0', color='#666666'), # Very subtle grey grid lines
-        margin=dict(l=20, r=20, t=40, b=20)
-    )
-    return fig
\ No newline at end of file
+def users_title(title, data):
+    """`title` of a number built on distinct users, marked when it is an estimate."""
+    return f"{title} (est.)" if data.estimated_users else title
+
+# The chart styling, registered once as a template: the styled figures are
+# built with template="dashboard" instead of updating every layout property
+# of every figure. Plotly Express only sets its own top margin on a figure
+# when the template has none, so the margin lives here too.
+pio.templates["dashboard"] = go.layout.Template(pio.templates["plotly"])
+pio.templates["dashboard"].layout.update(
+    # Updated chart backgrounds to match the new Light theme
+    paper_bgcolor='#FFFFFF', # White background for charts
+    plot_bgcolor='#FFFFFF',
+    font_color='#333333', # Dark text
+    title_font_color='#FF2B4A', # Pinkish Red Chart Titles
+    xaxis=dict(showgrid=False, color='#666666'),
+    yaxis=dict(showgrid=True, gridcolor='#F0F0F0', color='#666666'), # Very subtle grey grid lines
+    margin=dict(l=20, r=20, t=40, b=20),
+)
@@ -0,0 +1,83 @@
+"""Process-wide cache of chart results, keyed by a fingerprint.
+
+st.cache_data would key a chart on the contents of its DataFrame
+arguments, hashing millions of rows on every call. The key here is
+cheap instead:
+
+    (dataset version, chart id, backend, values of the slicers the chart
+     depends on)
+
+The dataset version (data_loader.dataset_version) changes whenever the
+data does, and filters.Filters holds the normalized sidebar selection,
+so equal keys mean equal numbers. charts.aggregation wraps every chart
+building function with this cache when the data carries one (app.py
+attaches it), and the time spent building keys and computing misses is
+counted so the two can be compared (stats(), `python benchmarks.py
+view_cache`).
+
+A second cache of the same kind keeps the finished figures drawn from
+those results (utils.figure, config.FIGURE_CACHE_ENTRIES).
+"""
+import logging
+import streamlit as st
+import config
+import lru
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCache(lru.LRUCache):
+    """lru.LRUCache of at most `max_entries` chart results (or figures),
+    also counting the time spent building their keys."""
+
+    def __init__(self, max_entries):
+        super().__init__(max_entries)
+        self.key_s = 0.0
+
+    def add_key_time(self, seconds):
+        with self._lock:
+            self.key_s += seconds
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['key_s'] = round(self.key_s, 6)
+        return stats
+
+
+@st.cache_resource
+def _cache():
+    return ViewCache(config.VIEW_CACHE_ENTRIES)
+
+
+@st.cache_resource
+def _figure_cache():
+    return ViewCache(config.FIGURE_CACHE_ENTRIES)
+
+
+def shared():
+    """The process-wide cache, or None when it is turned off."""
+    if config.VIEW_CACHE_ENTRIES <= 0:
+        return None
+    return _cache()
+
+
+def shared_figures():
+    """The process-wide cache of finished figures (utils.figure), or None
+    when it is turned off."""
+    if config.FIGURE_CACHE_ENTRIES <= 0:
+        return None
+    return _figure_cache()
+
+
+def stats():
+    """Hit/miss counters and key building vs. computing time of the process-wide cache."""
+    return _cache().stats()
+
+
+def report():
+    """Logs stats() once per rerun (debug level)."""
+    if shared() is not None:
+        logger.debug("View cache: %s", stats())
+    if shared_figures() is not None:
+        logger.debug("Figure cache: %s", _figure_cache().stats())
@@ -3,49 +3,179 @@ import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import utils as ut
+import charts
+import intermediates  # noqa: F401 (registers the shared intermediates)
+
+# --- Aggregations (see charts.py) ---
+
+@charts.aggregation("business.kpis", depends=("date", "utm"))
+def kpis(data):
+    df_sess, df_orders = data.sessions, data.orders
+    return pd.DataFrame([{
+        'revenue': df_orders['revenue'].sum(),
+        'margin': df_orders['margin'].sum(),
+        'orders': df_orders['order_id'].count(),
+        'sessions': df_sess['website_session_id'].count(),
+        'users': df_sess['user_id'].nunique(),
+    }])
+
+@charts.aggregation("business.utm_share", inputs=("orders_with_sessions",), depends=("date", "utm"))
+def utm_share(data, df_m):
+    # Create a combined UTM label (source + campaign + content); df_m is
+    # shared with other charts, so derive the key instead of adding a column
+    utm = (
+        df_m['utm_source'].fillna('Untracked').astype(object) + "\n" +
+        df_m['utm_campaign'].fillna('Untracked').astype(object)
+    ).rename('UTM')
 
-def show(df_sess, df_orders, df_items, df_prods, df_pv):
+    # Aggregate revenue and quantity
+    return df_m.groupby(utm).agg(
+        Revenue=('revenue', 'sum'),
+        Quantity=('items', 'sum')
+    ).reset_index()
+
+@charts.aggregation("business.sessions_by_channel", depends=("date", "utm"))
+def sessions_by_channel(data):
+    return data.sessions.groupby('utm_source', observed=True)['website_session_id'].count().reset_index()
+
+@charts.aggregation("business.sessions_by_campaign", depends=("date", "utm"))
+def sessions_by_campaign(data):
+    return data.sessions.groupby('utm_campaign', observed=True)['website_session_id'].count().reset_index()
+
+@charts.aggregation("business.revenue_trend", depends=("date", "utm"))
+def revenue_trend(data):
+    df_orders = data.orders
+    # df_orders may be shared between sessions, so group by derived keys
+    # instead of adding year/month columns to it
+    order_year = df_orders['created_at'].dt.year.rename('year')
+    order_month = df_orders['created_at'].dt.month.rename('month')
+
+    return df_orders.groupby([order_year, order_month])['revenue'].sum().reset_index()
+
+@charts.aggregation("business.billing_conversion", depends=("date", "utm"))
+def billing_conversion(data):
+    df_pv, df_orders = data.all_pageviews, data.orders
+    billing_pages = df_pv[df_pv['pageview_url'].isin(['/billing', '/billing-2'])].copy()
+
+    # Count unique sessions for each billing page
+    billing_sessions = (
+        billing_pages.groupby('pageview_url', observed=True)['website_session_id']
+        .nunique()
+        .reset_index()
+    )
+
+    billing_sessions.columns = ['billing_page', 'sessions']
+
+    # --- Identify converted sessions (sessions that reached billing and completed an order) ---
+    converted = df_orders[['website_session_id']].drop_duplicates()
+
+    billing_conv = pd.merge(
+        billing_pages[['website_session_id', 'pageview_url']].drop_duplicates(),
+        converted,
+        on='website_session_id',
+        how='inner'
+    )
+
+    billing_conversions = (
+        billing_conv.groupby('pageview_url', observed=True)['website_session_id']
+        .nunique()
+        .reset_index()
+    )
+
+    billing_conversions.columns = ['billing_page', 'conversions']
+
+    # --- Merge sessions + conversions ---
+    billing_final = billing_sessions.merge(billing_conversions, on='billing_page', how='left')
+    billing_final['conversions'] = billing_final['conversions'].fillna(0)
+    return billing_final
+
+@charts.aggregation("business.units_share", inputs=("items_with_products",), depends=("date", "utm", "product"))
+def units_share(data, df_m):
+    # --- Calculate units sold per product ---
+    units = (
+        df_m.groupby('product_name')['order_item_id']
+        .count()
+        .reset_index())
+
+    units.columns = ['product_name', 'units_sold']
+    return units
+
+def show(data):
 
     st.subheader("💼 Business Overview")
 
+    _kpis(data)
+    _utm_share(data)
+    _channel_mix(data)
+    _revenue_trend(data)
+    _billing_and_units(data)
+
+
+def _kpis(data):
     # --- KPIs ---
-    tot_rev =(df_orders['revenue'].sum())/1000000
-    net_profit = (df_orders['margin'].sum())/1000000
-    tot_orders = (df_orders['order_id'].count())/1000
-    
+    k = charts.compute("business.kpis", data).iloc[0]
+    tot_rev = k['revenue']/1000000
+    net_profit = k['margin']/1000000
+    tot_orders = k['orders']/1000
+
     # Calculate YoY (Approximate based on total dataset vs first half)
     # In a real app, this would be dynamic based on date filters
     yoy = 12.5 # Placeholder calculation or dynamic based on date filter
-    
-    avg_sess_user = df_sess.groupby('user_id')['website_session_id'].count().mean()
+
+    avg_sess_user = k['sessions'] / k['users'] if k['users'] else float('nan')
 
     c1, c2, c3, c4, c5 = st.columns(5)
     ut.kpi_card(c1, "Total Revenue", f"{tot_rev:,.2f}", "$","M")
     ut.kpi_card(c2, "Net Profit", f"{net_profit:,.2f}", "$",'M')
     ut.kpi_card(c3, "Total Orders", f"{tot_orders:,.2f}",suffix='K')
     ut.kpi_card(c4, "YoY Growth", f"{yoy}%", "+")
-    ut.kpi_card(c5, "Avg Sess/User", f"{avg_sess_user:.2f}")
+    ut.kpi_card(c5, ut.users_title("Avg Sess/User", data), f"{avg_sess_user:.2f}")
+
 
+def _utm_share(data):
     # --- ROW 1 Charts ---
-    
+
     # 1. Revenue and Quantity Sold (Combo Chart)
-    df_m = df_orders.merge(
-        df_sess[['website_session_id', 'utm_source', 'utm_campaign']],
-        on='website_session_id',
-        how='left'
-    )
+    ut.plotly_chart(utm_share_figure(data), use_container_width=True)
 
-    # Create a combined UTM label (source + campaign + content)
-    df_m['UTM'] = (
-        df_m['utm_source'].fillna('Untracked') + "\n" +
-        df_m['utm_campaign'].fillna('Untracked')
-    )
 
-    # Aggregate revenue and quantity
-    agg = df_m.groupby('UTM').agg(
-    Revenue=('revenue', 'sum'),
-    Quantity=('items', 'sum')
-).sort_values(by='Revenue', ascending=False).reset_index()
+def _channel_mix(data):
+    c_left, c_right = st.columns(2)
+    # 2. Refund Rate by Product
+    with c_left:
+        ut.plotly_chart(channel_figure(data), use_container_width=True)
+
+    with c_right:
+    # 4. Session by Channel
+        ut.plotly_chart(campaign_figure(data), use_container_width=True)
+
+
+def _revenue_trend(data):
+    # --- ROW 2 Charts ---
+
+    # 3. Seasonality by Month ( Line chart of revenue by month )
+    ut.plotly_chart(revenue_trend_figure(data), use_container_width=True)
+
+
+def _billing_and_units(data):
+    # 5. Cross Sell (Products per Order Distribution)
+    # Calculate items per order
+    c_l, c_r = st.columns(2)
+
+    # ---------------- LEFT CHART ----------------
+    with c_l:                   ##billing page conversion rate
+        ut.plotly_chart(billing_figure(data), use_container_width=True)
+
+    # ---------------- RIGHT CHART ----------------
+    with c_r:
+        ut.plotly_chart(units_share_figure(data), use_container_width=True)
+
+
+# --- Figures (cached per filter state, see utils.figure) ---
+
+@ut.figure("business.utm_share")
+def utm_share_figure(data):
+    agg = charts.compute("business.utm_share", data).sort_values(by='Revenue', ascending=False).reset_index(drop=True)
 
     # Convert to percentages
     agg['Revenue_pct'] = agg['Revenue'] / agg['Revenue'].sum() * 100
@@ -72,56 +202,27 @@ def show(df_sess, df_orders, df_items, df_prods, df_pv):
     )
 )
     fig.update_yaxes(tickformat=".2f%")
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
+@ut.figure("business.sessions_by_channel")
+def channel_figure(data):
+    chan_stats = charts.compute("business.sessions_by_channel", data)
+    fig_chan = px.pie(chan_stats, values='website_session_id', names='utm_source', title="Sessions Distribution by Channel", hole=0.4, template="dashboard")
+    return fig_chan
 
-    c_left, c_right = st.columns(2)
-    # 2. Refund Rate by Product
-    with c_left:
-        chan_stats = df_sess.groupby('utm_source')['website_session_id'].count().reset_index()
-        fig_chan = px.pie(chan_stats, values='website_session_id', names='utm_source', title="Sessions Distribution by Channel", hole=0.4)
-        st.plotly_chart(ut.style_chart(fig_chan), use_container_width=True)
-        fig_chan.update_traces(texttemplate="%{percent:.1%}")
-        fig_chan.update_layout(
-        legend=dict(
-        orientation="h",
-        yanchor="top",
-        y=-0.2,
-        xanchor="center",
-        x=0.5
-    )
-)
 
+@ut.figure("business.sessions_by_campaign")
+def campaign_figure(data):
+    chan_stats = charts.compute("business.sessions_by_campaign", data)
+    fig_chan = px.pie(chan_stats, values='website_session_id', names='utm_campaign', title="Sessions Distribution by Campaign", hole=0.4, template="dashboard")
+    return fig_chan
 
 
-    with c_right:
-    # 4. Session by Channel
-        chan_stats = df_sess.groupby('utm_campaign')['website_session_id'].count().reset_index()
-        fig_chan = px.pie(chan_stats, values='website_session_id', names='utm_campaign', title="Sessions Distribution by Campaign", hole=0.4)
-        st.plotly_chart(ut.style_chart(fig_chan), use_container_width=True)
-        fig_chan.update_layout(
-    legend=dict(
-        orientation="h",
-        yanchor="top",
-        y=-0.2,
-        xanchor="center",
-        x=0.5
-    )
-)
-
-    # --- ROW 2 Charts ---
-   
-    
-   
-    # 3. Seasonality by Month ( Line chart of revenue by month )
- 
-
+@ut.figure("business.revenue_trend")
+def revenue_trend_figure(data):
     # Prepare data
-    df_orders['month'] = df_orders['created_at'].dt.month
-    df_orders['year'] = df_orders['created_at'].dt.year
-
-    seasonality = df_orders.groupby(['year', 'month'])['revenue'].sum().reset_index()
+    seasonality = charts.compute("business.revenue_trend", data)
 
     # Create date column
     seasonality['date'] = pd.to_datetime(
@@ -146,59 +247,21 @@ def show(df_sess, df_orders, df_items, df_prods, df_pv):
     tickformat=".1f%",
     title="Revenue (%)"
 )
+    return fig
 
-    st.plotly_chart(fig, use_container_width=True)
-        
 
+@ut.figure("business.billing_conversion")
+def billing_figure(data):
+    billing_final = charts.compute("business.billing_conversion", data)
 
-    # 5. Cross Sell (Products per Order Distribution)
-    # Calculate items per order
-    c_l, c_r = st.columns(2)
+    # Conversion Rate
+    billing_final['conversion_rate'] = (
+        (billing_final['conversions'] / billing_final['sessions']) * 100
+    ).round(2)
 
-    # ---------------- LEFT CHART ----------------
-    with c_l:                   ##billing page conversion rate
 
-        billing_pages = df_pv[df_pv['pageview_url'].isin(['/billing', '/billing-2'])].copy()
-
-        # Count unique sessions for each billing page
-        billing_sessions = (
-            billing_pages.groupby('pageview_url')['website_session_id']
-            .nunique()
-    .reset_index()
-)
-
-        billing_sessions.columns = ['billing_page', 'sessions']
-
-        # --- Identify converted sessions (sessions that reached billing and completed an order) ---
-        converted = df_orders[['website_session_id']].drop_duplicates()
-
-        billing_conv = pd.merge(
-            billing_pages[['website_session_id', 'pageview_url']].drop_duplicates(),
-            converted,
-    on='website_session_id',
-    how='inner'
-)
-
-        billing_conversions = (
-            billing_conv.groupby('pageview_url')['website_session_id']
-            .nunique()
-            .reset_index()
-)
-
-        billing_conversions.columns = ['billing_page', 'conversions']
-
-        # --- Merge sessions + conversions ---
-        billing_final = billing_sessions.merge(billing_conversions, on='billing_page', how='left')
-        billing_final['conversions'] = billing_final['conversions'].fillna(0)
-
-        # Conversion Rate
-        billing_final['conversion_rate'] = (
-            (billing_final['conversions'] / billing_final['sessions']) * 100
-        ).round(2)
-
-
-        # --- Visualization (Bar Chart) ---
-        fig = px.bar(
+    # --- Visualization (Bar Chart) ---
+    fig = px.bar(
     billing_final,
     x='billing_page',
     y='conversion_rate',
@@ -208,50 +271,36 @@ def show(df_sess, df_orders, df_items, df_prods, df_pv):
     color_continuous_scale='Viridis'
 )
 
-        fig.update_layout(
+    fig.update_layout(
     yaxis_title='Conversion Rate (%)',
     xaxis_title='Billing Page')
 
-        fig.update_traces(texttemplate='%{text}%', textposition='auto')
-
-        st.plotly_chart(fig, use_container_width=True)
-
-    # ---------------- RIGHT CHART ----------------
-    with c_r:
-
-        df_m = df_items.merge(df_prods, on='product_id', how='left')
-
-        # If product_name column is missing in df_prods, set a fallback
-        if 'product_name' not in df_m.columns:
-            df_m['product_name'] = 'Product ' + df_m['product_id'].astype(str)
+    fig.update_traces(texttemplate='%{text}%', textposition='auto')
+    return fig
 
-        # --- Calculate units sold per product ---
-        units = (
-            df_m.groupby('product_name')['order_item_id']
-            .count()
-            .reset_index())
 
-        units.columns = ['product_name', 'units_sold']
+@ut.figure("business.units_share")
+def units_share_figure(data):
+    units = charts.compute("business.units_share", data)
 
-        # --- Calculate % distribution ---
-        total_units = units['units_sold'].sum()
-        units['unit_pct'] = ((units['units_sold'] / total_units) * 100).round(2)
-        units.sort_values(by='unit_pct', ascending=False, inplace=True)
+    # --- Calculate % distribution ---
+    total_units = units['units_sold'].sum()
+    units['unit_pct'] = ((units['units_sold'] / total_units) * 100).round(2)
+    units.sort_values(by='unit_pct', ascending=False, inplace=True)
 
-        # --- Plot ---
-        fig = px.bar(
+    # --- Plot ---
+    fig = px.bar(
     units,
     x='product_name',
     y='unit_pct',
     text='unit_pct',
     title='Units Sold Distribution in % by Product')
 
-        fig.update_traces(
+    fig.update_traces(
     texttemplate='%{text}%',
     textposition='auto')
 
-        fig.update_layout(
+    fig.update_layout(
     xaxis_title="Products Name",
     yaxis_title="Share of Units Sold (%)")
-
-        st.plotly_chart(fig, use_container_width=True)
+    return fig
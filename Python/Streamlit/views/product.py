@@ -1,30 +1,140 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import utils as ut
-from itertools import combinations
-from collections import Counter
+import charts
+import cooccurrence
+import intermediates  # noqa: F401 (registers the shared intermediates)
+
+# --- Aggregations (see charts.py) ---
+
+@charts.aggregation("product.kpis", inputs=("items_with_products",), depends=("date", "utm", "product"))
+def kpis(data, df_m):
+    return pd.DataFrame([{
+        'units': df_m['order_item_id'].count(),
+        'revenue': df_m['price_usd'].sum(),
+        'refunds': df_m['is_refunded'].sum(),
+    }])
+
+@charts.aggregation("product.revenue_by_product", inputs=("items_with_products",), depends=("date", "utm", "product"))
+def revenue_by_product(data, df_m):
+    return (df_m.groupby('product_name')['price_usd'].sum().reset_index())
+
+@charts.aggregation("product.refunds_by_product", inputs=("items_with_products",), depends=("date", "utm", "product"))
+def refunds_by_product(data, df_m):
+    return df_m.groupby('product_name').agg(
+        Sold=('order_item_id', 'count'),
+        Refunded=('is_refunded', 'sum')
+    ).reset_index()
+
+@charts.aggregation("product.monthly_sales", inputs=("items_with_products",), depends=("date", "utm", "product"))
+def monthly_sales(data, df_m):
+    # df_m is shared with other charts: derive the month key, don't add a column
+    month = df_m['created_at'].dt.to_period('M').astype(str).rename('month')
+    return (df_m.groupby([month, df_m['product_name']])['price_usd'].sum().reset_index())
+
+@charts.aggregation("product.items_per_order", depends=("date", "utm", "product"))
+def items_per_order(data):
+    ppo = data.items.groupby('order_id')['order_item_id'].count().value_counts().sort_index().reset_index()
+    ppo.columns = ['Items in Cart', 'Order Count']
+    return ppo
+
+@charts.aggregation("product.page_cvr", depends=("date", "utm"))
+def page_cvr(data):
+    df_pv, df_o = data.all_pageviews, data.orders
+
+    prod_pages = [
+        '/the-original-mr-fuzzy',
+        '/the-forever-love-bear',
+        '/the-birthday-sugar-panda',
+        '/the-hudson-river-mini-bear'
+    ]
 
-def show(df_oi, df_p,df_pv,df_o,df_s):
+# Filter pageviews for only these product pages
+    pv_prod = df_pv[df_pv['pageview_url'].isin(prod_pages)]
+
+# Unique sessions visiting each product page
+    page_sessions = (pv_prod.groupby('pageview_url', observed=True)['website_session_id']
+                  .nunique()
+                  .reset_index(name='sessions'))
+
+# Unique converted sessions
+    order_sessions = df_o['website_session_id'].unique()
+    pv_prod['is_converted'] = pv_prod['website_session_id'].isin(order_sessions).astype(int)
+
+# Count conversions per product page
+    page_conversions = (pv_prod.groupby('pageview_url', observed=True)['is_converted']
+                    .sum()
+                    .reset_index(name='orders'))
+
+# Merge sessions + conversions
+    return page_sessions.merge(page_conversions, on='pageview_url', how='left')
+
+@charts.intermediate("cross_sell_pairs")
+def cross_sell_pairs(data):
+    # Pair counts over the filtered orders' items (items follow the orders);
+    # a selection keeping every item reads the ones counted at load
+    engine = data.cooccurrence
+    if engine is None:
+        engine = cooccurrence.CoOccurrence.of(data.items)
+    names = data.products.set_index('product_id')['product_name']
+    return engine, names
+
+@charts.aggregation("product.cross_sell", inputs=("cross_sell_pairs",), depends=("date", "utm", "product"))
+def cross_sell(data, pairs):
+    engine, names = pairs
+    pairs = engine.pairs()
+    a = names.reindex(pairs['product_a']).to_numpy(dtype=object)
+    b = names.reindex(pairs['product_b']).to_numpy(dtype=object)
+    # Label every pair in name order, so it is always counted under the same label
+    first, second = np.where(a < b, a, b), np.where(a < b, b, a)
+    return pd.DataFrame({
+        'product_pair': pd.Series(first, dtype=object) + "+" + pd.Series(second, dtype=object),
+        'count': pairs['count'].to_numpy(),
+    })
+
+@charts.aggregation("product.cross_sell_rules", inputs=("cross_sell_pairs",), depends=("date", "utm", "product"))
+def cross_sell_rules(data, pairs):
+    engine, names = pairs
+    rules = engine.rules()
+    rules['antecedent'] = names.reindex(rules['antecedent']).to_numpy()
+    rules['consequent'] = names.reindex(rules['consequent']).to_numpy()
+    return rules
+
+@charts.aggregation("product.device_units", inputs=("orders_with_sessions", "items_with_products"), depends=("date", "utm", "product"))
+def device_units(data, orders_sessions, items_products):
+# Items (with product names) joined to the device of their order's session
+    order_items_full = items_products.merge(
+    orders_sessions[['order_id', 'device_type']],
+    on='order_id',
+    how='inner'
+)
+
+# Step 4: Calculate quantity sold by product × device
+    return (
+    order_items_full.groupby(['product_name', 'device_type'], observed=True)['order_item_id']
+    .count()
+    .reset_index(name='units_sold')
+)
+
+def show(data):
     st.subheader("🧸 Product Dashboard")
 
-    # --- CRITICAL FIX: Handle Duplicate Column Names ---
-    # Both df_oi and df_p have a 'created_at' column.
-    # We use suffixes=('', '_product') to keep the sales date as 'created_at'
-    # and rename the product launch date to 'created_at_product'.
-    df_m = df_oi.merge(
-        df_p, 
-        on='product_id', 
-        how='left', 
-        suffixes=('', '_product')
-    )
-
-    # Fallback for product name
-    if 'product_name' not in df_m.columns:
-        df_m['product_name'] = 'Prod ' + df_m['product_id'].astype(str)
-    
+    # The heavier groups are only computed when their tab is opened
+    _kpis(data)
+    _revenue_and_refunds(data)
+    ut.lazy_tabs("product_tabs", {
+        "Monthly sales": _monthly_sales,
+        "Cart size & page CVR": _orders_and_pages,
+        "Cross-sell": _cross_sell,
+        "Units by device": _device_units,
+    }, data)
+
+
+def _kpis(data):
     ##top product sold
-    prod_rev = (df_m.groupby('product_name')['price_usd'].sum().reset_index())
+    prod_rev = charts.compute("product.revenue_by_product", data)
 
 
     top_product = prod_rev.sort_values(by='price_usd', ascending=False).iloc[0]
@@ -36,10 +146,11 @@ def show(df_oi, df_p,df_pv,df_o,df_s):
 
 
     # --- 1. KPIs ---
-    total_sold = df_m['order_item_id'].count()
-    total_rev = df_m['price_usd'].sum()
-    avg_price = df_m['price_usd'].mean()
-    total_refunds = df_m['is_refunded'].sum()
+    k = charts.compute("product.kpis", data).iloc[0]
+    total_sold = k['units']
+    total_rev = k['revenue']
+    avg_price = total_rev / total_sold if total_sold > 0 else float('nan')
+    total_refunds = k['refunds']
     refund_rate = total_refunds / total_sold if total_sold > 0 else 0
 
     c1, c2, c3, c4, c5 = st.columns(5)
@@ -49,173 +160,167 @@ def show(df_oi, df_p,df_pv,df_o,df_s):
     ut.kpi_card(c4, "Total Item Refunds", f"{total_refunds/1000:,.2f}K")
     ut.kpi_card(c5, "Refund Rate", f"{refund_rate:.2%}")
 
+
+def _revenue_and_refunds(data):
     # --- 2. Charts ---
     c_left, c_right = st.columns(2)
 
     with c_left:
-        prod_rev = (df_m.groupby('product_name')['price_usd'].sum().reset_index())
-        prod_rev['revenue_pct'] = (prod_rev['price_usd'] / prod_rev['price_usd'].sum() * 100).round(2)
-        prod_rev.sort_values(by='revenue_pct', ascending=False, inplace=True)
-
-        fig_sales = px.bar(
-            prod_rev,
-            x='product_name',
-            y='revenue_pct',
-            title="Revenue Distribution by Product (%)",
-            text='revenue_pct',
-            labels={'revenue_pct': 'Revenue (%)', 'product_name': 'Product'},
-            color='revenue_pct',
-            color_continuous_scale='Viridis')
-    
-
-        fig_sales.update_traces(texttemplate='%{text}%', textposition='auto')
-        fig_sales.update_layout(yaxis_tickformat='.2f')
-
-        st.plotly_chart(ut.style_chart(fig_sales), use_container_width=True)
+        ut.plotly_chart(revenue_share_figure(data), use_container_width=True)
 
     with c_right:
         # Refund Rate by Product
-        prod_ref = df_m.groupby('product_name').agg(
-            Sold=('order_item_id', 'count'),
-            Refunded=('is_refunded', 'sum')
-        ).reset_index()
-        prod_ref['Rate'] = prod_ref['Refunded'] / prod_ref['Sold']
-        prod_ref.sort_values(by='Rate', ascending=False, inplace=True)
-        
-        fig_ref = px.bar(prod_ref, x='product_name', y='Rate', title="Refund Rate by Product", 
-                         text_auto='.1%', color='Rate', color_continuous_scale='Redor')
-        st.plotly_chart(ut.style_chart(fig_ref), use_container_width=True)
+        ut.plotly_chart(refund_rate_figure(data), use_container_width=True)
 
 
+def _monthly_sales(data):
+####monthly sales trend####
+    ut.plotly_chart(monthly_sales_figure(data), use_container_width=True)
 
 
-####monthly sales trend####
+def _orders_and_pages(data):
+    # Row 2
 
-    df_m['month'] = df_m['created_at'].dt.to_period('M').astype(str)
-    trend = (df_m.groupby(['month','product_name'])['price_usd'].sum().reset_index())
-    trend['sales_in_thousands'] = (trend['price_usd'].round(2)/1000).round(2)
+    c_left, c_right = st.columns(2)
+    with c_left:
+    # Cross Sell (Items per Order)
+        ut.plotly_chart(items_per_order_figure(data), use_container_width=True)
 
-    fig_trend = px.line(
-    trend,
-    x='month',
-    y='sales_in_thousands',
-    color='product_name',
-    title="Monthly Sales Trend by Product",
-    markers=True)
-    fig_trend.update_layout(legend=dict(orientation='h', x=0, y=-0.3))
+    with c_right:
+        ut.plotly_chart(page_cvr_figure(data), use_container_width=True)
 
-    st.plotly_chart(ut.style_chart(fig_trend), use_container_width=True)
 
+def _cross_sell(data):
+##cross selling##
+    ut.plotly_chart(cross_sell_figure(data), use_container_width=True)
 
 
-    # Row 2
+def _device_units(data):
+    #quantity sold distribution by device
+    ut.plotly_chart(device_units_figure(data), use_container_width=True)
 
-    c_left, c_right = st.columns(2)
-    with c_left:
-    # Cross Sell (Items per Order)
-        ppo = df_oi.groupby('order_id')['order_item_id'].count().value_counts().sort_index().reset_index()
-        ppo.columns = ['Items in Cart', 'Order Count']
 
-    # Convert to % of total orders
-        total_orders = ppo['Order Count'].sum()
-        ppo['Order %'] = (ppo['Order Count'] / total_orders) * 100
+# --- Figures (cached per filter state, see utils.figure) ---
 
-    # Plot
-        fig_cross = px.bar(
-        ppo,
-        x='Items in Cart',
-        y='Order %',
-        title="Items in Cart Distribution by Orders (Percentage)",
-        text_auto='.2f'
-    )
+@ut.figure("product.revenue_by_product")
+def revenue_share_figure(data):
+    prod_rev = charts.compute("product.revenue_by_product", data)
+    prod_rev['revenue_pct'] = (prod_rev['price_usd'] / prod_rev['price_usd'].sum() * 100).round(2)
+    prod_rev.sort_values(by='revenue_pct', ascending=False, inplace=True)
 
-        fig_cross.update_traces(marker_color='green', textposition='auto')
+    fig_sales = px.bar(
+        prod_rev,
+        x='product_name',
+        y='revenue_pct',
+        title="Revenue Distribution by Product (%)",
+        text='revenue_pct',
+        labels={'revenue_pct': 'Revenue (%)', 'product_name': 'Product'},
+        color='revenue_pct',
+        color_continuous_scale='Viridis',
+        template="dashboard")
 
-        fig_cross.update_layout(
-        yaxis_title="Percentage (%)"
-    )
 
-        st.plotly_chart(ut.style_chart(fig_cross), use_container_width=True)
+    fig_sales.update_traces(texttemplate='%{text}%', textposition='auto')
+    fig_sales.update_layout(yaxis_tickformat='.2f')
+    return fig_sales
 
 
-    with c_right:
+@ut.figure("product.refunds_by_product")
+def refund_rate_figure(data):
+    prod_ref = charts.compute("product.refunds_by_product", data)
+    prod_ref['Rate'] = prod_ref['Refunded'] / prod_ref['Sold']
+    prod_ref.sort_values(by='Rate', ascending=False, inplace=True)
 
-        prod_pages = [
-            '/the-original-mr-fuzzy',
-            '/the-forever-love-bear',
-            '/the-birthday-sugar-panda',
-            '/the-hudson-river-mini-bear'
-        ]
+    fig_ref = px.bar(prod_ref, x='product_name', y='Rate', title="Refund Rate by Product",
+                     text_auto='.1%', color='Rate', color_continuous_scale='Redor',
+                     template="dashboard")
+    return fig_ref
 
-# Filter pageviews for only these product pages
-        pv_prod = df_pv[df_pv['pageview_url'].isin(prod_pages)]
 
-# Unique sessions visiting each product page
-        page_sessions = (pv_prod.groupby('pageview_url')['website_session_id']
-                      .nunique()
-                      .reset_index(name='sessions'))
+@ut.figure("product.monthly_sales")
+def monthly_sales_figure(data):
+    trend = charts.compute("product.monthly_sales", data)
+    trend['sales_in_thousands'] = (trend['price_usd'].round(2)/1000).round(2)
 
-# Unique converted sessions
-        order_sessions = df_o['website_session_id'].unique()
-        pv_prod['is_converted'] = pv_prod['website_session_id'].isin(order_sessions).astype(int)
+    fig_trend = px.line(
+    trend,
+    x='month',
+    y='sales_in_thousands',
+    color='product_name',
+    title="Monthly Sales Trend by Product",
+    markers=True,
+    template="dashboard")
+    fig_trend.update_layout(legend=dict(orientation='h', x=0, y=-0.3))
+    return fig_trend
 
-# Count conversions per product page
-        page_conversions = (pv_prod.groupby('pageview_url')['is_converted']
-                        .sum()
-                        .reset_index(name='orders'))
 
-# Merge sessions + conversions + CVR
-        cvr_df = page_sessions.merge(page_conversions, on='pageview_url', how='left')
-        cvr_df['cvr'] = (cvr_df['orders'] / cvr_df['sessions'] * 100).round(2)
-        cvr_df.sort_values(by='cvr', ascending=False, inplace=True)
+@ut.figure("product.items_per_order")
+def items_per_order_figure(data):
+    ppo = charts.compute("product.items_per_order", data)
 
-# Gradient color column chart
-        fig = px.bar(
-        cvr_df,
-        x='pageview_url',
-        y='cvr',
-        text='cvr',
-        color='cvr',                         # gradient
-        color_continuous_scale='Viridis',    # choose any: Viridis, Plasma, Magma
-        title="Conversion Rate by Product Page (%)",
-        labels={'pageview_url': 'Product Page', 'cvr': 'CVR (%)'}
-)
+# Convert to % of total orders
+    total_orders = ppo['Order Count'].sum()
+    ppo['Order %'] = (ppo['Order Count'] / total_orders) * 100
 
-        fig.update_traces(texttemplate='%{text}%', textposition='auto')
-        fig.update_layout(coloraxis_showscale=False)   # remove side color bar
+# Plot
+    fig_cross = px.bar(
+    ppo,
+    x='Items in Cart',
+    y='Order %',
+    title="Items in Cart Distribution by Orders (Percentage)",
+    text_auto='.2f',
+    template="dashboard"
+)
 
-        st.plotly_chart(ut.style_chart(fig), use_container_width=True)
+    fig_cross.update_traces(marker_color='green', textposition='auto')
 
+    fig_cross.update_layout(
+    yaxis_title="Percentage (%)"
+)
+    return fig_cross
 
 
-##cross selling##
-    # Step 1: Prepare Data
-    orders_data=df_o.copy()
-    orders_data['created_at']=pd.to_datetime(orders_data['created_at'])
-    orders_items_data=pd.merge(orders_data, df_oi, on='order_id', how='inner',suffixes=('_orders','_order_items'))
-    products_data=df_p[['product_id','product_name']]
-    orders_items_products=pd.merge(orders_items_data, products_data, on='product_id', how='inner')
-    orders_items_products=orders_items_products[orders_items_products.items_purchased>1]
+@ut.figure("product.page_cvr")
+def page_cvr_figure(data):
+    cvr_df = charts.compute("product.page_cvr", data)
 
-    order_products=orders_items_products.groupby('order_id')['product_name'].apply(list)
+# CVR
+    cvr_df['cvr'] = (cvr_df['orders'] / cvr_df['sessions'] * 100).round(2)
+    cvr_df.sort_values(by='cvr', ascending=False, inplace=True)
 
+# Gradient color column chart
+    fig = px.bar(
+    cvr_df,
+    x='pageview_url',
+    y='cvr',
+    text='cvr',
+    color='cvr',                         # gradient
+    color_continuous_scale='Viridis',    # choose any: Viridis, Plasma, Magma
+    title="Conversion Rate by Product Page (%)",
+    labels={'pageview_url': 'Product Page', 'cvr': 'CVR (%)'},
+    template="dashboard"
+)
 
-    pairs = []
-    for products in order_products:
-        products = list(set(products))  # avoid duplicate items within same order
-        if len(products) > 1:
-            pairs += list(combinations(products, 2))
+    fig.update_traces(texttemplate='%{text}%', textposition='auto')
+    fig.update_layout(coloraxis_showscale=False)   # remove side color bar
+    return fig
 
-    # Step 3: count most common pairs
-    cross_sell_counts = Counter(pairs)
 
-    # Step 4: create a DataFrame for better viewing
-    cross_sell_df = pd.DataFrame(cross_sell_counts.items(), columns=['product_pair', 'count'])
+@ut.figure("product.cross_sell", reads=("product.cross_sell", "product.cross_sell_rules"))
+def cross_sell_figure(data):
+    cross_sell_df = charts.compute("product.cross_sell", data)
     cross_sell_df = cross_sell_df.sort_values(by='count', ascending=False).reset_index(drop=True)
-
-    cross_sell_df['product_pair']=cross_sell_df['product_pair'].apply(lambda x: x[0]+ "+" +x[1])
     cross_sell_df['count_pct']=round(cross_sell_df['count']/cross_sell_df['count'].sum()*100,2)
 
+    # Lift of every pair (same both ways), shown on hover
+    rules = charts.compute("product.cross_sell_rules", data)
+    rules = rules[rules['antecedent'].astype(str) < rules['consequent'].astype(str)]
+    lift = pd.DataFrame({
+        'product_pair': rules['antecedent'].astype(str) + "+" + rules['consequent'].astype(str),
+        'lift': rules['lift'].round(2),
+    })
+    cross_sell_df = cross_sell_df.merge(lift, on='product_pair', how='left')
+
 # Step 4: Gradient Column Chart
     fig_cross = px.bar(
     cross_sell_df,
@@ -223,9 +328,11 @@ def show(df_oi, df_p,df_pv,df_o,df_s):
     y='count_pct',
     title="Cross-Sell Product Pairs (%)",
     text='count_pct',
-    labels={'product_pair': 'Product Pair', 'count_pct': 'Percentage (%)'},
+    labels={'product_pair': 'Product Pair', 'count_pct': 'Percentage (%)', 'lift': 'Lift'},
+    hover_data=['count', 'lift'],
     color='count_pct',
-    color_continuous_scale='Viridis'
+    color_continuous_scale='Viridis',
+    template="dashboard"
 )
 
     fig_cross.update_traces(texttemplate='%{text}%', textposition='auto')
@@ -235,42 +342,12 @@ def show(df_oi, df_p,df_pv,df_o,df_s):
     xaxis_title='Product Pair',
     coloraxis_showscale=False,xaxis_tickangle=20
 )
+    return fig_cross
 
-    st.plotly_chart(ut.style_chart(fig_cross), use_container_width=True)
-
-
-
-    #quantity sold distribution by device 
-
-
-
-
-    orders_sessions = df_o.merge(
-    df_s[['website_session_id', 'device_type']],
-    on='website_session_id',
-    how='left'
-)
-
-# Step 2: Join with order_items to get product-level quantities
-    order_items_full = orders_sessions.merge(
-    df_oi,
-    on='order_id',
-    how='inner'
-)
-
-# Step 3: Join with product master to bring product names
-    order_items_full = order_items_full.merge(
-    df_p[['product_id', 'product_name']],
-    on='product_id',
-    how='left'
-)
 
-# Step 4: Calculate quantity sold by product × device
-    qty_dist = (
-    order_items_full.groupby(['product_name', 'device_type'])['order_item_id']
-    .count()
-    .reset_index(name='units_sold')
-)
+@ut.figure("product.device_units")
+def device_units_figure(data):
+    qty_dist = charts.compute("product.device_units", data)
 
 # Step 5: Convert to % distribution within each product
     qty_dist['pct'] =((qty_dist['units_sold']/qty_dist['units_sold'].sum())*100).round(2)
@@ -288,10 +365,10 @@ def show(df_oi, df_p,df_pv,df_o,df_s):
         'pct': 'Share (%)',
         'product_name': 'Product',
         'device_type': 'Device Type'
-    }
+    },
+    template="dashboard"
 )
 
     fig.update_traces(textposition='auto',texttemplate='%{text}%')
     fig.update_layout(xaxis_tickangle=0)
-
-    st.plotly_chart(ut.style_chart(fig), use_container_width=True)
\ No newline at end of file
+    return fig
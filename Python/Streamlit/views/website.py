@@ -3,42 +3,158 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import utils as ut
+import charts
+import intermediates  # noqa: F401 (registers the shared intermediates)
+import funnel
+import paths
 
-def show(df_s, df_o, df_pv):
+# --- Aggregations (see charts.py) ---
+
+@charts.aggregation("website.kpis", depends=("date", "utm"))
+def kpis(data):
+    df_s, df_o, facts = data.sessions, data.orders, data.session_facts
+
+    # --- Merge for Metrics ---
+    sess_data = df_s.merge(df_o[['website_session_id', 'revenue']], on='website_session_id', how='left')
+    sess_data['revenue'] = sess_data['revenue'].fillna(0)
+
+    return pd.DataFrame([{
+        'sessions': df_s['website_session_id'].count(),
+        # Sessions with only 1 pageview
+        'bounces': facts['is_bounce'].sum(),
+        'order_sessions': df_o['website_session_id'].nunique(),
+        'pageviews': facts['pv_count'].sum(),
+        'revenue': sess_data['revenue'].sum(),
+    }])
+
+@charts.aggregation("website.monthly_sessions", depends=("date", "utm"))
+def monthly_sessions(data):
+    df_s = data.sessions
+    # df_s may be shared between sessions: derive the keys, don't add columns
+    sess_year = df_s['created_at'].dt.year.rename('year')
+    sess_month = df_s['created_at'].dt.month.rename('month')
+
+    # Group sessions by month-year
+    return df_s.groupby([sess_year, sess_month])['website_session_id'].count().reset_index()
+
+@charts.aggregation("website.device", inputs=("orders_with_sessions",), depends=("date", "utm"))
+def device(data, conv_stats):
+    df_s = data.sessions
+
+    # Total sessions by device
+    device_stats = df_s.groupby('device_type', observed=True)['website_session_id'].count().reset_index()
+    device_stats.columns = ['Device', 'Sessions']
+
+    # Conversion rate by device (conv_stats: orders with their session's device)
+    conv_stats = conv_stats.groupby('device_type', observed=True)['website_session_id'].count().reset_index()
+    conv_stats.columns = ['Device', 'Conversions']
+
+    # Merge both
+    return device_stats.merge(conv_stats, on='Device').reset_index(drop=True)
+
+@charts.aggregation("website.funnel", depends=("date", "utm"))
+def funnel_sessions(data):
+    # Stage each session reached in order (session facts, see funnel.py)
+    stage = data.session_facts["funnel_stage"]
+    return funnel.sessions_reaching(stage.cat.codes.to_numpy() + 1, stage.cat.categories)
+
+@charts.aggregation("website.landing_pages", inputs=("landing_pages",), depends=("date", "utm"))
+def landing_pages(data, df_lp):
+    df_lp = df_lp[["website_session_id", "landing_page"]]
+    lp_sessions = df_lp.groupby("landing_page", observed=True)["website_session_id"].count().reset_index()
+    lp_sessions.columns = ["Landing Page", "Sessions"]
+
+    conv = df_lp.merge(data.orders, on="website_session_id", how="inner")
+    lp_conv = conv.groupby("landing_page", observed=True)["website_session_id"].count().reset_index()
+    lp_conv.columns = ["Landing Page", "Conversions"]
+    return lp_sessions.merge(lp_conv, on="Landing Page")
+
+@charts.aggregation("website.landing_bounce", inputs=("landing_pages",), depends=("date", "utm"))
+def landing_bounce(data, df_lp):
+    # df_lp: landing page and bounce flag (1 pageview) per session
+
+    # Bounce rate per landing page
+    return df_lp.groupby("landing_page", observed=True).agg(
+        Sessions=("website_session_id", "count"),
+        Bounces=("is_bounce", "sum")
+    ).reset_index()
+
+@charts.aggregation("website.top_pages", depends=("date", "utm"))
+def top_pages(data):
+    # Count pageviews per page
+    page_stats = (
+    data.pageviews['pageview_url']
+    .value_counts()
+    .reset_index()
+)
+
+    page_stats.columns = ['page', 'visits']
+    # pageview_url is categorical, value_counts also lists pages with no visits
+    return page_stats[page_stats['visits'] > 0]
+
+@charts.aggregation("website.exit_rate", inputs=("page_transitions",), depends=("date", "utm"))
+def exit_rate(data, matrix):
+    # A pageview counts as an exit when it is the session's last pageview
+    flows = paths.page_flows(matrix)
+    return flows.rename(columns={'visits': 'total_visits', 'exits': 'exit_count'})[
+        ['page', 'total_visits', 'exit_count']]
+
+@charts.aggregation("website.page_transitions", inputs=("page_transitions",), depends=("date", "utm"))
+def page_transitions(data, matrix):
+    # Page -> next page counts, session entries and exits included
+    return paths.transition_pairs(matrix)
+
+@charts.aggregation("website.bounce_trend", inputs=("session_months",), depends=("date", "utm"))
+def bounce_trend(data, year_month):
+# Bounce flag per session (exactly 1 pageview)
+    is_bounced = data.session_facts['is_bounce']
+
+# Sessions and bounces by Year-Month
+    return is_bounced.groupby(year_month).agg(sessions='count', bounces='sum').reset_index()
+
+def show(data):
     st.subheader("🌐 Website Performance Dashboard")
 
-    if df_pv.empty:
+    k = charts.compute("website.kpis", data).iloc[0]
+    if k['pageviews'] == 0:
         st.warning("No pageview data available.")
         return
 
+    # The heavier groups are only computed when their tab is opened
+    _kpis(data)
+    _sessions_trend(data)
+    _device_and_funnel(data)
+    ut.lazy_tabs("website_tabs", {
+        "Landing pages": _landing_pages,
+        "Top pages": _top_pages,
+        "Exit rate": _exit_rate,
+        "Page paths": _page_paths,
+        "Bounce trend": _bounce_trend,
+    }, data)
+
+
+def _kpis(data):
+    k = charts.compute("website.kpis", data).iloc[0]
     # ==============================================================================
     # 1. LOGIC & DATA PROCESSING
     # ==============================================================================
-    
-    # --- Merge for Metrics ---
-    sess_data = df_s.merge(df_o[['website_session_id', 'revenue']], on='website_session_id', how='left')
-    sess_data['is_converted'] = sess_data['revenue'].notnull()
-    sess_data['revenue'] = sess_data['revenue'].fillna(0)
 
     # --- KPI Calculations ---
-    
+
     # 1. Total Sessions
-    total_sessions = df_s['website_session_id'].count()
-    
+    total_sessions = k['sessions']
+
     # 2. Bounce Rate (Sessions with only 1 pageview)
-    pv_counts = df_pv.groupby('website_session_id').size()
-    bounces = pv_counts[pv_counts == 1].count()
-    bounce_rate = bounces / total_sessions if total_sessions > 0 else 0
-    
+    bounce_rate = k['bounces'] / total_sessions if total_sessions > 0 else 0
+
     # 3. Conversion Rate
-    total_orders = df_o['website_session_id'].nunique()
-    cvr = total_orders / total_sessions if total_sessions > 0 else 0
-    
+    cvr = k['order_sessions'] / total_sessions if total_sessions > 0 else 0
+
     # 4. Avg Pages per Session (Engagement)
-    avg_pages = len(df_pv) / total_sessions if total_sessions > 0 else 0
-    
+    avg_pages = k['pageviews'] / total_sessions if total_sessions > 0 else 0
+
     # 5. Revenue per Session
-    rps = sess_data['revenue'].sum() / total_sessions if total_sessions > 0 else 0
+    rps = k['revenue'] / total_sessions if total_sessions > 0 else 0
 
     # ==============================================================================
     # 2. KPI CARDS (Row 1)
@@ -51,173 +167,148 @@ def show(df_s, df_o, df_pv):
     ut.kpi_card(c5, "Rev / Session", f"{rps:.2f}", "$")
 
 
-   
-    
-  
+def _sessions_trend(data):
         # CHART 1: Daily Traffic Trend (Area Chart)
-       
-    df_s['year'] = df_s['created_at'].dt.year
-    df_s['month'] = df_s['created_at'].dt.month
-
-    # Group sessions by month-year
-    monthly_sess = df_s.groupby(['year', 'month'])['website_session_id'].count().reset_index()
-    monthly_sess['year_month'] = monthly_sess['year'].astype(str) + "-" + monthly_sess['month'].astype(str)
+    ut.plotly_chart(sessions_trend_figure(data), use_container_width=True)
 
-    # Convert to percentage of total sessions
-    total_sessions = monthly_sess['website_session_id'].sum()
-    monthly_sess['Sessions_pct'] = ((monthly_sess['website_session_id'] / total_sessions) * 100).round(2)
 
-    # Plot
-    fig_sess_pct = px.line(
-    monthly_sess,
-    x='year_month',
-    y='Sessions_pct',
-    markers=True,
-    title="Sessions Trends Over Time"
-)
+def _device_and_funnel(data):
+        # CHART 2: Device Breakdown (Donut Chart)
+    c1,c2=st.columns(2)
+    with c1:
+      ut.plotly_chart(device_figure(data), use_container_width=True)
 
-    # Y axis in %
-    fig_sess_pct.update_yaxes(ticksuffix="%")
+    # conversion funnel
 
-    st.plotly_chart(ut.style_chart(fig_sess_pct), use_container_width=True)
+    with c2:
+        ut.plotly_chart(funnel_figure(data), use_container_width=True)
 
-    
 
+def _landing_pages(data):
+#####landing page performance
+    c3,c4=st.columns(2)
+    # with c_right:
+    with c3:
+       ut.plotly_chart(landing_pages_figure(data), use_container_width=True)
 
+######bounce rate
+    with c4:
+       ut.plotly_chart(landing_bounce_figure(data), use_container_width=True)
 
 
+def _top_pages(data):
+    # --- top website pages ---
+    # CHART 5:
+    ut.plotly_chart(top_pages_figure(data), use_container_width=True)
 
 
+def _exit_rate(data):
+####exit rate of website pages
+    ut.plotly_chart(exit_rate_figure(data), use_container_width=True)
 
-        # CHART 2: Device Breakdown (Donut Chart)
-    c1,c2=st.columns(2)
-    with c1:
-     
 
-    # Total sessions by device
-      device_stats = df_s.groupby('device_type')['website_session_id'].count().reset_index()
-      device_stats.columns = ['Device', 'Sessions']
+def _page_paths(data):
+####page paths (page -> next page)
+    ut.plotly_chart(page_paths_figure(data), use_container_width=True)
 
-    # Conversion mapping
-      conv_stats = pd.merge(df_s, df_o, on='website_session_id', how='inner')
-    
-    # Conversion rate by device
-      conv_stats = conv_stats.groupby('device_type')['website_session_id'].count().reset_index()
-      conv_stats.columns = ['Device', 'Conversions']
 
-    # Merge both
-      final = device_stats.merge(conv_stats, on='Device').reset_index(drop=True)    
-     
-    # Convert CVR to %
-      final['CVR_pct'] = ((final['Conversions'] / final['Sessions']) * 100).round(2)
-      final['Sessions_in_thousands']=(final['Sessions']/1000).round(2)
+def _bounce_trend(data):
+    ###bounce rate trends
+    ut.plotly_chart(bounce_trend_figure(data), use_container_width=True)
 
-    # Clustered column chart
-      fig_dev = px.bar(
-        final,
-        x='Device',
-        y=['Sessions_in_thousands', 'CVR_pct'],
-        barmode='group',
-        title="Sessions Distribution & Conversion Rate by Device Type",
-        text_auto='.2f',color_discrete_sequence=['Blue', 'Green']
-    )
 
-    # Y-axis labels
-      fig_dev.update_layout(
-        yaxis_title="Sessions in thousands",
-        legend_title="Metric",
-        legend=dict(orientation="h", y=-0.2)
-    )
+# --- Figures (cached per filter state, see utils.figure) ---
 
-    # If you want CVR to plot on secondary axis
-      fig_dev.update_traces(selector=dict(name='CVR_pct'), yaxis='y2')
-      fig_dev.update_layout(
-        yaxis2=dict(overlaying='y', side='right', title="CVR (%)")
-    )
-      fig_dev.update_traces(textposition="auto")
-      st.plotly_chart(ut.style_chart(fig_dev), use_container_width=True)
+@ut.figure("website.monthly_sessions")
+def sessions_trend_figure(data):
+    monthly_sess = charts.compute("website.monthly_sessions", data)
+    monthly_sess['year_month'] = monthly_sess['year'].astype(str) + "-" + monthly_sess['month'].astype(str)
 
+    # Convert to percentage of total sessions
+    total_sessions = monthly_sess['website_session_id'].sum()
+    monthly_sess['Sessions_pct'] = ((monthly_sess['website_session_id'] / total_sessions) * 100).round(2)
 
+    # Plot
+    fig_sess_pct = px.line(
+    monthly_sess,
+    x='year_month',
+    y='Sessions_pct',
+    markers=True,
+    title="Sessions Trends Over Time",
+    template="dashboard"
+)
 
-    # conversion funnel
+    # Y axis in %
+    fig_sess_pct.update_yaxes(ticksuffix="%")
+    return fig_sess_pct
 
-    with c2:
-        def map_page(url):
-            if url.startswith("/lander") or url == "/home":
-                return "/homepages"
-            elif url == "/products":
-                return "/products"
-            elif url in [
-                "/the-original-mr-fuzzy",
-                "/the-forever-love-bear",
-                "/the-birthday-sugar-panda",
-                "/the-hudson-river-mini-bear"
-            ]:
-                return "/one_of_the_product_page"
-            elif url == "/cart":
-                return "/cart"
-            elif url == "/shipping":
-                return "/shipping"
-            elif url.startswith("/billing"):
-                return "/billing"
-            elif url == "/thank-you-for-your-order":
-                return "/thank-you-for-your-order"
-            else:
-                return None
 
-        df = df_pv.copy()
-        df["funnel_stage"] = df["pageview_url"].apply(map_page)
-        df = df.dropna(subset=["funnel_stage"])
+@ut.figure("website.device")
+def device_figure(data):
+    final = charts.compute("website.device", data)
 
-        # Count pageviews
-        funnel = df.groupby("funnel_stage").size().reset_index(name="visits")
+    # Convert CVR to %
+    final['CVR_pct'] = ((final['Conversions'] / final['Sessions']) * 100).round(2)
+    final['Sessions_in_thousands']=(final['Sessions']/1000).round(2)
 
-        funnel = funnel.sort_values("visits", ascending=False).reset_index(drop=True)
+    # Clustered column chart
+    fig_dev = px.bar(
+      final,
+      x='Device',
+      y=['Sessions_in_thousands', 'CVR_pct'],
+      barmode='group',
+      title="Sessions Distribution & Conversion Rate by Device Type",
+      text_auto='.2f',color_discrete_sequence=['Blue', 'Green'],
+      template="dashboard"
+  )
 
-        # Funnel percentage
-        top_visits = funnel["visits"].iloc[0]
-        funnel["funnel_pct"] = (funnel["visits"] / top_visits * 100).round(2)
+    # Y-axis labels
+    fig_dev.update_layout(
+      yaxis_title="Sessions in thousands",
+      legend_title="Metric",
+      legend=dict(orientation="h", y=-0.2)
+  )
 
+    # If you want CVR to plot on secondary axis
+    fig_dev.update_traces(selector=dict(name='CVR_pct'), yaxis='y2')
+    fig_dev.update_layout(
+      yaxis2=dict(overlaying='y', side='right', title="CVR (%)")
+  )
+    fig_dev.update_traces(textposition="auto")
+    return fig_dev
 
-        fig = px.funnel(
-            funnel,
-            x="visits",
-            y="funnel_stage",
-            title="Conversion Funnel",
-            text="funnel_pct"
-        )
 
-        fig.update_traces(texttemplate="%{text}%", textposition="auto")
+@ut.figure("website.funnel")
+def funnel_figure(data):
+    steps = charts.compute("website.funnel", data)
 
-        st.plotly_chart(fig, use_container_width=True)
+    # Stages stay in funnel order; % of the sessions entering the funnel
+    top_sessions = steps["sessions"].iloc[0] if len(steps) else 0
+    steps["funnel_pct"] = (steps["sessions"] / max(top_sessions, 1) * 100).round(2)
 
 
+    fig = px.funnel(
+        steps,
+        x="sessions",
+        y="funnel_stage",
+        title="Conversion Funnel (sessions reaching each step)",
+        text="funnel_pct"
+    )
 
+    fig.update_traces(texttemplate="%{text}%", textposition="auto")
+    return fig
 
 
+@ut.figure("website.landing_pages")
+def landing_pages_figure(data):
+    final_lp = charts.compute("website.landing_pages", data)
 
+    total_sessions = final_lp["Sessions"].sum()
+    final_lp["Sessions_pct"] = (final_lp["Sessions"] / total_sessions * 100).round(2)
+    final_lp["CVR_pct"] = ((final_lp["Conversions"] / final_lp["Sessions"]) * 100).round(2)
 
-#####landing page performance
-    c3,c4=st.columns(2)
-    # with c_right:
-    with c3:
-       first_pv = df_pv.sort_values("created_at").groupby("website_session_id").first().reset_index()
-
-       df_lp = first_pv[["website_session_id", "pageview_url"]].rename(columns={
-    "pageview_url": "landing_page"}) 
-       lp_sessions = df_lp.groupby("landing_page")["website_session_id"].count().reset_index()
-       lp_sessions.columns = ["Landing Page", "Sessions"]
-    
-       total_sessions = lp_sessions["Sessions"].sum()
-       lp_sessions["Sessions_pct"] = (lp_sessions["Sessions"] / total_sessions * 100).round(2)
-       conv = df_lp.merge(df_o, on="website_session_id", how="inner")
-       lp_conv = conv.groupby("landing_page")["website_session_id"].count().reset_index()
-       lp_conv.columns = ["Landing Page", "Conversions"]
-       final_lp = lp_sessions.merge(lp_conv, on="Landing Page")
-       final_lp["CVR_pct"] = ((final_lp["Conversions"] / final_lp["Sessions"]) * 100).round(2)
-
-       final_lp = final_lp.sort_values("Sessions", ascending=False)
-       fig = px.bar(
+    final_lp = final_lp.sort_values("Sessions", ascending=False)
+    fig = px.bar(
     final_lp,
     x="Landing Page",
     y=["Sessions_pct", "CVR_pct"],
@@ -227,100 +318,62 @@ def show(df_s, df_o, df_pv):
     color_continuous_scale=['Blue', 'Green']
 )
 
-       fig.update_layout(
-       yaxis_title="Percentage (%)",
-       legend_title="Metrics",
-       legend=dict(orientation="h", y=-0.25),
-       xaxis_tickangle=0
+    fig.update_layout(
+    yaxis_title="Percentage (%)",
+    legend_title="Metrics",
+    legend=dict(orientation="h", y=-0.25),
+    xaxis_tickangle=0
 )
-       fig.update_traces(textposition="auto")
-       st.plotly_chart(fig, use_container_width=True)
-
-
-
-
-######bounce rate 
-    with c4:
-        # 1. Identify landing page (first pageview per session)
-       first_pv = (
-           df_pv.sort_values("created_at")
-         .groupby("website_session_id")
-         .first()
-         .reset_index()
-)
-
-       first_pv = first_pv[["website_session_id", "pageview_url"]].rename(
-           columns={"pageview_url": "landing_page"}
-       )
-
-       # 2. Pageviews count per session
-       pv_counts = df_pv.groupby("website_session_id").size().reset_index(name="pv_count")
-
-       # 3. Merge landing page + pv count
-       df_lp = first_pv.merge(pv_counts, on="website_session_id", how="left")
-
-       # 4. Mark bounces (1 pageview = bounce)
-       df_lp["is_bounce"] = df_lp["pv_count"] == 1
-
-       # 5. Bounce rate per landing page
-       bounce_stats = df_lp.groupby("landing_page").agg(
-           Sessions=("website_session_id", "count"),
-           Bounces=("is_bounce", "sum")
-       ).reset_index()
+    fig.update_traces(textposition="auto")
+    return fig
 
-       bounce_stats["Bounce_Rate_pct"] = (
-           bounce_stats["Bounces"] / bounce_stats["Sessions"] * 100
-       ).round(2)
 
-       bounce_stats = bounce_stats.sort_values("Bounce_Rate_pct", ascending=False)
+@ut.figure("website.landing_bounce")
+def landing_bounce_figure(data):
+    bounce_stats = charts.compute("website.landing_bounce", data)
 
+    bounce_stats["Bounce_Rate_pct"] = (
+        bounce_stats["Bounces"] / bounce_stats["Sessions"] * 100
+    ).round(2)
 
+    bounce_stats = bounce_stats.sort_values("Bounce_Rate_pct", ascending=False)
 
-       fig_bounce = px.bar(
-           bounce_stats,
-           x="landing_page",
-           y="Bounce_Rate_pct",
-           title="Bounce Rate by Landing Page",
-           text_auto=".2f",
-           color="Bounce_Rate_pct",
-           color_continuous_scale="Reds"
-       )
 
-       fig_bounce.update_layout(
-           yaxis_title="Bounce Rate",
-           xaxis_title="Landing Page",
-           xaxis_tickangle=0,
-           coloraxis_showscale=False
-       )
-       fig_bounce.update_traces(textposition="auto")
-       st.plotly_chart(ut.style_chart(fig_bounce), use_container_width=True)
 
+    fig_bounce = px.bar(
+        bounce_stats,
+        x="landing_page",
+        y="Bounce_Rate_pct",
+        title="Bounce Rate by Landing Page",
+        text_auto=".2f",
+        color="Bounce_Rate_pct",
+        color_continuous_scale="Reds",
+        template="dashboard"
+    )
 
+    fig_bounce.update_layout(
+        yaxis_title="Bounce Rate",
+        xaxis_title="Landing Page",
+        xaxis_tickangle=0,
+        coloraxis_showscale=False
+    )
+    fig_bounce.update_traces(textposition="auto")
+    return fig_bounce
 
 
-    # --- top website pages ---
-    # CHART 5: 
-    # Make copies
-    pageviews = df_pv.copy()
-    sessions = df_s.copy()
+@ut.figure("website.top_pages", reads=("website.top_pages", "website.kpis"))
+def top_pages_figure(data):
+    k = charts.compute("website.kpis", data).iloc[0]
+    page_stats = charts.compute("website.top_pages", data)
 
     # Total number of sessions
-    total_sessions = sessions['website_session_id'].nunique()
-
-    # Count pageviews per page
-    page_stats = (
-    pageviews['pageview_url']
-    .value_counts()
-    .reset_index()
-)
-
-    page_stats.columns = ['page', 'visits']
+    total_sessions = k['sessions']
 
     # Convert visits to % of total sessions
     page_stats['visit_pct'] = (page_stats['visits'] / total_sessions * 100).round(2)
 
     # Optional: show top 15 pages
-    page_stats = page_stats.head(15)
+    page_stats = page_stats.sort_values('visits', ascending=False).head(15)
 
 
 
@@ -331,7 +384,8 @@ def show(df_s, df_o, df_pv):
     title='Top Website Pages (% of Sessions)',
     text_auto='.1f',
     color='visit_pct',
-    color_continuous_scale='Greens'
+    color_continuous_scale='Greens',
+    template="dashboard"
 )
 
     fig_pages.update_layout(
@@ -340,27 +394,12 @@ def show(df_s, df_o, df_pv):
     xaxis_tickangle=-30,
     coloraxis_showscale=False
 )
+    return fig_pages
 
-    st.plotly_chart(ut.style_chart(fig_pages), use_container_width=True)
-
-
-
-####exit rate of website pages
-
-    pv = df_pv.copy()
-    pv['created_at'] = pd.to_datetime(pv['created_at'])
 
-    pv = pv.sort_values(by=['website_session_id', 'created_at'])
-    pv['is_exit'] = pv.groupby('website_session_id')['pageview_url'].transform(lambda x: (x == x.iloc[-1]).astype(int))
-
-    page_visits = pv['pageview_url'].value_counts().reset_index()
-    page_visits.columns = ['page', 'total_visits']
-
-    exit_counts = pv[pv['is_exit'] == 1]['pageview_url'].value_counts().reset_index()
-    exit_counts.columns = ['page', 'exit_count']
-
-    exit_rate = page_visits.merge(exit_counts, on='page', how='left')
-    exit_rate['exit_count'] = exit_rate['exit_count'].fillna(0)
+@ut.figure("website.exit_rate")
+def exit_rate_figure(data):
+    exit_rate = charts.compute("website.exit_rate", data)
     exit_rate['exit_rate'] = ((exit_rate['exit_count'] / exit_rate['total_visits'])* 100).round(2)
     exit_rate = exit_rate.sort_values(by='exit_rate', ascending=False)
 
@@ -370,7 +409,8 @@ def show(df_s, df_o, df_pv):
     y='exit_rate',
     title='Exit Rate(in %) by Website Pages',
     text='exit_rate',
-    labels={'exit_rate': 'Exit Rate (%)', 'page': 'Page'})
+    labels={'exit_rate': 'Exit Rate (%)', 'page': 'Page'},
+    template="dashboard")
 
 
     fig_exit.update_layout(
@@ -378,34 +418,35 @@ def show(df_s, df_o, df_pv):
     yaxis_title='Exit Rate(%)',
     xaxis_tickangle=-30,
     coloraxis_showscale=False)
-    
-    st.plotly_chart(ut.style_chart(fig_exit), use_container_width=True)
+    return fig_exit
 
 
+@ut.figure("website.page_transitions")
+def page_paths_figure(data):
+    steps = charts.compute("website.page_transitions", data)
+    steps = steps.sort_values('count', ascending=False).head(25)
 
+    # Pages on the left and on the right are separate nodes, so loops
+    # (cart -> products -> cart) still draw left to right
+    sources = list(dict.fromkeys(steps['from_page']))
+    targets = list(dict.fromkeys(steps['to_page']))
+    fig_paths = go.Figure(go.Sankey(
+        node=dict(label=sources + targets, pad=12),
+        link=dict(
+            source=[sources.index(p) for p in steps['from_page']],
+            target=[len(sources) + targets.index(p) for p in steps['to_page']],
+            value=steps['count'].tolist(),
+        ),
+    ))
+    fig_paths.update_layout(template="dashboard", title='Top Page Paths (page -> next page)')
+    return fig_paths
 
-    ###bounce rate trends
-
- # Pageviews per session
-    pv_counts = df_pv.groupby("website_session_id").size()
 
-# Bounced session IDs (exactly 1 pageview)
-    bounced_sessions = pv_counts[pv_counts == 1].index
+@ut.figure("website.bounce_trend")
+def bounce_trend_figure(data):
+    bounce_trend = charts.compute("website.bounce_trend", data)
 
-# Add bounce flag to session table
-    df_s['is_bounced'] = df_s['website_session_id'].isin(bounced_sessions)
-
-# Create Year-Month column
-    df_s['year_month'] = df_s['created_at'].dt.to_period('M').astype(str)
-
-# Bounce rate by Year-Month
-    bounce_trend = (
-    df_s.groupby('year_month')['is_bounced']
-    .mean()
-    .reset_index()
-)
-
-    bounce_trend['bounce_pct'] = (bounce_trend['is_bounced'] * 100).round(2)
+    bounce_trend['bounce_pct'] = (bounce_trend['bounces'] / bounce_trend['sessions'] * 100).round(2)
 
 
 
@@ -414,19 +455,14 @@ def show(df_s, df_o, df_pv):
     x='year_month',
     y='bounce_pct',
     markers=True,
-    title='Bounce Rate Trend Over Time (%)'
+    title='Bounce Rate Trend Over Time (%)',
+    template="dashboard"
 )
 
     fig_bounce.update_traces(line_width=3)
 
     fig_bounce.update_layout(
     yaxis_title='Bounce Rate (%)',
-    coloraxis_showscale=False   
+    coloraxis_showscale=False
 )
-
-
-    st.plotly_chart(ut.style_chart(fig_bounce), use_container_width=True)
-
-
-
-
+    return fig_bounce
@@ -0,0 +1,108 @@
+"""Warm-up: computes every page for the default filters ahead of the users.
+
+The first visitor of a fresh server process would otherwise pay for
+loading the data, filtering it and computing every chart they open.
+warm_up() does that work for the sidebar's initial selection (every
+date, UTM source and product), in the order a visitor would need it:
+
+    1. the data and its indexes, daily cube, session facts and product
+       pair counts (data_loader, which also writes the on-disk snapshot)
+    2. the filtered tables (filter_cache)
+    3. the numbers of every chart of the four pages (view_cache, and the
+       intermediates they share), and the finished figures drawn from
+       them (utils.figure)
+
+`python serve.py` starts it in a background thread as the server
+process comes up, before any visitor connects, and the pages they open
+are served from the caches (config.WARMUP_ENABLED). Under a plain
+`streamlit run app.py`, app.py starts it instead, once per server
+process, when the first session runs the script. `python warmup.py` runs
+it by hand and prints its progress; its in-memory caches die with it,
+but it still leaves the data snapshot for the server to load.
+"""
+import dataclasses
+import logging
+import threading
+import time
+import streamlit as st
+import config
+import charts
+import data_loader as dl
+import filters as flt
+import filter_cache
+import view_cache
+import utils as ut
+from views import business, website, marketing, product  # noqa: F401 (register the charts)
+
+logger = logging.getLogger(__name__)
+
+# Chart id prefixes, in the order of the page menu
+PAGES = ("business", "website", "marketing", "product")
+
+
+def warm_up(report=logger.info):
+    """Fills the caches for the default filters; returns the seconds per step.
+
+    `report` gets one progress line per step.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    step = time.perf_counter()
+    frames = dl.load_data()
+    dl.load_indexes(), dl.load_cube(), dl.load_session_facts(), dl.load_cooccurrence()
+    timings['load'] = time.perf_counter() - step
+    report(f"Warm-up: data loaded in {timings['load']:.2f}s")
+
+    step = time.perf_counter()
+    df_sess, _, _, df_prods, _ = frames
+    filters = flt.default_filters(df_sess, df_prods)
+    data = filter_cache.filtered(frames, filters)
+    timings['filter'] = time.perf_counter() - step
+    report(f"Warm-up: default filters applied in {timings['filter']:.2f}s")
+
+    # No per-session result store: only the shared caches are filled
+    chart_stores = dict(view_cache=view_cache.shared(), figure_cache=view_cache.shared_figures(),
+                        dataset_version=dl.dataset_version())
+    if config.BACKEND == "duckdb":
+        vars(data).update(chart_stores)
+    else:
+        data = dataclasses.replace(data, **chart_stores)
+
+    ids = charts.chart_ids(data.backend)
+    for i, page in enumerate(PAGES, 1):
+        step = time.perf_counter()
+        page_ids = [chart_id for chart_id in ids if chart_id.startswith(page + ".")]
+        for chart_id in page_ids:
+            charts.compute(chart_id, data)
+        page_figures = [build for figure_id, build in ut.FIGURES.items() if figure_id.startswith(page + ".")]
+        for build in page_figures:
+            build(data)
+        timings[page] = time.perf_counter() - step
+        report(f"Warm-up [{i}/{len(PAGES)}]: {page} ({len(page_ids)} charts, {len(page_figures)} figures) "
+               f"in {timings[page]:.2f}s")
+
+    timings['total'] = time.perf_counter() - start
+    report(f"Warm-up done in {timings['total']:.2f}s")
+    return timings
+
+
+def _run():
+    try:
+        warm_up()
+    except Exception:
+        # The app still works cold; the sessions compute what they need
+        logger.exception("Warm-up failed")
+
+
+@st.cache_resource
+def start():
+    """Runs warm_up() in a background thread, once per server process."""
+    thread = threading.Thread(target=_run, name="dashboard-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    warm_up(report=print)